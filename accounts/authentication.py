@@ -0,0 +1,138 @@
+"""Stateless JWT authentication.
+
+``JWTAuthentication`` loads the ``User`` row on every request just to fill
+``request.user``. ``StatelessJWTAuthentication`` trusts the signed claims
+instead: ``request.user`` is a ``ClaimsUser`` carrying ``id``, ``username``,
+``role`` and ``is_staff`` from the token (see ``accounts.serializers`` for
+how they get there). Anything else, such as ``request.user.email``, loads
+the full user through a small per-process TTL cache.
+
+Because nothing is read from the database, revocation lives in the cache
+(Redis): ``revoke_token`` rejects one token by ``jti`` until it expires, and
+``revoke_user`` rejects every token issued to a user before now. Saving a
+user with a new password, role, staff flag or ``is_active=False`` calls
+``revoke_user`` (``accounts.signals``). A revocation check that cannot reach
+the cache lets the token through, like the rest of the cache code.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+CLAIMS = ('username', 'role', 'is_staff')
+
+
+def _revoked_keys(token):
+    return (
+        f'jwt:revoked:jti:{token.get(api_settings.JTI_CLAIM)}',
+        f'jwt:revoked:user:{token.get(api_settings.USER_ID_CLAIM)}',
+    )
+
+
+def _is_revoked(token, found, token_key, user_key):
+    if token_key in found:
+        return True
+    revoked_at = found.get(user_key)
+    return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+def is_revoked(token):
+    token_key, user_key = _revoked_keys(token)
+    try:
+        found = cache.get_many([token_key, user_key])
+    except Exception:
+        logger.warning('Token revocation list unavailable', exc_info=True)
+        return False
+    return _is_revoked(token, found, token_key, user_key)
+
+
+async def ais_revoked(token, acache):
+    token_key, user_key = _revoked_keys(token)
+    try:
+        found = await acache.aget_many([token_key, user_key])
+    except Exception:
+        logger.warning('Token revocation list unavailable', exc_info=True)
+        return False
+    return _is_revoked(token, found, token_key, user_key)
+
+
+def revoke_token(token):
+    """Reject ``token`` (access or refresh) from now until it expires."""
+    remaining = int(token.get('exp', 0) - time.time())
+    if remaining > 0:
+        cache.set(_revoked_keys(token)[0], 1, remaining + 1)
+
+
+def revoke_user(user_id):
+    """Reject every token issued to ``user_id`` before this second."""
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    cache.set(f'jwt:revoked:user:{user_id}', int(time.time()), int(lifetime.total_seconds()) + 1)
+    users.discard(user_id)
+
+
+class UserCache:
+    """Per-process LRU of full user rows, each kept for ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, pk):
+        with self.lock:
+            entry = self.entries.get(pk)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(pk)
+                return entry[1]
+        user = get_user_model().objects.get(pk=pk)
+        with self.lock:
+            self.entries[pk] = (time.monotonic() + self.ttl, user)
+            self.entries.move_to_end(pk)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return user
+
+    def discard(self, pk):
+        with self.lock:
+            self.entries.pop(pk, None)
+
+
+users = UserCache(getattr(settings, 'JWT_USER_CACHE_SIZE', 1024), getattr(settings, 'JWT_USER_CACHE_TTL', 60))
+
+
+class ClaimsUser(TokenUser):
+    """``request.user`` built from token claims; other attributes come from the cached ``User``."""
+
+    @property
+    def role(self):
+        return self.token.get('role', '')
+
+    @property
+    def user(self):
+        return users.get(self.pk)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_') or attr == 'token':
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_revoked'})
+        return token
@@ -0,0 +1,23 @@
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import CLAIMS, is_revoked
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    """Puts the claims ``ClaimsUser`` reads into the refresh token; access tokens copy them."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim in CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_revoked(RefreshToken(attrs['refresh'])):
+            raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_revoked'})
+        return super().validate(attrs)
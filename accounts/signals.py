@@ -0,0 +1,34 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .authentication import revoke_user
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# changes that must invalidate tokens already issued (their claims or the login itself)
+WATCHED_FIELDS = ('password', 'role', 'is_staff', 'is_active')
+
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_credential_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    fields = [f for f in WATCHED_FIELDS if update_fields is None or f in update_fields]
+    if not fields:
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if stored is None:
+        return
+    if any(stored[f] != getattr(instance, f) for f in fields):
+        transaction.on_commit(lambda: _revoke(instance.pk))
+
+
+def _revoke(user_id):
+    try:
+        revoke_user(user_id)
+    except Exception:
+        logger.error('Could not revoke tokens for user %s', user_id, exc_info=True)
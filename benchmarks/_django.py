@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+
+def setup():
+    """Configure Django so benchmark scripts can use the ORM directly."""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_sphere.settings')
+    import django
+    django.setup()
@@ -0,0 +1,227 @@
+"""Concurrent-connection capacity: gunicorn sync workers vs uvicorn on shop.async_views.
+
+    python -m benchmarks.bench_asgi --connections 10,100,500 --duration 10 --workers 4
+
+Starts ``gunicorn shop_sphere.wsgi`` (sync workers) serving the DRF views
+and ``uvicorn shop_sphere.asgi`` serving their ``/api/async/`` twins, with
+the same number of worker processes, on the database and Redis from the
+environment (``DATABASE_URL``, ``REDIS_URL``). Then, for each endpoint and
+each connection count, it holds that many client connections open for
+``--duration`` seconds, each sending requests back to back, and reports
+req/s, p50/p99 latency and errors (non-2xx, resets, timeouts).
+
+A sync worker handles one request at a time and closes the connection after
+it, so past ``--workers`` connections requests queue in the listen backlog.
+With Redis on the same host there is little I/O to overlap and the numbers
+mostly show per-request CPU cost; ``--redis-delay 2`` puts a TCP proxy in
+front of Redis that adds that many milliseconds per round trip, as a remote
+server would. Run ``manage.py seed_synthetic`` first so the catalog pages
+are realistic.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+CART_TOKEN = 'bench-asgi-cart-token-0001'
+ENDPOINTS = {
+    # name: (method, sync path, async path)
+    'product_list': ('GET', '/api/products/?page_size=20', '/api/async/products/?page_size=20'),
+    'cart': ('GET', '/api/cart/', '/api/async/cart/'),
+    'webhook': ('POST', '/api/webhook/', '/api/async/webhook/'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_latency_proxy(url, delay):
+    """Forward to the Redis at ``url``, holding every client write ``delay`` seconds; returns the proxy URL."""
+    parts = urlsplit(url)
+    port = free_port()
+
+    async def pipe(reader, writer, wait):
+        try:
+            while data := await reader.read(65536):
+                if wait:
+                    await asyncio.sleep(wait)
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(parts.hostname, parts.port or 6379)
+        await asyncio.gather(pipe(client_reader, upstream_writer, delay), pipe(upstream_reader, client_writer, 0))
+
+    async def serve():
+        server = await asyncio.start_server(handle, '127.0.0.1', port)
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    userinfo = parts.netloc.rpartition('@')[0]
+    return parts._replace(netloc=f'{userinfo}@127.0.0.1:{port}' if userinfo else f'127.0.0.1:{port}').geturl()
+
+
+def start_server(kind, port, workers, redis_url=None):
+    env = {**os.environ, 'DJANGO_DEBUG': '0', 'LOG_LEVEL': 'WARNING', 'QUERY_INSTRUMENTATION': '0'}
+    if redis_url:
+        env['REDIS_URL'] = redis_url
+    if kind == 'gunicorn':
+        cmd = [
+            sys.executable, '-m', 'gunicorn', 'shop_sphere.wsgi:application', '--workers', str(workers),
+            '--bind', f'127.0.0.1:{port}', '--backlog', '2048', '--log-level', 'warning',
+        ]
+    else:
+        cmd = [
+            sys.executable, '-m', 'uvicorn', 'shop_sphere.asgi:application', '--workers', str(workers),
+            '--host', '127.0.0.1', '--port', str(port), '--backlog', '2048', '--no-access-log',
+            '--log-level', 'warning',
+        ]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f'{kind} did not start on port {port}')
+
+
+def webhook_body():
+    body = json.dumps({'event': 'bench.asgi', 'id': uuid.uuid4().hex}).encode()
+    headers = {'Idempotency-Key': uuid.uuid4().hex, 'Content-Type': 'application/json'}
+    secret = os.environ.get('WEBHOOK_SECRET')
+    if secret:
+        headers['X-Signature'] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return body, headers
+
+
+async def read_response(reader):
+    """Status, whether the server keeps the connection open."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    headers = {k.lower(): v for k, v in headers.items()}
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def connection(port, method, path, stop_at, timeout, samples, errors):
+    reader = writer = None
+    while time.perf_counter() < stop_at:
+        body, headers = webhook_body() if method == 'POST' else (b'', {})
+        headers = {
+            'Host': 'localhost', 'Cookie': f'cart_token={CART_TOKEN}', 'Content-Length': str(len(body)), **headers,
+        }
+        request = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+            writer.write(request.encode() + body)
+            status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            errors.append('connection')
+            keep_alive = False
+            status = None
+        else:
+            samples.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, method, path, connections, duration, timeout):
+    samples, errors = [], []
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(*(
+        connection(port, method, path, stop_at, timeout, samples, errors) for _ in range(connections)
+    ))
+    latencies = sorted(s * 1000 for s in samples)
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else (latencies or [0]) * 99
+    return {
+        'requests': len(samples), 'errors': len(errors), 'rps': round(len(samples) / duration, 1),
+        'p50_ms': round(cuts[49], 1), 'p99_ms': round(cuts[98], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', default='10,100,500', help='Comma-separated connection counts.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint and level.')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes for both servers.')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Per-request client timeout.')
+    parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), dest='endpoints')
+    parser.add_argument('--redis-delay', type=float, default=0, help='Milliseconds added per Redis round trip.')
+    parser.add_argument('--output', help='Write results as JSON.')
+    args = parser.parse_args()
+    levels = [int(n) for n in args.connections.split(',')]
+    redis_url = None
+    if args.redis_delay:
+        upstream = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+        redis_url = start_latency_proxy(upstream, args.redis_delay / 1000)
+    results = {}
+    for kind in ('gunicorn', 'uvicorn'):
+        port = free_port()
+        proc = start_server(kind, port, args.workers, redis_url)
+        try:
+            for name in args.endpoints or list(ENDPOINTS):
+                method, sync_path, async_path = ENDPOINTS[name]
+                path = sync_path if kind == 'gunicorn' else async_path
+                asyncio.run(load(port, method, path, 5, 1.0, args.timeout))  # warm up workers and caches
+                for level in levels:
+                    result = asyncio.run(load(port, method, path, level, args.duration, args.timeout))
+                    results.setdefault(name, {}).setdefault(level, {})[kind] = result
+                    print(f'  {kind} {name} x{level}: {result["rps"]} req/s, {result["errors"]} errors', flush=True)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f'\n{"endpoint":<14}{"conns":>7}  {"server":<9}{"req/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"errors":>8}')
+    for name, by_level in results.items():
+        for level, by_server in by_level.items():
+            for kind, r in by_server.items():
+                print(
+                    f'{name:<14}{level:>7}  {kind:<9}{r["rps"]:>9.1f}{r["p50_ms"]:>9.1f}{r["p99_ms"]:>9.1f}'
+                    f'{r["errors"]:>8}'
+                )
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({'options': vars(args), 'results': results}, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
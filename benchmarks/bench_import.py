@@ -0,0 +1,67 @@
+"""Bulk catalog import throughput (rows = variants per second).
+
+    python -m benchmarks.bench_import --rows 200000 --chunk-size 1000 [--copy]
+
+Writes a synthetic CSV (two variants per product) to a temporary file, then
+runs ``manage.py import_catalog`` on it twice: the first pass inserts every
+row, the second upserts the same skus with new prices and stock.
+"""
+import argparse
+import csv
+import json
+import random
+import tempfile
+import time
+
+from benchmarks._django import setup
+
+setup()
+
+from django.core.management import call_command  # noqa: E402
+from shop.models import Category  # noqa: E402
+
+TAG = 'bench-import'
+HEADER = ['product_id', 'name', 'description', 'category', 'is_active', 'sku', 'price', 'stock', 'attributes']
+
+
+def write_csv(path, rows, seed):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(HEADER)
+        for i in range(rows):
+            product = i // 2
+            writer.writerow([
+                '', f'{TAG} product {product}', 'Imported from a supplier feed', TAG, 'true',
+                f'{TAG}-{i}', f'{rng.uniform(1, 500):.2f}', rng.randint(0, 50),
+                json.dumps({'size': 'ML'[i % 2], 'batch': product % 97}),
+            ])
+
+
+def run(path, args):
+    start = time.perf_counter()
+    call_command('import_catalog', path, chunk_size=args.chunk_size, copy=args.copy)
+    elapsed = time.perf_counter() - start
+    return args.rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--copy', action='store_true', help='COPY into a staging table (Postgres only)')
+    args = parser.parse_args()
+
+    Category.objects.get_or_create(slug=TAG, defaults={'name': 'Bench import'})
+    with tempfile.NamedTemporaryFile(suffix='.csv') as tmp:
+        write_csv(tmp.name, args.rows, seed=1)
+        inserted = run(tmp.name, args)
+        write_csv(tmp.name, args.rows, seed=2)
+        upserted = run(tmp.name, args)
+    print(f'{args.rows} rows, chunk {args.chunk_size}{" via COPY" if args.copy else ""}')
+    print(f'  insert  {inserted:10,.0f} rows/s')
+    print(f'  upsert  {upserted:10,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
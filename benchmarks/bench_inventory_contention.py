@@ -0,0 +1,85 @@
+"""Hammer a single SKU from many workers: Redis counters vs. row locking.
+
+    python -m benchmarks.bench_inventory_contention --workers 32 --ops 200
+
+Run against the docker-compose Postgres and Redis (``DATABASE_URL`` and
+``REDIS_URL``); SQLite serialises all writers and will mostly measure lock
+timeouts. Each op reserves one unit and commits it, which is what checkout
+does per line.
+"""
+import argparse
+import threading
+import time
+
+from benchmarks._django import setup
+
+setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import F  # noqa: E402
+
+from shop.inventory import RedisInventory  # noqa: E402
+from shop.models import Category, Product, ProductVariant  # noqa: E402
+
+
+def row_lock_op(variant_id):
+    with transaction.atomic():
+        v = ProductVariant.objects.select_for_update().only('stock').get(pk=variant_id)
+        if v.stock < 1:
+            return False
+        ProductVariant.objects.filter(pk=variant_id).update(stock=F('stock') - 1)
+    return True
+
+
+def redis_op(inventory, variant_id):
+    token = inventory.reserve({variant_id: 1})
+    return inventory.commit(token)
+
+
+def run(name, op, workers, ops):
+    barrier = threading.Barrier(workers + 1)
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(ops):
+                op()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = workers * ops
+    print(f'{name:<10} {total:>8} ops  {elapsed:8.2f}s  {total / elapsed:10.0f} ops/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=100)
+    args = parser.parse_args()
+
+    cat, _ = Category.objects.get_or_create(slug='bench-inventory', defaults={'name': 'Bench'})
+    product = Product.objects.create(name='Hot SKU', category=cat)
+    stock = args.workers * args.ops * 2
+    variant = ProductVariant.objects.create(product=product, sku=f'HOT-{product.id}', price='1.00', stock=stock)
+    try:
+        run('row-lock', lambda: row_lock_op(variant.id), args.workers, args.ops)
+        inventory = RedisInventory()
+        inventory.prefix = f'bench:inv:{variant.id}'
+        run('redis', lambda: redis_op(inventory, variant.id), args.workers, args.ops)
+        inventory.flush()
+        variant.refresh_from_db()
+        print(f'final stock {variant.stock} (expected {stock - 2 * args.workers * args.ops})')
+    finally:
+        product.delete()
+
+
+if __name__ == '__main__':
+    main()
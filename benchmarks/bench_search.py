@@ -0,0 +1,90 @@
+"""p50/p99 search latency against a generated catalog.
+
+    python -m benchmarks.bench_search --products 500000 --queries 500
+
+Generates products (bulk inserts, search documents filled directly) unless
+the catalog already holds ``--products`` rows tagged by this script, then
+times ``shop.search.search`` for random one- and two-word queries. Uses the
+Postgres GIN path when ``DATABASE_URL`` points at Postgres and the in-process
+inverted index otherwise (its build time is reported separately).
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks._django import setup
+
+setup()
+
+from shop import search  # noqa: E402
+from shop.models import Category, Product, ProductVariant  # noqa: E402
+
+WORDS = (
+    'trail road running walking leather canvas cotton wool linen denim classic slim relaxed '
+    'waterproof lightweight insulated vintage organic recycled premium sport casual formal'
+).split()
+NOUNS = 'shoe boot sneaker jacket shirt tee hoodie jeans shorts sock hat bag scarf glove'.split()
+COLORS = 'red blue green black white grey navy olive beige pink'.split()
+SIZES = 'XS S M L XL'.split()
+TAG = 'bench-search'
+
+
+def generate(count, batch=5000):
+    rng = random.Random(42)
+    categories = [
+        Category.objects.get_or_create(slug=f'{TAG}-{n}', defaults={'name': n.title()})[0] for n in NOUNS
+    ]
+    existing = Product.objects.filter(category__in=categories).count()
+    for start in range(existing, count, batch):
+        products = []
+        variant_attrs = []
+        for i in range(start, min(start + batch, count)):
+            cat = rng.choice(categories)
+            name = f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {cat.name} {i}'
+            description = ' '.join(rng.choices(WORDS, k=12))
+            attrs = [{'color': rng.choice(COLORS), 'size': s} for s in rng.sample(SIZES, 2)]
+            products.append(Product(
+                name=name, description=description, category=cat,
+                search_document=search.build_document(name, description, cat.name, attrs),
+            ))
+            variant_attrs.append(attrs)
+        Product.objects.bulk_create(products)
+        if products[0].pk is None:
+            # backends that cannot return ids from bulk inserts
+            products = list(Product.objects.filter(category__in=categories).order_by('-id')[:len(products)])[::-1]
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=p, sku=f'{TAG}-{p.pk}-{n}', price='10.00', stock=5, attributes=a)
+            for p, attrs in zip(products, variant_attrs) for n, a in enumerate(attrs)
+        ])
+        print(f'  generated {min(start + batch, count)}/{count}', flush=True)
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] if len(samples) > 1 else samples[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    generate(args.products)
+    rng = random.Random(7)
+    queries = [
+        ' '.join(rng.sample(WORDS + NOUNS + COLORS, rng.choice((1, 2)))) for _ in range(args.queries)
+    ]
+    start = time.perf_counter()
+    search.search(queries[0])
+    print(f'warm-up (index build on non-Postgres): {time.perf_counter() - start:.2f}s')
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        search.search(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    print(f'{len(samples)} queries  p50 {percentile(samples, 50):.2f}ms  p99 {percentile(samples, 99):.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Catalog serialization throughput: ProductSerializer vs the ``.values()`` read model.
+
+    python -m benchmarks.bench_serialization --products 10000 --repeat 5
+
+Generates products with two variants each unless the catalog already holds
+``--products`` rows tagged by this script, then times query + serialize and
+render (stdlib ``JSONRenderer`` vs ``FastJSONRenderer``) for all of them.
+Reports the best of ``--repeat`` runs, scaled to milliseconds per 10k products.
+"""
+import argparse
+import json
+import time
+
+from benchmarks._django import setup
+
+setup()
+
+from django.db.models import Prefetch  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from shop import read_models  # noqa: E402
+from shop.models import Category, Product, ProductVariant  # noqa: E402
+from shop.renderers import FastJSONRenderer, orjson  # noqa: E402
+from shop.serializers import ProductSerializer  # noqa: E402
+
+TAG = 'bench-serialization'
+
+
+def generate(count, batch=5000):
+    category, _ = Category.objects.get_or_create(slug=TAG, defaults={'name': 'Bench'})
+    existing = Product.objects.filter(category=category).count()
+    for start in range(existing, count, batch):
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='A sturdy everyday product ' * 4, category=category)
+            for i in range(start, min(start + batch, count))
+        ])
+        if products[0].pk is None:
+            products = list(Product.objects.filter(category=category).order_by('-id')[:len(products)])[::-1]
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=p, sku=f'{TAG}-{p.pk}-{n}', price='19.90', stock=n * 3,
+                           attributes={'color': 'blue', 'size': size})
+            for p in products for n, size in enumerate(('M', 'L'))
+        ])
+        print(f'  generated {min(start + batch, count)}/{count}', flush=True)
+    return Product.objects.filter(category=category).order_by('id')[:count]
+
+
+def best(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    qs = generate(args.products)
+    variants = Prefetch('variants', ProductVariant.objects.order_by('id'))
+    serializer_time, expected = best(
+        lambda: ProductSerializer(qs.prefetch_related(variants), many=True).data, args.repeat,
+    )
+    fast_time, actual = best(
+        lambda: read_models.serialize_products(list(read_models.product_values(qs))), args.repeat,
+    )
+    assert actual == expected, 'read model output differs from ProductSerializer'
+    render_time, body = best(lambda: JSONRenderer().render(actual), args.repeat)
+    fast_render_time, fast_body = best(lambda: FastJSONRenderer().render(actual), args.repeat)
+    # equivalent JSON; orjson may spell floats differently
+    assert json.loads(body) == json.loads(fast_body)
+
+    scale = 10_000 / args.products * 1000
+    print(f'{args.products} products, {len(body) / 1e6:.1f} MB JSON, best of {args.repeat}')
+    print(f'  ProductSerializer        {serializer_time * scale:8.1f} ms / 10k products')
+    print(f'  read model (.values())   {fast_time * scale:8.1f} ms / 10k products')
+    print(f'  JSONRenderer             {render_time * scale:8.1f} ms / 10k products')
+    label = 'FastJSONRenderer' if orjson else 'FastJSONRenderer (no orjson)'
+    print(f'  {label:<24} {fast_render_time * scale:8.1f} ms / 10k products')
+    total, fast_total = serializer_time + render_time, fast_time + fast_render_time
+    print(f'  end to end               {total / fast_total:8.1f}x faster '
+          f'({args.products / total:,.0f} -> {args.products / fast_total:,.0f} products/s)')
+
+
+if __name__ == '__main__':
+    main()
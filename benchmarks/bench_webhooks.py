@@ -0,0 +1,103 @@
+"""Webhook delivery throughput: per-event path vs the batched engine.
+
+    python -m benchmarks.bench_webhooks --events 2000 --latency 20
+
+Starts a local keep-alive HTTP stub that answers 200 after ``--latency``
+milliseconds, creates ``--events`` WebhookEvents and delivers them twice:
+once the way ``deliver_webhook`` does (``post_event`` plus two saves per
+event, broker round trip not included) and once through
+``shop.webhooks.WebhookEngine`` in batches. Reports events/sec for both.
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks._django import setup
+
+setup()
+
+from shop.models import WebhookEvent  # noqa: E402
+from shop.tasks_helpers import post_event  # noqa: E402
+from shop.webhooks import WebhookEngine  # noqa: E402
+
+TAG = 'bench-webhook'
+
+
+def stub_server(latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def reset(count):
+    WebhookEvent.objects.filter(event=TAG).delete()
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(event=TAG, payload={'event': TAG, 'n': i, 'data': {'order_id': i, 'total': '10.00'}})
+        for i in range(count)
+    ])
+    return list(WebhookEvent.objects.filter(event=TAG).order_by('id'))
+
+
+def per_event(url, events):
+    for ev in events:
+        ev.mark_attempt()
+        if 200 <= post_event(url, ev.payload) < 300:
+            ev.mark_delivered()
+
+
+def batched(url, events, batch_size, workers, per_destination):
+    from django.test import override_settings
+    engine = WebhookEngine(workers=workers, per_destination=per_destination)
+    with override_settings(WEBHOOK_DELIVERY_URL=url):
+        for start in range(0, len(events), batch_size):
+            batch = events[start:start + batch_size]
+            engine.record(batch, engine.send(batch))
+    engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=20, help='stub response delay in ms')
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--per-destination', type=int, default=32)
+    args = parser.parse_args()
+
+    server = stub_server(args.latency / 1000)
+    url = f'http://127.0.0.1:{server.server_address[1]}/hook'
+    try:
+        for name, run in (
+            ('per-event', lambda events: per_event(url, events)),
+            ('batched', lambda events: batched(url, events, args.batch_size, args.workers, args.per_destination)),
+        ):
+            events = reset(args.events)
+            start = time.perf_counter()
+            run(events)
+            elapsed = time.perf_counter() - start
+            delivered = WebhookEvent.objects.filter(event=TAG, delivered=True).count()
+            print(f'{name:>10}: {delivered}/{args.events} delivered in {elapsed:.2f}s '
+                  f'({args.events / elapsed:.0f} events/s)')
+    finally:
+        WebhookEvent.objects.filter(event=TAG).delete()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compare two ``benchmarks.suite`` result files scenario by scenario.
+
+    python -m benchmarks.compare before.json after.json [--threshold 5]
+
+Changes beyond the threshold (percent) are marked: ``+`` better, ``-`` worse.
+Higher is better for req/s; lower is better for latency and queries.
+"""
+import argparse
+import json
+
+METRICS = (
+    ('rps', 'req/s', True),
+    ('p50_ms', 'p50 ms', False),
+    ('p95_ms', 'p95 ms', False),
+    ('p99_ms', 'p99 ms', False),
+    ('queries_per_request', 'queries', False),
+)
+
+
+def load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def change(before, after, higher_is_better, threshold):
+    if before is None or after is None:
+        return '-'
+    if not before:
+        return 'n/a' if after else '0%'
+    pct = (after - before) / before * 100
+    mark = ''
+    if abs(pct) >= threshold:
+        mark = ' +' if (pct > 0) == higher_is_better else ' -'
+    return f'{pct:+.1f}%{mark}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=5.0)
+    args = parser.parse_args()
+    before, after = load(args.before), load(args.after)
+    print(f'before: {before.get("commit")} {before.get("created")}')
+    print(f'after:  {after.get("commit")} {after.get("created")}')
+    for name in [n for n in after['scenarios'] if n in before['scenarios']]:
+        b, a = before['scenarios'][name], after['scenarios'][name]
+        print(f'\n{name}')
+        for key, label, higher in METRICS:
+            print(f'  {label:<10}{str(b.get(key)):>10}{str(a.get(key)):>10}  {change(b.get(key), a.get(key), higher, args.threshold)}')
+        if a['errors'] or b['errors']:
+            print(f'  {"errors":<10}{b["errors"]:>10}{a["errors"]:>10}')
+    missing = set(before['scenarios']) ^ set(after['scenarios'])
+    if missing:
+        print(f'\nonly in one run: {", ".join(sorted(missing))}')
+
+
+if __name__ == '__main__':
+    main()
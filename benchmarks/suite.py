@@ -0,0 +1,318 @@
+"""API load test: req/s, latency percentiles and queries per request per scenario.
+
+    python manage.py seed_synthetic
+    python -m benchmarks.suite --requests 300 --output before.json
+    ... change something ...
+    python -m benchmarks.suite --requests 300 --output after.json [--scenario checkout ...]
+    python -m benchmarks.compare before.json after.json
+
+Requests go through Django's test client in-process by default, so the
+numbers cover middleware, views, serializers and the database but not the
+network or WSGI server. Pass ``--base-url http://localhost:8000`` to hit a
+running server instead. In-process runs switch on
+``QUERY_INSTRUMENTATION`` and read the query count from ``Server-Timing``.
+For a server, set the same environment variable there.
+
+Scenarios log in as the users created by ``seed_synthetic``. Each timed
+request may have an untimed setup step; checkout, for example, fills the
+cart first.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+
+from benchmarks._django import setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from shop.management.commands.seed_synthetic import PASSWORD, PREFIX  # noqa: E402
+from shop.models import Category, ProductVariant  # noqa: E402
+
+SERVER_TIMING_RE = re.compile(r'desc="(\d+) queries"')
+GRAPHQL_PRODUCTS = '{ products { id name variants { sku price stock } } }'
+GRAPHQL_ORDERS = '{ orders { id status total items { quantity price variant { sku } } } }'
+WORDS = 'classic slim waterproof vintage organic premium cotton wool leather denim shoe jacket hat bag'.split()
+
+
+class InProcess:
+    def __init__(self):
+        from rest_framework.test import APIClient
+        self.client = APIClient()
+        self.headers = {}
+
+    def request(self, method, path, body=None, headers=None):
+        extra = {f'HTTP_{k.upper().replace("-", "_")}': v for k, v in {**self.headers, **(headers or {})}.items()}
+        if isinstance(body, bytes):
+            response = getattr(self.client, method)(path, body, content_type='application/json', **extra)
+        elif body is not None:
+            response = getattr(self.client, method)(path, body, format='json', **extra)
+        else:
+            response = getattr(self.client, method)(path, **extra)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response.get('Server-Timing', ''), content
+
+
+class Http:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.headers = {}
+
+    def request(self, method, path, body=None, headers=None):
+        kwargs = {'data': body} if isinstance(body, bytes) else {'json': body}
+        response = self.session.request(
+            method, self.base_url + path, headers={**self.headers, **(headers or {})}, timeout=30, **kwargs,
+        )
+        return response.status_code, response.headers.get('Server-Timing', ''), response.content
+
+
+def login(transport, username):
+    status, _, body = transport.request('post', '/api/auth/login/', {'username': username, 'password': PASSWORD})
+    if status != 200:
+        raise SystemExit(f'login failed for {username} ({status}); run manage.py seed_synthetic first')
+    transport.headers['Authorization'] = f'Bearer {json.loads(body)["access"]}'
+
+
+def cart_item_id(transport):
+    _, _, body = transport.request('get', '/api/cart/')
+    items = json.loads(body).get('items') or []
+    return items[0]['id'] if items else None
+
+
+class Scenario:
+    """``step(transport, rng)`` returns the timed request ``(method, path, body, headers)``."""
+
+    authenticated = False
+
+    def __init__(self, data):
+        self.data = data
+
+    def start(self, transport, rng):
+        pass
+
+    def step(self, transport, rng):
+        raise NotImplementedError
+
+
+class ProductList(Scenario):
+    def start(self, transport, rng):
+        self.next = None
+
+    def step(self, transport, rng):
+        return 'get', self.next or '/api/products/?page_size=50', None, None
+
+    def seen(self, body):
+        nxt = json.loads(body).get('next')
+        self.next = nxt and nxt[nxt.index('/api/'):]
+
+
+class ProductFilter(Scenario):
+    def step(self, transport, rng):
+        low = rng.randint(5, 200)
+        query = f'category={rng.choice(self.data["categories"])}&min_price={low}&max_price={low + 50}&in_stock=true'
+        return 'get', f'/api/products/?{query}', None, None
+
+
+class ProductSearch(Scenario):
+    def step(self, transport, rng):
+        return 'get', f'/api/products/search/?q={"+".join(rng.sample(WORDS, rng.choice((1, 2))))}', None, None
+
+
+class CartAdd(Scenario):
+    authenticated = True
+
+    def step(self, transport, rng):
+        return 'post', '/api/cart/add/', {'variant_id': rng.choice(self.data['variants']), 'quantity': 1}, None
+
+
+class CartUpdate(Scenario):
+    authenticated = True
+
+    def start(self, transport, rng):
+        self.item = cart_item_id(transport)
+        if self.item is None:
+            transport.request('post', '/api/cart/add/', {'variant_id': rng.choice(self.data['variants']), 'quantity': 1})
+            self.item = cart_item_id(transport)
+
+    def step(self, transport, rng):
+        return 'patch', f'/api/cart/item/{self.item}/', {'quantity': rng.randint(1, 5)}, None
+
+
+class Checkout(Scenario):
+    authenticated = True
+
+    def step(self, transport, rng):
+        for variant_id in rng.sample(self.data['variants'], 2):
+            transport.request('post', '/api/cart/add/', {'variant_id': variant_id, 'quantity': 1})
+        return 'post', '/api/checkout/', {'address': '1 Bench St'}, None
+
+
+class OrderHistory(Scenario):
+    authenticated = True
+
+    def step(self, transport, rng):
+        return 'get', '/api/orders/', None, None
+
+
+class WebhookIngest(Scenario):
+    def step(self, transport, rng):
+        body = json.dumps({'event': 'payment.succeeded', 'id': uuid.uuid4().hex, 'amount': rng.randint(1, 10_000)})
+        body = body.encode()
+        headers = {'Idempotency-Key': uuid.uuid4().hex}
+        secret = getattr(settings, 'WEBHOOK_SECRET', None)
+        if secret:
+            headers['X-Signature'] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return 'post', '/api/webhook/', body, headers
+
+
+class GraphQLOrders(Scenario):
+    authenticated = True
+
+    def step(self, transport, rng):
+        return 'post', '/graphql/', {'query': GRAPHQL_ORDERS}, None
+
+
+class GraphQLProducts(Scenario):
+    def step(self, transport, rng):
+        return 'post', '/graphql/', {'query': GRAPHQL_PRODUCTS}, None
+
+
+SCENARIOS = {
+    'product_list': ProductList,
+    'product_filter': ProductFilter,
+    'product_search': ProductSearch,
+    'cart_add': CartAdd,
+    'cart_update': CartUpdate,
+    'checkout': Checkout,
+    'order_history': OrderHistory,
+    'webhook_ingest': WebhookIngest,
+    'graphql_orders': GraphQLOrders,
+    'graphql_products': GraphQLProducts,
+}
+# whole-catalog GraphQL is slow on a large seed; ask for it explicitly
+DEFAULT_SCENARIOS = [name for name in SCENARIOS if name != 'graphql_products']
+
+
+def run_worker(scenario, transport, rng, requests, warmup, samples, errors):
+    scenario.start(transport, rng)
+    for i in range(warmup + requests):
+        method, path, body, headers = scenario.step(transport, rng)
+        start = time.perf_counter()
+        status, timing, content = transport.request(method, path, body, headers)
+        elapsed = time.perf_counter() - start
+        if hasattr(scenario, 'seen') and status == 200:
+            scenario.seen(content)
+        if i < warmup:
+            continue
+        if status >= 400:
+            errors.append(status)
+        match = SERVER_TIMING_RE.search(timing)
+        samples.append((elapsed, int(match.group(1)) if match else None))
+
+
+def run_scenario(name, args, data):
+    samples, errors, threads = [], [], []
+    for n in range(args.concurrency):
+        transport = Http(args.base_url) if args.base_url else InProcess()
+        scenario = SCENARIOS[name](data)
+        if scenario.authenticated:
+            login(transport, f'{PREFIX}-{n}')
+        rng = random.Random(f'{args.seed}:{name}:{n}')
+        threads.append(threading.Thread(
+            target=run_worker, args=(scenario, transport, rng, args.requests, args.warmup, samples, errors),
+        ))
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[1] for s in samples if s[1] is not None]
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(samples),
+        'errors': len(errors),
+        'rps': round(len(samples) / wall, 1),
+        'p50_ms': round(cuts[49], 2),
+        'p95_ms': round(cuts[94], 2),
+        'p99_ms': round(cuts[98], 2),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+    }
+
+
+def load_data():
+    variants = list(
+        ProductVariant.objects.filter(sku__startswith=f'{PREFIX}-', stock__gte=100, product__is_active=True)
+        .values_list('id', flat=True)[:5000]
+    )
+    categories = list(Category.objects.filter(slug__startswith=f'{PREFIX}-').values_list('slug', flat=True))
+    if not variants or not categories:
+        raise SystemExit('No synthetic catalog found; run manage.py seed_synthetic first')
+    return {'variants': variants, 'categories': categories}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    print(f'{"scenario":<18}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"errors":>8}')
+    for name, r in results.items():
+        queries = '-' if r['queries_per_request'] is None else f'{r["queries_per_request"]:.1f}'
+        print(
+            f'{name:<18}{r["rps"]:>9.1f}{r["p50_ms"]:>9.2f}{r["p95_ms"]:>9.2f}{r["p99_ms"]:>9.2f}'
+            f'{queries:>9}{r["errors"]:>8}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), dest='scenarios',
+                        help=f'Repeatable. Default: {" ".join(DEFAULT_SCENARIOS)}')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per worker and scenario.')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process client.')
+    parser.add_argument('--output', help='Write results as JSON (see benchmarks.compare).')
+    args = parser.parse_args()
+    if not args.base_url:
+        settings.QUERY_INSTRUMENTATION = True
+    # per-request access logs would be timed along with the views
+    logging.getLogger().setLevel(logging.WARNING)
+    data = load_data()
+    results = {}
+    for name in args.scenarios or DEFAULT_SCENARIOS:
+        results[name] = run_scenario(name, args, data)
+        print(f'  {name}: {results[name]["rps"]} req/s', flush=True)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump({
+                'commit': git_commit(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'database': settings.DATABASES['default']['ENGINE'],
+                'options': {k: getattr(args, k) for k in ('requests', 'warmup', 'concurrency', 'seed', 'base_url')},
+                'scenarios': results,
+            }, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,7 @@ export default function Products() {
     setError(null)
     try {
       const resp = await api.get('products/')
-      setProducts(resp.data)
+      setProducts(resp.data.results ?? resp.data)
     } catch (err) {
       setError('Failed to load products')
       console.error(err)
@@ -0,0 +1,87 @@
+"""Non-blocking Redis for the async views (``shop.async_views``).
+
+django-redis only has a blocking client, and Django's ``cache.aget()`` and
+friends run it in a worker thread. When the default cache is django-redis,
+``get_cache()`` returns a ``RedisCache`` that uses the same key function and
+serializer on a ``redis.asyncio`` connection, so entries are shared with the
+sync code. Any other backend (LocMem in tests) is returned as is and used
+through Django's own async methods.
+
+Connection pools belong to an event loop, so clients are kept per loop and URL.
+"""
+import asyncio
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache as DjangoRedisCache
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _location():
+    # the server django-redis talks to (get_redis_connection), else REDIS_URL
+    if not isinstance(caches['default'], DjangoRedisCache):
+        return settings.REDIS_URL
+    location = settings.CACHES['default']['LOCATION']
+    return location[0] if isinstance(location, (list, tuple)) else location
+
+
+def get_client(url=None):
+    """``redis.asyncio`` client for ``url`` (default: the cache's Redis), bound to the running loop."""
+    url = url or _location()
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    if url not in clients:
+        clients[url] = redis.asyncio.Redis.from_url(url)
+    return clients[url]
+
+
+class RedisCache:
+    """The subset of Django's async cache API that the async views use."""
+
+    def __init__(self, backend, client):
+        self.backend = backend
+        self.client = client
+        self.codec = backend.client  # django-redis DefaultClient: make_key, encode, decode
+
+    def _px(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.backend.default_timeout
+        return None if timeout is None else max(int(timeout * 1000), 1)
+
+    async def aget(self, key, default=None):
+        value = await self.client.get(self.codec.make_key(key))
+        return default if value is None else self.codec.decode(value)
+
+    async def aget_many(self, keys):
+        keys = list(keys)
+        values = await self.client.mget([self.codec.make_key(k) for k in keys]) if keys else []
+        return {k: self.codec.decode(v) for k, v in zip(keys, values) if v is not None}
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return bool(await self.client.set(
+            self.codec.make_key(key), self.codec.encode(value), px=self._px(timeout), nx=True,
+        ))
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT):
+        await self.client.set(self.codec.make_key(key), self.codec.encode(value), px=self._px(timeout))
+
+    async def aset_many(self, data, timeout=DEFAULT_TIMEOUT):
+        px = self._px(timeout)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in data.items():
+                pipe.set(self.codec.make_key(key), self.codec.encode(value), px=px)
+            await pipe.execute()
+        return []
+
+    async def adelete(self, key):
+        return bool(await self.client.delete(self.codec.make_key(key)))
+
+
+def get_cache():
+    backend = caches['default']
+    if isinstance(backend, DjangoRedisCache):
+        return RedisCache(backend, get_client())
+    return backend
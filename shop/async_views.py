@@ -0,0 +1,115 @@
+"""Native async versions of the read-heavy endpoints, served under ``/api/async/``.
+
+DRF views are sync, so under an ASGI server each request would be handed to
+a thread and block there on Redis and the database. These are plain async
+Django views returning the same JSON as their sync counterparts in
+``shop.views``. Cache and cart hash reads go through ``redis.asyncio`` (see
+``shop.async_cache``) and rows through Django's async ORM. Work that only
+exists in sync form (cursor pagination on a cache miss, merging an anonymous
+cart, flushing a full webhook buffer) runs in a thread.
+"""
+from accounts.authentication import StatelessJWTAuthentication, ais_revoked
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import async_cache, cart_store, catalog_cache, replicas, views, webhook_ingest
+from .renderers import FastJSONRenderer
+from .serializers import ProductFilterSerializer
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type='application/json', headers=headers,
+    )
+
+
+async def authenticate(request):
+    """User pk from a ``Bearer`` access token, or None when there is no token.
+
+    ``StatelessJWTAuthentication`` with the revocation check on the async
+    cache; raises ``AuthenticationFailed`` for invalid or revoked tokens.
+    """
+    auth = StatelessJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    token = super(StatelessJWTAuthentication, auth).get_validated_token(raw_token)
+    if await ais_revoked(token, async_cache.get_cache()):
+        raise InvalidToken({'detail': 'Token has been revoked', 'code': 'token_revoked'})
+    try:
+        return token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+
+
+def build_product_page(request):
+    # the async view does not authenticate, so only an anonymous cart's pin applies
+    view = views.ProductList(request=Request(request), args=(), kwargs={}, format_kwarg=None)
+    with replicas.reads(replicas.pin_key(request), replicas.CATALOG):
+        return view.build_page()
+
+
+class AsyncProductList(View):
+    """``ProductList``: a cached page is served without leaving the event loop."""
+    query_budget = views.ProductList.query_budget
+
+    async def get(self, request):
+        ser = ProductFilterSerializer(data=request.GET)
+        if not ser.is_valid():
+            return json_response(ser.errors, status=400)
+        data = await catalog_cache.acached(
+            views.page_cache_key(request), lambda: sync_to_async(build_product_page)(request),
+        )
+        return json_response(data)
+
+
+class AsyncCartView(View):
+    """``CartView`` GET for both cart backends."""
+
+    async def get(self, request):
+        try:
+            user_id = await authenticate(request)
+        except AuthenticationFailed as exc:
+            return json_response(exc.detail, status=401, headers={
+                'WWW-Authenticate': StatelessJWTAuthentication().authenticate_header(request),
+            })
+        store = cart_store.get_store()
+        owner, cookie, merge_from = cart_store.owner_for(request, user_id)
+        if merge_from:
+            await sync_to_async(store.merge)(merge_from, owner)
+            await sync_to_async(replicas.pin)(owner)
+        cookie = cart_store.keep_cookie(request, cookie)
+        return cart_store.set_cookie(json_response(await store.aget(owner)), cookie)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncWebhookReceiver(View):
+    """``WebhookReceiver`` with the idempotency claim and buffer push on ``redis.asyncio``."""
+    query_budget = views.WebhookReceiver.query_budget
+
+    async def post(self, request):
+        payload = request.body
+        if not webhook_ingest.signature_valid(payload, request.headers.get('X-Signature')):
+            return json_response({'detail': 'Invalid signature'}, status=400)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not await webhook_ingest.aclaim_idempotency_key(idempotency_key):
+            return json_response({'status': 'duplicate'})
+        try:
+            buffered = await webhook_ingest.aingest(payload)
+        except webhook_ingest.InvalidPayload as exc:
+            await webhook_ingest.arelease_idempotency_key(idempotency_key)
+            return json_response({'detail': str(exc)}, status=400)
+        except Exception:
+            await webhook_ingest.arelease_idempotency_key(idempotency_key)
+            raise
+        if buffered:
+            return json_response({'status': 'accepted'}, status=202)
+        return json_response({'status': 'received'})
@@ -0,0 +1,535 @@
+"""Cart storage backends used by the cart views.
+
+Carts are addressed by an owner key: ``user:<id>`` for authenticated users
+and ``anon:<token>`` for anonymous visitors, whose token lives in the
+``cart_token`` cookie. When a request is authenticated and still carries
+that cookie, the anonymous cart is merged into the user's cart and the
+cookie is dropped, so the first cart call after login picks it up. Reads
+never store anything: a visitor without a cart gets an empty one back, and
+the cart row (or hash) and the cookie only appear with the first write.
+
+``CART_BACKEND = 'database'`` keeps carts in ``Cart``/``CartItem``.
+``CART_BACKEND = 'redis'`` keeps active carts as Redis hashes
+(``variant_id -> quantity``) with a sliding TTL and writes them behind to
+the database: every write marks the owner dirty, and ``persist_carts``
+(Celery beat) copies carts that have been idle for ``CART_PERSIST_AFTER``
+seconds, plus carts emptied by checkout. A cart missing from Redis is
+hydrated from the database on first touch.
+
+Both stores also have an ``aget()`` for ``shop.async_views``: the Redis
+store reads the hash and the variant cache on ``redis.asyncio``, the
+database store goes through Django's async ORM.
+"""
+import logging
+import re
+import secrets
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import async_cache, carts, catalog_cache
+from .checkout import CheckoutInProgress, EmptyCart, UnknownVariants, order_from_lines, place_order
+
+logger = logging.getLogger(__name__)
+from .models import Cart, CartItem, ProductVariant
+
+COOKIE_NAME = 'cart_token'
+TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+META_PREFIX = '_'
+CHECKOUT_LOCK_SECONDS = 30
+
+
+class CartItemNotFound(Exception):
+    pass
+
+
+def resolve_owner(request, store):
+    """Return ``(owner, cookie)`` where ``cookie`` is a token to set, '' to delete, or None."""
+    user_id = request.user.pk if request.user.is_authenticated else None
+    owner, cookie, merge_from = owner_for(request, user_id)
+    if merge_from:
+        store.merge(merge_from, owner)
+    return owner, cookie
+
+
+def owner_for(request, user_id):
+    """``(owner, cookie, merge_from)``: the anonymous cart to merge into ``owner``, if any."""
+    token = request.COOKIES.get(COOKIE_NAME)
+    if token and not TOKEN_RE.match(token):
+        token = None
+    if user_id is not None:
+        owner = f'user:{user_id}'
+        if token:
+            return owner, '', f'anon:{token}'
+        return owner, None, None
+    if token:
+        return f'anon:{token}', None, None
+    token = secrets.token_urlsafe(24)
+    return f'anon:{token}', token, None
+
+
+def set_cookie(response, cookie):
+    """Apply the ``cookie`` returned by ``resolve_owner`` to ``response``."""
+    if cookie == '':
+        response.delete_cookie(COOKIE_NAME, samesite='Lax')
+    elif cookie:
+        response.set_cookie(
+            COOKIE_NAME, cookie, max_age=getattr(settings, 'CART_TTL', None), httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def keep_cookie(request, cookie):
+    """Drop a token minted for a read; the visitor gets one when they first write."""
+    if cookie and request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    return cookie
+
+
+def empty_cart(owner):
+    """The cart payload for an owner with nothing stored yet."""
+    now = _timestamp(time.time())
+    kind, _, value = owner.partition(':')
+    return {
+        'id': None, 'user': int(value) if kind == 'user' else None, 'items': [], 'item_count': 0,
+        'subtotal': '0.00', 'created_at': now, 'updated_at': now,
+    }
+
+
+def _owner_filter(owner):
+    kind, _, value = owner.partition(':')
+    return {'user_id': int(value)} if kind == 'user' else {'token': value}
+
+
+class DatabaseCartStore:
+    def _cart(self, owner, create=True):
+        lookup = _owner_filter(owner)
+        if create:
+            return Cart.objects.get_or_create(**lookup)[0]
+        return Cart.objects.filter(**lookup).first()
+
+    def get(self, owner):
+        from .serializers import CartSerializer
+        cart = Cart.objects.prefetch_related('items__variant').filter(**_owner_filter(owner)).first()
+        return empty_cart(owner) if cart is None else CartSerializer(cart).data
+
+    def version(self, owner):
+        """Latest ``updated_at`` of the cart and its variants as a timestamp, or None without a cart.
+
+        The body serializes variants straight from the database, and their
+        stock moves through ``QuerySet.update()`` (checkout, inventory flush)
+        without bumping the catalog generation, so their times count too.
+        """
+        row = (
+            Cart.objects.filter(**_owner_filter(owner))
+            .annotate(variants_at=Max('items__variant__updated_at'))
+            .values_list('updated_at', 'variants_at').first()
+        )
+        return None if row is None else max(t for t in row if t is not None).timestamp()
+
+    async def aget(self, owner):
+        from .serializers import CartSerializer
+        cart = await Cart.objects.prefetch_related('items__variant').filter(**_owner_filter(owner)).afirst()
+        return empty_cart(owner) if cart is None else CartSerializer(cart).data
+
+    def add(self, owner, variant, quantity):
+        cart = self._cart(owner)
+        carts.add_item(cart, variant, quantity)
+        cart.refresh_from_db(fields=['item_count'])
+        return {'cart_id': cart.id, 'item_count': cart.item_count}
+
+    def _item(self, owner, item_id):
+        lookup = {f'cart__{k}': v for k, v in _owner_filter(owner).items()}
+        item = CartItem.objects.select_related('cart', 'variant').filter(pk=item_id, **lookup).first()
+        if item is None:
+            raise CartItemNotFound(item_id)
+        return item
+
+    def set_quantity(self, owner, item_id, quantity):
+        item = self._item(owner, item_id)
+        if not carts.set_quantity(item.cart, item, quantity):
+            raise CartItemNotFound(item_id)
+        return self.get(owner)
+
+    def remove(self, owner, item_id):
+        item = self._item(owner, item_id)
+        if not carts.remove_item(item.cart, item):
+            raise CartItemNotFound(item_id)
+        return self.get(owner)
+
+    def merge(self, source, owner):
+        anon = self._cart(source, create=False)
+        if anon is None:
+            return
+        with transaction.atomic():
+            cart = self._cart(owner)
+            for item in anon.items.select_related('variant'):
+                carts.add_item(cart, item.variant, item.quantity)
+            anon.delete()
+
+    def checkout(self, owner, user):
+        return place_order(self._cart(owner), user)
+
+
+_UPDATE = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+local mode = ARGV[1]
+if mode == 'incr' then
+  redis.call('HINCRBY', KEYS[1], ARGV[2], ARGV[3])
+elseif mode == 'set' then
+  if redis.call('HEXISTS', KEYS[1], ARGV[2]) == 0 then return -2 end
+  redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+elseif mode == 'del' then
+  if redis.call('HDEL', KEYS[1], ARGV[2]) == 0 then return -2 end
+end
+redis.call('HSET', KEYS[1], '_updated', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[6])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+_HYDRATE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+_MERGE = """
+if redis.call('EXISTS', KEYS[2]) == 0 then return -1 end
+local items = redis.call('HGETALL', KEYS[1])
+for i = 1, #items, 2 do
+  if string.sub(items[i], 1, 1) ~= '_' then
+    redis.call('HINCRBY', KEYS[2], items[i], items[i + 1])
+  end
+end
+-- leave an empty cart behind so a stale database copy is not hydrated and merged again
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], '_created', ARGV[1], '_updated', ARGV[1])
+for i = 1, 2 do
+  redis.call('HSET', KEYS[i], '_updated', ARGV[1])
+  redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[3], ARGV[1], ARGV[4])
+return 1
+"""
+
+_SUBTRACT = """
+for i = 4, #ARGV, 2 do
+  if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[i])
+  end
+end
+redis.call('HSET', KEYS[1], '_updated', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[1], ARGV[3])
+return 1
+"""
+
+# release the checkout lock only while it still holds our token
+_UNLOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+# forget a dirty marker only if nobody touched the cart while it was being persisted
+_MARK_CLEAN = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if score and tonumber(score) <= tonumber(ARGV[2]) then
+  redis.call('ZREM', KEYS[1], ARGV[1])
+  return 1
+end
+return 0
+"""
+
+
+def _timestamp(value):
+    return serializers.DateTimeField().to_representation(datetime.fromtimestamp(value, tz=dt_timezone.utc))
+
+
+def variant_data(variant_ids):
+    """Serialized variants for ``variant_ids``, cached per catalog generation."""
+    from .serializers import ProductVariantSerializer
+    try:
+        generation = catalog_cache.get_generation()
+        keys = {vid: f'cart:variant:{generation}:{vid}' for vid in variant_ids}
+        found = cache.get_many(keys.values())
+    except Exception:
+        keys, found = {}, {}
+    data = {vid: found[key] for vid, key in keys.items() if key in found}
+    missing = [vid for vid in variant_ids if vid not in data]
+    if missing:
+        fresh = {
+            v.pk: ProductVariantSerializer(v).data
+            for v in ProductVariant.objects.filter(pk__in=missing)
+        }
+        data.update(fresh)
+        if keys:
+            try:
+                cache.set_many({keys[vid]: dict(value) for vid, value in fresh.items()}, catalog_cache.STALE_TTL)
+            except Exception:
+                pass
+    return data
+
+
+async def avariant_data(variant_ids):
+    """``variant_data`` on the async cache and ORM."""
+    from .serializers import ProductVariantSerializer
+    try:
+        acache = async_cache.get_cache()
+        generation = await catalog_cache.aget_generation(acache)
+        keys = {vid: f'cart:variant:{generation}:{vid}' for vid in variant_ids}
+        found = await acache.aget_many(keys.values())
+    except Exception:
+        keys, found = {}, {}
+    data = {vid: found[key] for vid, key in keys.items() if key in found}
+    missing = [vid for vid in variant_ids if vid not in data]
+    if missing:
+        fresh = {
+            v.pk: ProductVariantSerializer(v).data
+            async for v in ProductVariant.objects.filter(pk__in=missing)
+        }
+        data.update(fresh)
+        if keys:
+            try:
+                await acache.aset_many(
+                    {keys[vid]: dict(value) for vid, value in fresh.items()}, catalog_cache.STALE_TTL,
+                )
+            except Exception:
+                pass
+    return data
+
+
+class RedisCartStore:
+    prefix = 'cart'
+
+    def __init__(self, client=None, ttl=None, persist_after=None):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.client = client
+        self.ttl = ttl or getattr(settings, 'CART_TTL', 60 * 60 * 24 * 7)
+        self.persist_after = persist_after or getattr(settings, 'CART_PERSIST_AFTER', 30 * 60)
+        self._update = client.register_script(_UPDATE)
+        self._hydrate = client.register_script(_HYDRATE)
+        self._merge = client.register_script(_MERGE)
+        self._subtract = client.register_script(_SUBTRACT)
+        self._mark_clean = client.register_script(_MARK_CLEAN)
+        self._unlock = client.register_script(_UNLOCK)
+
+    def _key(self, owner):
+        return f'{self.prefix}:{owner}'
+
+    @property
+    def _dirty(self):
+        return f'{self.prefix}:dirty'
+
+    def hydrate(self, owner, create=True):
+        """Load ``owner``'s cart from the database unless it is already in Redis.
+
+        With ``create=False`` an owner with no stored cart is left without a hash.
+        """
+        if self.client.exists(self._key(owner)):
+            return
+        now = time.time()
+        args = [self.ttl, '_created', now, '_updated', now]
+        cart = Cart.objects.filter(**_owner_filter(owner)).first()
+        if cart is None and not create:
+            return
+        if cart is not None:
+            for variant_id, quantity in cart.items.values_list('variant_id', 'quantity'):
+                args += [variant_id, quantity]
+        self._hydrate(keys=[self._key(owner)], args=args)
+
+    def _call_update(self, owner, mode, variant_id, quantity=0):
+        args = [mode, variant_id, quantity, time.time(), self.ttl, owner]
+        keys = [self._key(owner), self._dirty]
+        raw = self._update(keys=keys, args=args)
+        if raw == -1:
+            self.hydrate(owner)
+            raw = self._update(keys=keys, args=args)
+        if raw == -2:
+            raise CartItemNotFound(variant_id)
+        return self._decode(raw)
+
+    def _decode(self, raw):
+        fields = {raw[i].decode(): raw[i + 1].decode() for i in range(0, len(raw), 2)}
+        meta = {k: float(v) for k, v in fields.items() if k.startswith(META_PREFIX)}
+        items = {int(k): int(v) for k, v in fields.items() if not k.startswith(META_PREFIX)}
+        return meta, items
+
+    def read(self, owner):
+        """Return ``(meta, {variant_id: quantity})``, hydrating from the database if needed."""
+        raw = self.client.hgetall(self._key(owner))
+        if not raw:
+            self.hydrate(owner, create=False)
+            raw = self.client.hgetall(self._key(owner))
+        return self._decode([x for pair in raw.items() for x in pair])
+
+    def _payload(self, owner, meta, items, variants=None):
+        if variants is None:
+            variants = variant_data(list(items))
+        lines = [
+            {'id': vid, 'variant': variants[vid], 'quantity': qty}
+            for vid, qty in sorted(items.items()) if vid in variants
+        ]
+        kind, _, value = owner.partition(':')
+        return {
+            'id': None,
+            'user': int(value) if kind == 'user' else None,
+            'items': lines,
+            'item_count': sum(line['quantity'] for line in lines),
+            'subtotal': '%.2f' % sum(
+                (Decimal(line['variant']['price']) * line['quantity'] for line in lines), Decimal('0')
+            ),
+            'created_at': _timestamp(meta.get('_created', time.time())),
+            'updated_at': _timestamp(meta.get('_updated', time.time())),
+        }
+
+    def get(self, owner):
+        return self._payload(owner, *self.read(owner))
+
+    def version(self, owner):
+        """``_updated`` of the cart hash, or None when it is not in Redis.
+
+        Variant data comes from ``variant_data``, cached per catalog
+        generation, which the ETag covers separately.
+        """
+        updated = self.client.hget(self._key(owner), '_updated')
+        return None if updated is None else float(updated)
+
+    async def aget(self, owner):
+        client = async_cache.get_client()
+        raw = await client.hgetall(self._key(owner))
+        if not raw:
+            await sync_to_async(self.hydrate)(owner, create=False)
+            raw = await client.hgetall(self._key(owner))
+        meta, items = self._decode([x for pair in raw.items() for x in pair])
+        return self._payload(owner, meta, items, await avariant_data(list(items)))
+
+    def add(self, owner, variant, quantity):
+        _, items = self._call_update(owner, 'incr', variant.pk, quantity)
+        return {'cart_id': None, 'item_count': sum(items.values())}
+
+    def set_quantity(self, owner, item_id, quantity):
+        return self._payload(owner, *self._call_update(owner, 'set', item_id, quantity))
+
+    def remove(self, owner, item_id):
+        return self._payload(owner, *self._call_update(owner, 'del', item_id))
+
+    def merge(self, source, owner):
+        self.hydrate(source)
+        keys = [self._key(source), self._key(owner), self._dirty]
+        args = [time.time(), self.ttl, owner, source]
+        if self._merge(keys=keys, args=args) == -1:
+            self.hydrate(owner)
+            self._merge(keys=keys, args=args)
+
+    def _take(self, owner, items):
+        """Subtract ``{variant_id: quantity}`` from the cart; negative quantities put lines back."""
+        args = [time.time(), self.ttl, owner]
+        for vid, qty in sorted(items.items()):
+            args += [vid, qty]
+        self._subtract(keys=[self._key(owner), self._dirty], args=args)
+
+    def checkout(self, owner, user):
+        # one checkout per cart at a time; the lock holds a token so only its owner releases it
+        lock, token = f'{self._key(owner)}:checkout', secrets.token_hex(16)
+        if not self.client.set(lock, token, nx=True, ex=CHECKOUT_LOCK_SECONDS):
+            raise CheckoutInProgress()
+        try:
+            _, items = self.read(owner)
+            if not items:
+                raise EmptyCart()
+            variants = ProductVariant.objects.in_bulk(list(items))
+            missing = sorted(set(items) - set(variants))
+            if missing:
+                raise UnknownVariants(missing)
+            lines = [(variants[vid], qty) for vid, qty in sorted(items.items())]
+            # take the ordered lines out first (lines added meanwhile survive): if Redis fails
+            # here there is no order yet, so the cart cannot be ordered twice
+            self._take(owner, items)
+            try:
+                order = order_from_lines(user, lines)
+            except Exception:
+                try:
+                    self._take(owner, {vid: -qty for vid, qty in items.items()})
+                except Exception:
+                    logger.error('Could not restore cart %s after a failed checkout', owner, exc_info=True)
+                raise
+        finally:
+            self._unlock(keys=[lock], args=[token])
+        transaction.on_commit(lambda: _enqueue_persist([owner]))
+        return order
+
+    def dirty_owners(self, idle=None, limit=500):
+        """Owners last written more than ``idle`` seconds ago, as ``[(owner, score)]``."""
+        cutoff = time.time() - (self.persist_after if idle is None else idle)
+        raw = self.client.zrangebyscore(self._dirty, '-inf', cutoff, start=0, num=limit, withscores=True)
+        return [(owner.decode(), score) for owner, score in raw]
+
+    def persist(self, owners=None, idle=None):
+        """Write carts behind to ``Cart``/``CartItem``; returns the number persisted.
+
+        Without ``owners`` every cart idle for ``persist_after`` seconds is
+        written. Carts whose hash already expired are left as last persisted.
+        """
+        if owners is None:
+            pending = self.dirty_owners(idle)
+        else:
+            scores = self.client.zmscore(self._dirty, owners) if owners else []
+            pending = [(o, s) for o, s in zip(owners, scores) if s is not None]
+        for owner, score in pending:
+            raw = self.client.hgetall(self._key(owner))
+            if raw:
+                self._write(owner, self._decode([x for pair in raw.items() for x in pair])[1])
+            self._mark_clean(keys=[self._dirty], args=[owner, repr(score)])
+        return len(pending)
+
+    def _write(self, owner, items):
+        lookup = _owner_filter(owner)
+        with transaction.atomic():
+            if not items and 'token' in lookup:
+                Cart.objects.filter(**lookup).delete()
+                return
+            cart, _ = Cart.objects.get_or_create(**lookup)
+            CartItem.objects.filter(cart=cart).delete()
+            prices = dict(ProductVariant.objects.filter(pk__in=list(items)).values_list('pk', 'price'))
+            lines = [(vid, qty) for vid, qty in items.items() if vid in prices]
+            CartItem.objects.bulk_create([CartItem(cart=cart, variant_id=vid, quantity=qty) for vid, qty in lines])
+            Cart.objects.filter(pk=cart.pk).update(
+                item_count=sum(qty for _, qty in lines),
+                subtotal=sum((prices[vid] * qty for vid, qty in lines), Decimal('0')),
+                updated_at=timezone.now(),
+            )
+
+
+def _enqueue_persist(owners):
+    from .tasks import persist_carts
+    try:
+        persist_carts.delay(owners)
+    except Exception:
+        # the periodic persist_carts run picks the owner up from the dirty set
+        pass
+
+
+_store = None
+
+
+def get_store():
+    """Return the configured cart store (``CART_BACKEND``)."""
+    global _store
+    backend = getattr(settings, 'CART_BACKEND', 'database')
+    if backend != 'redis':
+        return DatabaseCartStore()
+    if _store is None:
+        _store = RedisCartStore()
+    return _store
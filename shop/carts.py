@@ -0,0 +1,65 @@
+"""Cart mutations that keep ``Cart.item_count``/``Cart.subtotal`` in step.
+
+Each operation touches the line and then shifts the cart's stored totals
+with one ``F()`` UPDATE, so the cost does not depend on how many lines the
+cart has. Totals only move when the line write matched a row, so a line
+changed or removed concurrently is never counted twice. The subtotal uses
+the variant price at the time of the change;
+``manage.py check_cart_totals --fix`` recomputes it after repricing.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import CartItem
+
+
+def add_item(cart, variant, quantity):
+    with transaction.atomic():
+        lines = CartItem.objects.filter(cart=cart, variant=variant)
+        if not lines.update(quantity=F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(cart=cart, variant=variant, quantity=quantity)
+            except IntegrityError:
+                # a concurrent add created the line first
+                lines.update(quantity=F('quantity') + quantity)
+        cart.apply_delta(quantity, quantity * variant.price)
+
+
+def set_quantity(cart, item, quantity):
+    """Set ``item.quantity``; ``item.variant`` should already be loaded.
+
+    Returns False when the line is gone. Like ``remove_item``, the write only
+    matches the quantity the delta was computed from; after a concurrent
+    change the line is re-read and the write retried.
+    """
+    while True:
+        delta = quantity - item.quantity
+        with transaction.atomic():
+            line = CartItem.objects.filter(pk=item.pk, quantity=item.quantity)
+            if line.update(quantity=quantity):
+                cart.apply_delta(delta, delta * item.variant.price)
+                item.quantity = quantity
+                return True
+        if not _reread(item):
+            return False
+
+
+def remove_item(cart, item):
+    """Delete ``item``; returns False when it was already gone."""
+    while True:
+        with transaction.atomic():
+            deleted, _ = CartItem.objects.filter(pk=item.pk, quantity=item.quantity).delete()
+            if deleted:
+                cart.apply_delta(-item.quantity, -item.quantity * item.variant.price)
+                return True
+        if not _reread(item):
+            return False
+
+
+def _reread(item):
+    quantity = CartItem.objects.filter(pk=item.pk).values_list('quantity', flat=True).first()
+    if quantity is None:
+        return False
+    item.quantity = quantity
+    return True
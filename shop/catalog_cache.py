@@ -0,0 +1,151 @@
+"""Generation-versioned cache for catalog reads.
+
+Every write to ``Product``, ``ProductVariant`` or ``Category`` bumps a
+single generation counter (see ``shop.signals``). Cached entries remember
+the generation they were built for, so invalidation is one ``INCR`` no
+matter how many catalog keys exist.
+
+Rebuilds are single-flight: the worker that wins ``cache.add`` on the lock
+key recomputes while everyone else keeps serving the previous (stale) value,
+or briefly waits for the winner when there is nothing to serve yet. Builders
+should return plain dicts/lists so hits are cheap to unpickle.
+
+Next to each entry a small ``<key>:version`` records the generation and
+freshness deadline it was built with. ``fresh_version`` reads only that,
+so conditional GETs (ETags, see ``shop.conditional``) can answer 304
+without fetching or rebuilding the entry.
+
+``acached`` is the same protocol for the async views, on ``shop.async_cache``.
+"""
+import asyncio
+import logging
+import time
+
+from django.core.cache import cache
+
+from . import async_cache, replicas
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'catalog:generation'
+CACHE_TTL = 60  # seconds an entry counts as fresh
+STALE_TTL = 60 * 60  # how long a stale entry may still be served during a rebuild
+LOCK_TTL = 30
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+async def aget_generation(acache):
+    generation = await acache.aget(GENERATION_KEY)
+    if generation is None:
+        await acache.aadd(GENERATION_KEY, 1, None)
+        generation = await acache.aget(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Invalidate every catalog entry; errors are logged so writes never fail on cache outages."""
+    # rebuilds must not read a replica that has not seen the write yet
+    replicas.pin(replicas.CATALOG)
+    try:
+        cache.add(GENERATION_KEY, 1, None)
+        return cache.incr(GENERATION_KEY)
+    except Exception:
+        logger.warning('Failed to bump catalog cache generation', exc_info=True)
+        return None
+
+
+def cached(name, build, ttl=CACHE_TTL):
+    """Return ``build()`` for the current catalog generation, rebuilding at most once cluster-wide."""
+    return cached_with_version(name, build, ttl)[1]
+
+
+def cached_with_version(name, build, ttl=CACHE_TTL):
+    """``(version, data)``: ``cached()`` plus the ``(generation, fresh_until)`` of the entry served.
+
+    The version is None when the data was built without being stored.
+    """
+    key = f'catalog:{name}'
+    try:
+        generation = get_generation()
+        entry = cache.get(key)
+    except Exception:
+        logger.warning('Catalog cache unavailable, building %s directly', name, exc_info=True)
+        return None, build()
+    if entry is not None and entry[0] == generation and entry[1] > time.time():
+        return entry[:2], entry[2]
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TTL):
+        try:
+            data = build()
+            version = (generation, time.time() + ttl)
+            cache.set_many({key: (*version, data), f'{key}:version': version}, STALE_TTL)
+            return version, data
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry[:2], entry[2]
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == generation:
+            return entry[:2], entry[2]
+    return None, build()
+
+
+def fresh_version(name):
+    """Version of the entry ``cached(name, ...)`` would serve without a rebuild, or None."""
+    key = f'catalog:{name}'
+    try:
+        found = cache.get_many([GENERATION_KEY, f'{key}:version'])
+    except Exception:
+        return None
+    version = found.get(f'{key}:version')
+    if version is not None and version[0] == found.get(GENERATION_KEY) and version[1] > time.time():
+        return tuple(version)
+    return None
+
+
+async def acached(name, build, ttl=CACHE_TTL):
+    """``cached()`` for async views; ``build`` is a coroutine function."""
+    key = f'catalog:{name}'
+    try:
+        acache = async_cache.get_cache()
+        generation = await aget_generation(acache)
+        entry = await acache.aget(key)
+    except Exception:
+        logger.warning('Catalog cache unavailable, building %s directly', name, exc_info=True)
+        return await build()
+    if entry is not None and entry[0] == generation and entry[1] > time.time():
+        return entry[2]
+
+    lock_key = f'{key}:lock'
+    if await acache.aadd(lock_key, 1, LOCK_TTL):
+        try:
+            data = await build()
+            version = (generation, time.time() + ttl)
+            await acache.aset_many({key: (*version, data), f'{key}:version': version}, STALE_TTL)
+            return data
+        finally:
+            await acache.adelete(lock_key)
+
+    if entry is not None:
+        return entry[2]
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        await asyncio.sleep(WAIT_INTERVAL)
+        entry = await acache.aget(key)
+        if entry is not None and entry[0] == generation:
+            return entry[2]
+    return await build()
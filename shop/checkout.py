@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .inventory import InventoryUnavailable, get_inventory
+from .models import Cart, CartItem, Order, OrderItem, Payment, ProductVariant
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class CheckoutInProgress(Exception):
+    """Another checkout of the same cart has not finished yet."""
+
+
+class UnknownVariants(Exception):
+    def __init__(self, variant_ids):
+        self.variant_ids = variant_ids
+        super().__init__('Unknown variant ids: %s' % ', '.join(map(str, variant_ids)))
+
+
+class InsufficientStock(Exception):
+    def __init__(self, skus):
+        self.skus = skus
+        super().__init__('Insufficient stock for: %s' % ', '.join(skus))
+
+
+def reserve_stock(quantities, variants=None):
+    """Decrement stock for ``{variant_id: quantity}`` with one conditional UPDATE.
+
+    Every row is guarded by ``stock >= quantity``; if fewer rows than requested
+    were updated the reservation raises ``InsufficientStock`` so the enclosing
+    transaction rolls back. ``variants`` (id -> ProductVariant) is only used to
+    name the short SKUs in the error.
+    """
+    if not quantities:
+        return
+    guard = Q()
+    whens = []
+    for variant_id, qty in quantities.items():
+        guard |= Q(pk=variant_id, stock__gte=qty)
+        whens.append(When(pk=variant_id, then=F('stock') - qty))
+    updated = ProductVariant.objects.filter(guard).update(
+        stock=Case(*whens, output_field=models.PositiveIntegerField()), updated_at=timezone.now(),
+    )
+    if updated != len(quantities):
+        variants = variants or {}
+        short = [
+            variants[vid].sku for vid, qty in quantities.items()
+            if vid in variants and variants[vid].stock < qty
+        ]
+        raise InsufficientStock(short or [str(vid) for vid in quantities])
+
+
+@contextmanager
+def reserved_stock(quantities, variants):
+    """Run the enclosed block in a transaction that holds stock for ``quantities``.
+
+    With the Redis inventory backend the hold is taken against the hot-SKU
+    counters before the transaction and committed as its last step (released
+    on any error); otherwise ``reserve_stock`` runs inside the transaction.
+    """
+    inventory = get_inventory()
+    token = None
+    if inventory is not None:
+        try:
+            token = inventory.reserve(quantities)
+        except InventoryUnavailable as exc:
+            raise InsufficientStock([variants[vid].sku for vid in exc.variant_ids]) from exc
+    try:
+        with transaction.atomic():
+            if token is None:
+                reserve_stock(quantities, variants)
+            yield
+            if token is not None and not inventory.commit(token):
+                # the hold expired while we were writing the order
+                token = None
+                raise InsufficientStock([variants[vid].sku for vid in quantities])
+    except Exception:
+        if token is not None:
+            inventory.release(token)
+        raise
+
+
+def order_from_lines(user, lines, provider='stub'):
+    """Create a paid order for ``[(variant, quantity), ...]``, reserving stock first."""
+    quantities = {}
+    variants = {}
+    for variant, quantity in lines:
+        quantities[variant.pk] = quantities.get(variant.pk, 0) + quantity
+        variants[variant.pk] = variant
+    total = sum((quantity * variant.price for variant, quantity in lines), Decimal('0'))
+    with reserved_stock(quantities, variants):
+        order = Order.objects.create(user_id=user.pk, total=total, item_count=sum(quantities.values()))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, variant_id=variant.pk, quantity=quantity, price=variant.price)
+            for variant, quantity in lines
+        ])
+        Payment.objects.create(order=order, provider=provider, amount=total, success=True)
+    return order
+
+
+def place_order(cart, user, provider='stub'):
+    """Turn ``cart`` into a paid order using a fixed number of queries.
+
+    Lines and variants are loaded in one query, stock is reserved in one
+    statement, order lines are written with ``bulk_create`` and the cart is
+    emptied, all inside a single transaction. The cart row is locked first,
+    so a concurrent checkout of the same cart finds it empty.
+    """
+    with transaction.atomic():
+        Cart.objects.select_for_update().get(pk=cart.pk)
+        lines = list(CartItem.objects.filter(cart=cart).select_related('variant'))
+        if not lines:
+            raise EmptyCart()
+        deleted, _ = CartItem.objects.filter(cart=cart).delete()
+        if not deleted:
+            raise EmptyCart()
+        Cart.objects.filter(pk=cart.pk).update(item_count=0, subtotal=0, updated_at=timezone.now())
+        return order_from_lines(user, [(line.variant, line.quantity) for line in lines], provider)
+
+
+def create_orders(user, orders):
+    """Create one order per entry of ``orders`` (each a list of ``(variant_id, quantity)``).
+
+    All variants are resolved with one ``in_bulk``, stock for every order is
+    reserved together, and orders and lines are written with two
+    ``bulk_create`` calls. Returns ``[(order, [OrderItem, ...]), ...]``.
+    """
+    if not orders or any(not lines for lines in orders):
+        raise EmptyCart()
+    quantities = {}
+    for lines in orders:
+        for variant_id, qty in lines:
+            if qty < 1:
+                raise ValueError('Quantity must be >= 1')
+            quantities[variant_id] = quantities.get(variant_id, 0) + qty
+    variants = ProductVariant.objects.in_bulk(list(quantities))
+    missing = sorted(set(quantities) - set(variants))
+    if missing:
+        raise UnknownVariants(missing)
+    created = []
+    with reserved_stock(quantities, variants):
+        order_objs = Order.objects.bulk_create([
+            Order(
+                user_id=user.pk, total=sum((variants[vid].price * qty for vid, qty in lines), Decimal('0')),
+                item_count=sum(qty for _, qty in lines),
+            )
+            for lines in orders
+        ])
+        items = []
+        for order, lines in zip(order_objs, orders):
+            order_items = [
+                OrderItem(order=order, variant=variants[vid], quantity=qty, price=variants[vid].price)
+                for vid, qty in lines
+            ]
+            items.extend(order_items)
+            created.append((order, order_items))
+        OrderItem.objects.bulk_create(items)
+    return created
@@ -0,0 +1,226 @@
+"""Per-destination circuit breakers and rate limits for outbound webhooks.
+
+State is shared by every worker through Redis, so one failing subscriber
+trips the breaker cluster-wide:
+
+* ``CircuitBreaker`` (Django cache) opens after ``threshold`` failures
+  within ``window`` seconds, rejects calls for ``reset_timeout`` seconds,
+  then lets a single half-open probe through; its result closes or
+  re-opens the circuit.
+* ``TokenBucket`` (Lua on the raw Redis connection) caps requests per
+  second per destination. Its rate adapts: 429/503 responses halve it and
+  successes restore it step by step, down to ``min_factor`` of the
+  configured rate.
+
+Both fail open when Redis is unreachable. Trips and shed calls are counted
+under ``webhook:metrics:*`` (see ``metrics()``).
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+METRICS = ('trips', 'shed_open', 'shed_rate', 'throttled')
+SLOW_DOWN_STATUSES = (429, 503)
+
+
+def destination_key(url):
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def count(name, metric, n=1):
+    key = f'webhook:metrics:{name}:{metric}'
+    try:
+        cache.add(key, 0, None)
+        cache.incr(key, n)
+    except Exception:
+        pass
+
+
+def metrics(name):
+    try:
+        values = cache.get_many([f'webhook:metrics:{name}:{m}' for m in METRICS])
+    except Exception:
+        values = {}
+    return {m: values.get(f'webhook:metrics:{name}:{m}', 0) for m in METRICS}
+
+
+class CircuitBreaker:
+    def __init__(self, name, threshold=None, window=None, reset_timeout=None):
+        self.name = name
+        self.threshold = threshold or getattr(settings, 'WEBHOOK_BREAKER_THRESHOLD', 5)
+        self.window = window or getattr(settings, 'WEBHOOK_BREAKER_WINDOW', 60)
+        self.reset_timeout = reset_timeout or getattr(settings, 'WEBHOOK_BREAKER_RESET', 30)
+        self.prefix = f'webhook:breaker:{name}'
+        self.last_state = CLOSED
+
+    def state(self, now=None):
+        try:
+            open_until = cache.get(f'{self.prefix}:open_until')
+        except Exception:
+            return CLOSED
+        if open_until is None:
+            return CLOSED
+        return OPEN if (time.time() if now is None else now) < open_until else HALF_OPEN
+
+    def allow(self, n=1, now=None):
+        """How many of ``n`` calls may go out; in half-open state only one probe is admitted."""
+        state = self.last_state = self.state(now)
+        allowed = n
+        if state == OPEN:
+            allowed = 0
+        elif state == HALF_OPEN:
+            try:
+                allowed = 1 if cache.add(f'{self.prefix}:probe', 1, self.reset_timeout) else 0
+            except Exception:
+                pass
+        if allowed < n:
+            count(self.name, 'shed_open', n - allowed)
+        return allowed
+
+    def success(self):
+        try:
+            if cache.get(f'{self.prefix}:open_until') is not None:
+                cache.delete_many([f'{self.prefix}:open_until', f'{self.prefix}:probe', f'{self.prefix}:failures'])
+                logger.info('Webhook circuit %s closed', self.name)
+        except Exception:
+            pass
+
+    def failure(self, now=None):
+        now = time.time() if now is None else now
+        try:
+            if self.state(now) != CLOSED:
+                self._open(now)
+                return
+            key = f'{self.prefix}:failures'
+            cache.add(key, 0, self.window)
+            if cache.incr(key) >= self.threshold:
+                self._open(now)
+        except Exception:
+            pass
+
+    def _open(self, now):
+        cache.set(f'{self.prefix}:open_until', now + self.reset_timeout, None)
+        cache.delete_many([f'{self.prefix}:probe', f'{self.prefix}:failures'])
+        count(self.name, 'trips')
+        logger.warning('Webhook circuit %s opened for %ss', self.name, self.reset_timeout)
+
+
+_TAKE = """
+local rate = tonumber(ARGV[1]) * tonumber(redis.call('HGET', KEYS[1], 'factor') or '1')
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or ARGV[3])
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(tonumber(ARGV[4]), math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', ARGV[3])
+redis.call('EXPIRE', KEYS[1], 3600)
+return {granted, redis.call('HGET', KEYS[1], 'factor') or '1'}
+"""
+
+_ADJUST = """
+local factor = tonumber(redis.call('HGET', KEYS[1], 'factor') or '1')
+if ARGV[1] == 'down' then
+  factor = math.max(tonumber(ARGV[2]), factor / 2)
+elseif factor < 1 then
+  factor = math.min(1, factor + tonumber(ARGV[3]))
+else
+  return tostring(factor)
+end
+redis.call('HSET', KEYS[1], 'factor', tostring(factor))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(factor)
+"""
+
+
+class TokenBucket:
+    min_factor = 0.05
+    recovery_step = 0.05
+
+    def __init__(self, name, rate=None, capacity=None, client=None):
+        self.name = name
+        self.rate = rate or getattr(settings, 'WEBHOOK_RATE', 500)
+        self.capacity = capacity or getattr(settings, 'WEBHOOK_BURST', self.rate)
+        self.key = f'webhook:bucket:{name}'
+        self.client = client
+        self.factor = 1.0  # as of the last take()
+        self._take = self._adjust = None
+
+    def _scripts(self):
+        if self._take is None:
+            if self.client is None:
+                from django_redis import get_redis_connection
+                self.client = get_redis_connection('default')
+            self._take = self.client.register_script(_TAKE)
+            self._adjust = self.client.register_script(_ADJUST)
+
+    def take(self, n=1, now=None):
+        """Consume up to ``n`` tokens and return how many were granted."""
+        try:
+            self._scripts()
+            granted, factor = self._take(
+                keys=[self.key], args=[self.rate, self.capacity, time.time() if now is None else now, n],
+            )
+        except Exception:
+            return n
+        self.factor = float(factor)
+        if granted < n:
+            count(self.name, 'shed_rate', n - granted)
+        return granted
+
+    def slow_down(self):
+        count(self.name, 'throttled')
+        return self._adjust_factor('down')
+
+    def speed_up(self):
+        if self.factor >= 1:
+            return self.factor
+        return self._adjust_factor('up')
+
+    def _adjust_factor(self, direction):
+        try:
+            self._scripts()
+            self.factor = float(self._adjust(keys=[self.key], args=[direction, self.min_factor, self.recovery_step]))
+        except Exception:
+            return None
+        return self.factor
+
+
+class DestinationGuard:
+    """Breaker plus rate limit for one destination URL.
+
+    ``admit()`` remembers the circuit state and rate factor it saw, so
+    successes against a healthy destination cost no Redis round trips.
+    """
+
+    def __init__(self, url, client=None):
+        self.name = destination_key(url)
+        self.breaker = CircuitBreaker(self.name)
+        self.bucket = TokenBucket(self.name, client=client)
+        self.state = CLOSED
+
+    def admit(self, n=1):
+        """Return how many of ``n`` pending calls may be sent now."""
+        allowed = self.breaker.allow(n)
+        self.state = self.breaker.last_state
+        return self.bucket.take(allowed) if allowed else 0
+
+    def observe(self, status):
+        """Feed back a response status, or None for a connection error/timeout."""
+        if status is not None and 200 <= status < 300:
+            if self.state != CLOSED:
+                self.breaker.success()
+                self.state = CLOSED
+            self.bucket.speed_up()
+            return
+        if status in SLOW_DOWN_STATUSES:
+            self.bucket.slow_down()
+        if status is None or status >= 500 or status == 429:
+            self.breaker.failure()
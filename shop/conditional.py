@@ -0,0 +1,27 @@
+"""Conditional GET helpers: ETag/Last-Modified validators and 304 responses.
+
+Views compute their validators from cheap version data (the catalog
+generation, a cart's ``updated_at``) *before* building a body, return
+``not_modified()`` when the client already has it, and otherwise stamp the
+full response with ``set_validators()``.
+"""
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+def strong_etag(*parts):
+    return '"%s"' % '-'.join(str(part) for part in parts)
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 for ``request`` if its ``If-None-Match``/``If-Modified-Since`` still match, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    return response if response is not None and response.status_code == 304 else None
+
+
+def set_validators(response, etag, last_modified, vary=(), **cache_control):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(int(last_modified))
+    patch_cache_control(response, **cache_control)
+    patch_vary_headers(response, vary)
+    return response
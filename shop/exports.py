@@ -0,0 +1,112 @@
+"""Streaming catalog export for feed partners (NDJSON or CSV).
+
+Products are read with ``.iterator(chunk_size=...)`` (a server-side cursor
+on Postgres) and their variants are fetched one chunk at a time, so memory
+stays flat however large the catalog is. Output is yielded in ~64 KB
+pieces, ready for ``StreamingHttpResponse`` or a file.
+
+A full export lists active products. With ``since`` it lists every product
+that changed, or whose variants changed, at or after that time. Inactive
+ones are included so feeds can drop them, followed by products deleted
+since then (``ProductTombstone``) as ``{"id", "deleted": true}`` entries,
+which CSV writes as inactive rows with only the id and time.
+"""
+import csv
+import itertools
+import json
+
+from django.db.models import Exists, OuterRef, Q
+
+from . import read_models
+from .models import Product, ProductTombstone, ProductVariant
+from .renderers import FastJSONRenderer
+
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+CSV_HEADER = [
+    'product_id', 'name', 'description', 'category', 'is_active', 'updated_at',
+    'variant_id', 'sku', 'price', 'stock', 'attributes',
+]
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+
+def changed_products(since=None):
+    if since is None:
+        return Product.objects.filter(is_active=True)
+    variants = ProductVariant.objects.filter(product=OuterRef('pk'), updated_at__gte=since)
+    return Product.objects.filter(Q(updated_at__gte=since) | Q(Exists(variants)))
+
+
+def iter_products(since=None, chunk_size=CHUNK_SIZE):
+    """Yield read-model product dicts plus ``updated_at``, in id order, then deletions."""
+    rows = (
+        changed_products(since).order_by('id')
+        .values(*read_models.PRODUCT_FIELDS, 'updated_at')
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        for row, item in zip(chunk, read_models.serialize_products(chunk)):
+            item['updated_at'] = row['updated_at']
+            yield item
+    if since is not None:
+        yield from iter_tombstones(since, chunk_size)
+
+
+def iter_tombstones(since, chunk_size=CHUNK_SIZE):
+    tombstones = (
+        ProductTombstone.objects.filter(deleted_at__gte=since).order_by('product_id')
+        .values_list('product_id', 'deleted_at')
+        .iterator(chunk_size=chunk_size)
+    )
+    for product_id, deleted_at in tombstones:
+        yield {'id': product_id, 'deleted': True, 'is_active': False, 'updated_at': deleted_at}
+
+
+def ndjson_lines(products):
+    renderer = FastJSONRenderer()
+    for product in products:
+        yield renderer.render(product) + b'\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(products):
+    """One row per variant; products without variants get one row with empty variant columns."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER).encode()
+    for p in products:
+        head = [
+            p['id'], p.get('name', ''), p.get('description', ''), p.get('category') or '',
+            str(p['is_active']).lower(), p['updated_at'].isoformat(),
+        ]
+        for v in p.get('variants') or [{}]:
+            tail = [v.get('id', ''), v.get('sku', ''), v.get('price', ''), v.get('stock', '')]
+            attributes = json.dumps(v['attributes'], sort_keys=True) if v else ''
+            yield writer.writerow(head + tail + [attributes]).encode()
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Join small byte strings into pieces of roughly ``size`` bytes."""
+    parts, length = [], 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def export(fmt, since=None, chunk_size=CHUNK_SIZE):
+    """Byte chunks of the catalog in ``fmt`` (one of ``FORMATS``)."""
+    products = iter_products(since, chunk_size)
+    lines = ndjson_lines(products) if fmt == 'ndjson' else csv_lines(products)
+    return buffered(lines)
@@ -0,0 +1,146 @@
+"""Request-scoped batching for GraphQL relation resolvers.
+
+graphql-core executes sync resolvers depth-first, so a classic DataLoader
+cannot wait for siblings to queue their keys. Instead keys are queued up
+front with ``want()`` by the resolver that produced the parent objects
+(root resolvers through ``queue()``, ``items_by_order`` for the variants of
+the items it loads) and the first ``load()`` fetches every queued key in
+one query. Results are memoized for the rest of the request.
+
+Root resolvers additionally call ``optimize()``, which derives
+``select_related``/``prefetch_related`` from the selection set; loaders
+return that prefetched data without querying at all.
+"""
+from collections import defaultdict
+
+from django.db.models import Prefetch
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .models import OrderItem, ProductVariant
+
+
+class BatchLoader:
+    def __init__(self, batch_load, many=False):
+        self.batch_load = batch_load
+        self.many = many
+        self.cache = {}
+        self.pending = set()
+
+    def want(self, keys):
+        self.pending.update(k for k in keys if k not in self.cache)
+
+    def prime(self, key, value):
+        self.cache[key] = value
+        self.pending.discard(key)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            keys = list(self.pending)
+            self.pending.clear()
+            results = self.batch_load(keys)
+            for k in keys:
+                self.cache[k] = results.get(k, [] if self.many else None)
+        return self.cache[key]
+
+
+class Loaders:
+    def __init__(self):
+        self.variants_by_product = BatchLoader(self._variants_by_product, many=True)
+        self.items_by_order = BatchLoader(self._items_by_order, many=True)
+        self.variant = BatchLoader(self._variants)
+
+    def _variants_by_product(self, product_ids):
+        grouped = defaultdict(list)
+        for v in ProductVariant.objects.filter(product_id__in=product_ids).order_by('id'):
+            grouped[v.product_id].append(v)
+            self.variant.prime(v.pk, v)
+        return grouped
+
+    def _items_by_order(self, order_ids):
+        grouped = defaultdict(list)
+        items = list(OrderItem.objects.filter(order_id__in=order_ids).order_by('id'))
+        for item in items:
+            grouped[item.order_id].append(item)
+        self.variant.want(item.variant_id for item in items)
+        return grouped
+
+    def _variants(self, variant_ids):
+        return ProductVariant.objects.in_bulk(variant_ids)
+
+
+def get_loaders(info):
+    loaders = getattr(info.context, '_graphql_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(info.context, '_graphql_loaders', loaders)
+    return loaders
+
+
+def queue(objects, *loaders):
+    """Evaluate ``objects`` and queue their primary keys with ``loaders``.
+
+    Relations ``optimize()`` did not prefetch then load in one query for
+    all parents instead of one per parent.
+    """
+    objects = list(objects)
+    for loader in loaders:
+        loader.want(obj.pk for obj in objects)
+    return objects
+
+
+def load_related(loader, instance, name, key):
+    """Return prefetched ``instance.<name>`` if available, otherwise batch-load ``key``."""
+    prefetched = getattr(instance, '_prefetched_objects_cache', {})
+    if name in prefetched:
+        return list(prefetched[name])
+    field = instance._meta.get_field(name)
+    if not field.auto_created and field.is_cached(instance):
+        return field.get_cached_value(instance)
+    return loader.load(key)
+
+
+def selected_paths(info):
+    """Dotted paths of every field selected below the current one, e.g. {'items', 'items.variant'}."""
+    paths = set()
+
+    def walk(selection_set, prefix):
+        if selection_set is None:
+            return
+        for node in selection_set.selections:
+            if isinstance(node, FieldNode):
+                path = prefix + node.name.value
+                paths.add(path)
+                walk(node.selection_set, path + '.')
+            elif isinstance(node, InlineFragmentNode):
+                walk(node.selection_set, prefix)
+            elif isinstance(node, FragmentSpreadNode):
+                walk(info.fragments[node.name.value].selection_set, prefix)
+
+    for field_node in info.field_nodes:
+        walk(field_node.selection_set, '')
+    return paths
+
+
+# selection path -> queryset optimisation, most specific first
+PRODUCT_PLAN = (
+    ('variants', lambda qs: qs.prefetch_related('variants')),
+)
+ORDER_PLAN = (
+    ('items.variant', lambda qs: qs.prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('variant').order_by('id'))
+    )),
+    ('items', lambda qs: qs.prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('id')))),
+)
+
+
+def optimize(queryset, info, plan):
+    """Apply the first matching optimisation for each top-level relation in ``plan``."""
+    paths = selected_paths(info)
+    applied = set()
+    for path, apply in plan:
+        root = path.split('.')[0]
+        if path in paths and root not in applied:
+            queryset = apply(queryset)
+            applied.add(root)
+    return queryset
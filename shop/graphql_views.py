@@ -0,0 +1,313 @@
+"""GraphQL endpoint with persisted queries, cost limits and response caching.
+
+* Automatic persisted queries (Apollo protocol): clients send
+  ``extensions.persistedQuery.sha256Hash`` and only include the query text
+  the first time. Texts are kept in the shared cache; parsed *and
+  validated* documents live in a per-process LRU, so repeat queries skip
+  ``parse`` and ``validate`` entirely.
+* Depth and cost limits run as validation rules, i.e. before execution and
+  only once per distinct document.
+* Anonymous queries that only touch catalog root fields are cached per
+  catalog generation through ``shop.catalog_cache``.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from accounts.authentication import StatelessJWTAuthentication
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from graphene.validation import depth_limit_validator
+from graphene_django.settings import graphene_settings
+from graphene_django.views import MUTATION_ERRORS_FLAG, GraphQLView, HttpError
+from graphql import (
+    ExecutionResult, GraphQLError, GraphQLList, GraphQLNonNull, OperationType, execute,
+    get_operation_ast, parse, specified_rules, validate,
+)
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode, OperationDefinitionNode
+from graphql.validation import ValidationRule
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import catalog_cache, replicas
+
+APQ_TTL = 60 * 60 * 24 * 7
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+
+
+def query_cost(fields, schema_type, fragments, list_size, spread=frozenset()):
+    """Each field costs 1 plus its children, multiplied by ``list_size`` below list fields.
+
+    ``spread`` holds the fragments already expanded on the current path, so a
+    fragment cycle is counted once instead of recursing forever.
+    """
+    total = 0
+    for node in fields:
+        if isinstance(node, FragmentSpreadNode):
+            name = node.name.value
+            fragment = fragments.get(name)
+            if fragment is not None and name not in spread:
+                total += query_cost(
+                    fragment.selection_set.selections, schema_type, fragments, list_size, spread | {name},
+                )
+            continue
+        if isinstance(node, InlineFragmentNode):
+            total += query_cost(node.selection_set.selections, schema_type, fragments, list_size, spread)
+            continue
+        name = node.name.value
+        if name.startswith('__'):
+            continue
+        field = getattr(schema_type, 'fields', {}).get(name)
+        if field is None:
+            continue
+        field_type = field.type
+        multiplier = 1
+        while isinstance(field_type, (GraphQLNonNull, GraphQLList)):
+            if isinstance(field_type, GraphQLList):
+                multiplier *= list_size
+            field_type = field_type.of_type
+        children = 0
+        if node.selection_set is not None:
+            children = query_cost(node.selection_set.selections, field_type, fragments, list_size, spread)
+        total += 1 + multiplier * children
+    return total
+
+
+def cost_limit_validator(max_cost, list_size):
+    class CostLimitValidator(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            schema = self.context.schema
+            root = {
+                OperationType.QUERY: schema.query_type,
+                OperationType.MUTATION: schema.mutation_type,
+                OperationType.SUBSCRIPTION: schema.subscription_type,
+            }[node.operation]
+            fragments = {
+                d.name.value: d for d in self.context.document.definitions
+                if not isinstance(d, OperationDefinitionNode)
+            }
+            cost = query_cost(node.selection_set.selections, root, fragments, list_size)
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum allowed cost of {max_cost}.", [node],
+                ))
+
+    return CostLimitValidator
+
+
+class DocumentCache:
+    """Thread-safe LRU of ``(schema, sha256(query)) -> (document, validation errors)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+documents = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 512))
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class Uncacheable(Exception):
+    """Carries an error response out of a cache build so it is returned but not stored."""
+
+
+class ShopGraphQLView(GraphQLView):
+    def dispatch(self, request, *args, **kwargs):
+        # accept the same Bearer tokens as the REST API
+        try:
+            auth = StatelessJWTAuthentication().authenticate(request)
+        except AuthenticationFailed as e:
+            return self._error_response(401, str(e.detail))
+        if auth is not None:
+            request.user = auth[0]
+        return super().dispatch(request, *args, **kwargs)
+
+    def _error_response(self, status, message):
+        return HttpResponse(
+            json.dumps({'errors': [{'message': message}]}), status=status, content_type='application/json',
+        )
+
+    def get_validation_rules(self):
+        return (*specified_rules, *self.get_limit_rules())
+
+    def get_limit_rules(self):
+        return (
+            depth_limit_validator(max_depth=getattr(settings, 'GRAPHQL_MAX_DEPTH', 10)),
+            cost_limit_validator(
+                getattr(settings, 'GRAPHQL_MAX_COST', 5000),
+                getattr(settings, 'GRAPHQL_LIST_SIZE', 20),
+            ),
+        )
+
+    def get_response(self, request, data, show_graphiql=False):
+        try:
+            self.resolve_persisted_query(request, data)
+        except GraphQLError as e:
+            return self.json_encode(request, {'errors': [e.formatted]}), 200
+        data = getattr(request, '_persisted_data', data)
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        if self.is_cacheable(request, query, operation_name):
+            key = hashlib.sha256(
+                json.dumps([query, variables, operation_name], sort_keys=True).encode()
+            ).hexdigest()
+
+            def build():
+                body, status = super(ShopGraphQLView, self).get_response(request, data, show_graphiql)
+                if status != 200 or 'errors' in json.loads(body):
+                    raise Uncacheable(body, status)
+                return body, status
+            try:
+                return catalog_cache.cached(f'graphql:{key}', build)
+            except Uncacheable as e:
+                return e.args
+        return super().get_response(request, data, show_graphiql)
+
+    def resolve_persisted_query(self, request, data):
+        """Fill ``data['query']`` from an APQ hash, or register a newly sent query under its hash."""
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+        persisted = (extensions or {}).get('persistedQuery')
+        if not persisted:
+            return
+        digest = persisted.get('sha256Hash')
+        query = request.GET.get('query') or data.get('query')
+        if query:
+            if query_hash(query) != digest:
+                raise GraphQLError('provided sha does not match query')
+            try:
+                cache.set(f'graphql:apq:{digest}', query, APQ_TTL)
+            except Exception:
+                pass
+        else:
+            try:
+                query = cache.get(f'graphql:apq:{digest}')
+            except Exception:
+                query = None
+            if query is None:
+                raise GraphQLError(
+                    PERSISTED_QUERY_NOT_FOUND, extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+                )
+        if not isinstance(data, dict):
+            data = data.dict()
+        data['query'] = query
+        request._persisted_data = data
+
+    def get_graphql_params(self, request, data):
+        data = getattr(request, '_persisted_data', data)
+        return super().get_graphql_params(request, data)
+
+    def is_cacheable(self, request, query, operation_name):
+        user = getattr(request, 'user', None)
+        if not query or (user is not None and user.is_authenticated):
+            return False
+        document, errors = self.get_document(query)
+        if errors:
+            return False
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.QUERY:
+            return False
+        allowed = set(getattr(settings, 'GRAPHQL_CACHEABLE_FIELDS', ('products',)))
+        return all(
+            isinstance(node, FieldNode) and node.name.value in allowed
+            for node in operation.selection_set.selections
+        )
+
+    def get_document(self, query):
+        """Parse and validate ``query`` once per process; returns ``(document, errors)``."""
+        key = (id(self.schema), query_hash(query))
+        entry = documents.get(key)
+        if entry is None:
+            try:
+                document = parse(query)
+            except GraphQLError as e:
+                entry = (None, [e])
+            else:
+                schema = self.schema.graphql_schema
+                errors = validate(schema, document, specified_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+                if not errors:
+                    # the limits follow fragment spreads, so they only see documents without cycles
+                    errors = validate(
+                        schema, document, self.get_limit_rules(), graphene_settings.MAX_VALIDATION_ERRORS,
+                    )
+                entry = (document, errors)
+            documents.set(key, entry)
+        return entry
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # Mirrors GraphQLView.execute_graphql_request with parse/validate served from the LRU.
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        document, errors = self.get_document(query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ['POST'], f'Can only perform a {operation_ast.operation.value} operation from a POST request.',
+            ))
+
+        try:
+            execute_options = {
+                'root_value': self.get_root_value(request),
+                'context_value': self.get_context(request),
+                'variable_values': variables,
+                'operation_name': operation_name,
+                'middleware': self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options['execution_context_class'] = self.execution_context_class
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+            if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+                return execute(self.schema.graphql_schema, document, **execute_options)
+            user = getattr(request, 'user', None)
+            user_id = user.pk if user is not None and user.is_authenticated else None
+            with replicas.reads(replicas.pin_key(request, user_id), replicas.CATALOG):
+                return execute(self.schema.graphql_schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
@@ -0,0 +1,280 @@
+"""Bulk catalog import (CSV or NDJSON), the counterpart of ``shop.exports``.
+
+Input is streamed and handled a chunk of products at a time:
+
+* NDJSON: one product per line, shaped like the export (``variants`` nested).
+* CSV: one row per variant with the export columns. Consecutive rows that
+  share ``product_id`` (or ``name`` when it is blank) make one product.
+
+Each chunk is validated, then written in one transaction. Variants are
+upserted by ``sku`` with ``bulk_create(update_conflicts=True)``, or on
+Postgres optionally through ``COPY`` into a temporary staging table. A sku
+that already exists keeps its product, which is updated in place. A
+``product_id`` is only honoured when it exists in this database. Categories
+are resolved by slug (or id) from a map loaded once. ``bulk_create`` sends
+no signals, so search documents are computed in the same pass (including
+attributes of variants the file does not mention; products that keep a sku
+listed under another product are refreshed afterwards) and the catalog cache
+generation is bumped once at the end, and Redis stock counters of updated
+variants are reset (``shop.inventory.forget_stock``).
+"""
+import csv
+import io
+import itertools
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from . import catalog_cache, inventory, search
+from .models import Category, Product, ProductVariant
+
+CHUNK_SIZE = 1000
+MAX_PRICE = Decimal('99999999.99')
+PRODUCT_UPDATE_FIELDS = ['name', 'description', 'category', 'is_active', 'search_document', 'updated_at']
+VARIANT_UPDATE_FIELDS = ['price', 'stock', 'attributes', 'updated_at']
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportResult:
+    def __init__(self):
+        self.products = self.created_products = 0
+        self.variants = self.created_variants = 0
+        self.errors = []  # (record number, message)
+
+    def __repr__(self):
+        return (
+            f'<ImportResult products={self.products} ({self.created_products} new) '
+            f'variants={self.variants} ({self.created_variants} new) errors={len(self.errors)}>'
+        )
+
+
+def read_ndjson(lines):
+    """Yield ``(line number, product dict or RowError)``."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = RowError('invalid JSON')
+        yield number, item
+
+
+def read_csv(lines):
+    """Yield ``(row number, product dict)``, grouping consecutive variant rows."""
+    rows = enumerate(csv.DictReader(lines), 1)
+    for _, group in itertools.groupby(rows, key=lambda r: r[1].get('product_id') or r[1].get('name')):
+        group = list(group)
+        number, first = group[0]
+        product = {k: first.get(k) for k in ('product_id', 'name', 'description', 'category', 'is_active')}
+        product['id'] = product.pop('product_id') or None
+        product['variants'] = [
+            {k: row.get(k) for k in ('sku', 'price', 'stock', 'attributes')} for _, row in group if row.get('sku')
+        ]
+        yield number, product
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    if value in (None, ''):
+        return True
+    if str(value).lower() in ('true', '1', 'yes'):
+        return True
+    if str(value).lower() in ('false', '0', 'no'):
+        return False
+    raise RowError(f'is_active: not a boolean: {value!r}')
+
+
+def clean_variant(raw):
+    sku = str(raw.get('sku') or '').strip()
+    if not sku or len(sku) > 100:
+        raise RowError(f'sku: must be 1-100 characters: {sku!r}')
+    try:
+        price = Decimal(str(raw.get('price'))).quantize(Decimal('0.01'))
+        if not price.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        raise RowError(f'{sku}: price: not a number: {raw.get("price")!r}')
+    if not 0 <= price <= MAX_PRICE:
+        raise RowError(f'{sku}: price out of range: {price}')
+    try:
+        stock = int(raw.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise RowError(f'{sku}: stock: not an integer: {raw.get("stock")!r}')
+    if stock < 0:
+        raise RowError(f'{sku}: stock must not be negative')
+    attributes = raw.get('attributes') or {}
+    if isinstance(attributes, str):
+        try:
+            attributes = json.loads(attributes)
+        except ValueError:
+            raise RowError(f'{sku}: attributes: invalid JSON')
+    if not isinstance(attributes, dict):
+        raise RowError(f'{sku}: attributes must be an object')
+    return {'sku': sku, 'price': price, 'stock': stock, 'attributes': attributes}
+
+
+def clean_product(raw, categories):
+    """Validate one product; ``categories`` maps slugs and ids to ``(id, name)``."""
+    if isinstance(raw, RowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise RowError('expected an object')
+    name = str(raw.get('name') or '').strip()
+    if not name or len(name) > 255:
+        raise RowError('name: must be 1-255 characters')
+    category = raw.get('category')
+    if category in (None, ''):
+        category = None
+    elif category in categories:
+        category = categories[category]
+    elif str(category).isdigit() and int(category) in categories:
+        category = categories[int(category)]
+    else:
+        raise RowError(f'category: unknown: {category!r}')
+    try:
+        product_id = int(raw['id']) if raw.get('id') not in (None, '') else None
+    except (TypeError, ValueError):
+        raise RowError(f'product_id: not an integer: {raw.get("id")!r}')
+    variants = [clean_variant(v) for v in raw.get('variants') or []]
+    if len({v['sku'] for v in variants}) != len(variants):
+        raise RowError('duplicate sku within product')
+    return {
+        'id': product_id,
+        'name': name,
+        'description': str(raw.get('description') or ''),
+        'category': category,
+        'is_active': _bool(raw.get('is_active')),
+        'variants': variants,
+    }
+
+
+def load_categories():
+    categories = {}
+    for pk, slug, name in Category.objects.values_list('pk', 'slug', 'name'):
+        categories[slug] = categories[pk] = (pk, name)
+    return categories
+
+
+def _copy_variants(variants):
+    """Upsert through ``COPY`` into a temporary staging table (Postgres only)."""
+    table = connection.ops.quote_name(ProductVariant._meta.db_table)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for v in variants:
+        writer.writerow([v.product_id, v.sku, v.price, v.stock, json.dumps(v.attributes)])
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS import_variants '
+            '(product_id bigint, sku varchar(100), price numeric(10, 2), stock integer, attributes jsonb) '
+            'ON COMMIT DELETE ROWS'
+        )
+        cursor.copy_expert(
+            'COPY import_variants (product_id, sku, price, stock, attributes) FROM STDIN WITH (FORMAT csv)', buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (product_id, sku, price, stock, attributes, updated_at) '
+            'SELECT product_id, sku, price, stock, attributes, now() FROM import_variants '
+            'ON CONFLICT (sku) DO UPDATE SET price = EXCLUDED.price, stock = EXCLUDED.stock, '
+            'attributes = EXCLUDED.attributes, updated_at = EXCLUDED.updated_at'
+        )
+
+
+def write_chunk(products, result, use_copy=False):
+    """Upsert cleaned ``products`` and their variants in one transaction."""
+    skus = [v['sku'] for p in products for v in p['variants']]
+    with transaction.atomic():
+        rows = list(ProductVariant.objects.filter(sku__in=skus).values_list('sku', 'product_id', 'pk'))
+        existing = {sku: product_id for sku, product_id, _ in rows}
+        requested = {p['id'] for p in products if p['id'] is not None}
+        known = set(Product.objects.filter(pk__in=requested).values_list('pk', flat=True)) if requested else set()
+        for p in products:
+            p['pk'] = p['id'] if p['id'] in known else next(
+                (existing[v['sku']] for v in p['variants'] if v['sku'] in existing), None,
+            )
+        # variants of existing products that this file does not mention still belong in their documents
+        other_attributes = defaultdict(list)
+        updated_pks = {p['pk'] for p in products if p['pk'] is not None}
+        if updated_pks:
+            others = ProductVariant.objects.filter(product_id__in=updated_pks).exclude(sku__in=skus)
+            for product_id, attributes in others.values_list('product_id', 'attributes'):
+                other_attributes[product_id].append(attributes)
+        # an existing sku listed under another product stays where it is
+        kept_elsewhere = {
+            existing[v['sku']] for p in products for v in p['variants']
+            if existing.get(v['sku'], p['pk']) != p['pk']
+        }
+        new, updated = [], {}
+        for p in products:
+            category_id, category_name = p['category'] or (None, '')
+            attributes = [
+                v['attributes'] for v in p['variants'] if existing.get(v['sku'], p['pk']) == p['pk']
+            ] + other_attributes[p['pk']]
+            p['obj'] = Product(
+                pk=p['pk'], name=p['name'], description=p['description'], category_id=category_id,
+                is_active=p['is_active'],
+                search_document=search.build_document(p['name'], p['description'], category_name, attributes),
+            )
+            if p['pk'] is None:
+                new.append(p['obj'])
+            else:
+                # one upsert may not touch a row twice; the last occurrence wins
+                updated[p['pk']] = p['obj']
+        Product.objects.bulk_create(new)
+        if updated:
+            Product.objects.bulk_create(
+                list(updated.values()), update_conflicts=True, unique_fields=['id'],
+                update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+        variants = [
+            ProductVariant(product_id=p['obj'].pk, **v) for p in products for v in p['variants']
+        ]
+        if use_copy:
+            _copy_variants(variants)
+        else:
+            ProductVariant.objects.bulk_create(
+                variants, update_conflicts=True, unique_fields=['sku'], update_fields=VARIANT_UPDATE_FIELDS,
+            )
+        if kept_elsewhere:
+            search.refresh_documents(list(kept_elsewhere))
+        # the upsert overwrote their stock
+        inventory.forget_stock(pk for _, _, pk in rows)
+    result.products += len(products)
+    result.created_products += len(new)
+    result.variants += len(variants)
+    result.created_variants += len(set(skus) - set(existing))
+
+
+def import_catalog(records, chunk_size=CHUNK_SIZE, use_copy=False):
+    """Import ``(number, raw product)`` records from ``read_csv``/``read_ndjson``."""
+    result = ImportResult()
+    categories = load_categories()
+    chunk, chunk_skus = [], set()
+    for number, raw in records:
+        try:
+            product = clean_product(raw, categories)
+        except RowError as exc:
+            result.errors.append((number, str(exc)))
+            continue
+        skus = {v['sku'] for v in product['variants']}
+        if chunk_skus & skus:
+            # one upsert may not touch the same sku twice
+            write_chunk(chunk, result, use_copy)
+            chunk, chunk_skus = [], set()
+        chunk.append(product)
+        chunk_skus |= skus
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk, result, use_copy)
+            chunk, chunk_skus = [], set()
+    if chunk:
+        write_chunk(chunk, result, use_copy)
+    if result.products:
+        transaction.on_commit(catalog_cache.bump_generation)
+    return result
@@ -0,0 +1,270 @@
+"""Redis-backed stock counters for hot SKUs.
+
+With ``INVENTORY_BACKEND = 'redis'`` checkout reserves stock against an
+``inv:avail:<variant_id>`` counter in Redis instead of locking the
+``ProductVariant`` row. Every mutation is a Lua script so reservations are
+atomic across workers:
+
+* ``reserve`` moves quantity from the available counter into a hold that
+  expires after ``INVENTORY_HOLD_SECONDS``; ``reap`` returns expired holds.
+* ``commit`` turns a hold into a pending delta; ``flush`` drains pending
+  deltas and applies them to ``ProductVariant.stock`` in one UPDATE.
+
+Counters are seeded lazily from the database as
+``stock - pending - in-flight - held`` the first time a variant is touched.
+Stock written any other way (admin edits, catalog imports) goes through
+``forget_stock``, which drops the counters once the write commits so they
+are reseeded from the new value.
+"""
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ProductVariant
+
+logger = logging.getLogger(__name__)
+
+_RESERVE = """
+local n = (#ARGV - 3) / 2
+for i = 1, n do
+  local avail = redis.call('GET', KEYS[3 + i])
+  if not avail then return {-1, i} end
+  if tonumber(avail) < tonumber(ARGV[3 + 2 * i]) then return {0, i} end
+end
+for i = 1, n do
+  local qty = tonumber(ARGV[3 + 2 * i])
+  redis.call('DECRBY', KEYS[3 + i], qty)
+  redis.call('HINCRBY', KEYS[2], ARGV[2 + 2 * i], qty)
+  redis.call('HINCRBY', KEYS[3], ARGV[2 + 2 * i], qty)
+end
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+return {1, 0}
+"""
+
+_RETURN_HOLD = """
+local function return_hold(holds, held, hold_key, token, avail_prefix)
+  redis.call('ZREM', holds, token)
+  local items = redis.call('HGETALL', hold_key)
+  for i = 1, #items, 2 do
+    local avail = avail_prefix .. items[i]
+    if redis.call('EXISTS', avail) == 1 then
+      redis.call('INCRBY', avail, items[i + 1])
+    end
+    redis.call('HINCRBY', held, items[i], -tonumber(items[i + 1]))
+  end
+  redis.call('DEL', hold_key)
+  return #items > 0 and 1 or 0
+end
+"""
+
+_RELEASE = _RETURN_HOLD + """
+return return_hold(KEYS[1], KEYS[2], KEYS[3], ARGV[1], ARGV[2])
+"""
+
+_REAP = _RETURN_HOLD + """
+local tokens = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, token in ipairs(tokens) do
+  return_hold(KEYS[1], KEYS[2], ARGV[3] .. token, token, ARGV[4])
+end
+return #tokens
+"""
+
+_COMMIT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+local items = redis.call('HGETALL', KEYS[3])
+for i = 1, #items, 2 do
+  redis.call('HINCRBY', KEYS[2], items[i], -tonumber(items[i + 1]))
+  redis.call('HINCRBY', KEYS[4], items[i], items[i + 1])
+end
+redis.call('DEL', KEYS[3])
+return 1
+"""
+
+_SEED = """
+for i = 1, (#ARGV / 2) do
+  local key = KEYS[3 + i]
+  if redis.call('EXISTS', key) == 0 then
+    local vid = ARGV[2 * i - 1]
+    local value = tonumber(ARGV[2 * i])
+    for j = 1, 3 do
+      value = value - tonumber(redis.call('HGET', KEYS[j], vid) or '0')
+    end
+    redis.call('SET', key, math.max(value, 0))
+  end
+end
+return 1
+"""
+
+_DRAIN = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  if redis.call('EXISTS', KEYS[1]) == 0 then return {} end
+  redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+
+class InventoryUnavailable(Exception):
+    """Raised when a reservation cannot be satisfied from the counters."""
+
+    def __init__(self, variant_ids):
+        self.variant_ids = variant_ids
+        super().__init__('Insufficient stock for variants: %s' % variant_ids)
+
+
+def apply_stock_deltas(deltas):
+    """Subtract ``{variant_id: quantity}`` from ``ProductVariant.stock`` in one UPDATE."""
+    if not deltas:
+        return 0
+    whens = [When(pk=vid, then=Greatest(F('stock') - qty, 0)) for vid, qty in deltas.items()]
+    return ProductVariant.objects.filter(pk__in=list(deltas)).update(
+        stock=Case(*whens, output_field=models.PositiveIntegerField()), updated_at=timezone.now(),
+    )
+
+
+class RedisInventory:
+    prefix = 'inv'
+
+    def __init__(self, client=None, hold_seconds=None):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.client = client
+        self.hold_seconds = hold_seconds or getattr(settings, 'INVENTORY_HOLD_SECONDS', 900)
+        self._reserve = client.register_script(_RESERVE)
+        self._release = client.register_script(_RELEASE)
+        self._reap = client.register_script(_REAP)
+        self._commit = client.register_script(_COMMIT)
+        self._seed = client.register_script(_SEED)
+        self._drain = client.register_script(_DRAIN)
+
+    def _key(self, *parts):
+        return ':'.join([self.prefix, *map(str, parts)])
+
+    @property
+    def _holds(self):
+        return self._key('holds')
+
+    @property
+    def _held(self):
+        return self._key('held')
+
+    @property
+    def _pending(self):
+        return self._key('pending')
+
+    @property
+    def _inflight(self):
+        return self._key('pending', 'inflight')
+
+    def available(self, variant_id):
+        value = self.client.get(self._key('avail', variant_id))
+        return None if value is None else int(value)
+
+    def seed(self, variant_ids):
+        """Load counters for ``variant_ids`` that are not in Redis yet."""
+        stock = dict(ProductVariant.objects.filter(pk__in=list(variant_ids)).values_list('pk', 'stock'))
+        args = []
+        for vid, value in stock.items():
+            args += [vid, value]
+        if args:
+            keys = [self._pending, self._inflight, self._held]
+            self._seed(keys=keys + [self._key('avail', vid) for vid in stock], args=args)
+
+    def forget(self, variant_ids):
+        """Drop counters for ``variant_ids``; the next reservation reseeds them."""
+        keys = [self._key('avail', vid) for vid in variant_ids]
+        if keys:
+            self.client.delete(*keys)
+
+    def reserve(self, quantities, now=None):
+        """Hold ``{variant_id: quantity}`` atomically and return the hold token."""
+        token = uuid.uuid4().hex
+        vids = list(quantities)
+        expires_at = (time.time() if now is None else now) + self.hold_seconds
+        keys = [self._holds, self._held, self._key('hold', token)] + [self._key('avail', v) for v in vids]
+        args = [expires_at, token, self.hold_seconds * 2]
+        for vid in vids:
+            args += [vid, quantities[vid]]
+        reaped = False
+        for _ in range(3):
+            ok, index = self._reserve(keys=keys, args=args)
+            if ok == 1:
+                return token
+            if ok == -1:
+                self.seed(vids)
+            elif not reaped:
+                # expired holds may be sitting on the stock we need
+                self.reap()
+                reaped = True
+            else:
+                break
+        raise InventoryUnavailable([vids[index - 1]])
+
+    def release(self, token):
+        return bool(self._release(
+            keys=[self._holds, self._held, self._key('hold', token)],
+            args=[token, self._key('avail', '')],
+        ))
+
+    def commit(self, token):
+        """Convert a hold into a pending stock delta; False if it already expired."""
+        return bool(self._commit(
+            keys=[self._holds, self._held, self._key('hold', token), self._pending],
+            args=[token],
+        ))
+
+    def reap(self, now=None, limit=500):
+        return self._reap(
+            keys=[self._holds, self._held],
+            args=[time.time() if now is None else now, limit, self._key('hold', ''), self._key('avail', '')],
+        )
+
+    def flush(self):
+        """Write pending deltas to ``ProductVariant.stock`` and return them.
+
+        Deltas are renamed to an in-flight hash before the UPDATE and only
+        discarded once it succeeds, so a failed flush is retried next time.
+        """
+        raw = self._drain(keys=[self._pending, self._inflight])
+        deltas = {int(raw[i]): int(raw[i + 1]) for i in range(0, len(raw), 2)}
+        deltas = {vid: qty for vid, qty in deltas.items() if qty}
+        apply_stock_deltas(deltas)
+        self.client.delete(self._inflight)
+        return deltas
+
+
+def forget_stock(variant_ids):
+    """Reseed the counters of ``variant_ids`` after their stock was written outside ``flush``."""
+    inventory = get_inventory()
+    variant_ids = list(variant_ids)
+    if inventory is None or not variant_ids:
+        return
+
+    def forget():
+        try:
+            inventory.forget(variant_ids)
+        except Exception:
+            logger.warning('Could not reset stock counters for %s', variant_ids, exc_info=True)
+    # after commit, so a reseed cannot read the old stock back
+    transaction.on_commit(forget)
+
+
+_inventory = None
+
+
+def get_inventory():
+    """Return the shared ``RedisInventory`` or None when stock lives in the database."""
+    global _inventory
+    if getattr(settings, 'INVENTORY_BACKEND', 'database') != 'redis':
+        return None
+    if _inventory is None:
+        _inventory = RedisInventory()
+    return _inventory
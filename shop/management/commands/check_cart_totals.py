@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+from shop.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Compare stored cart totals with their items and optionally repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rewrite totals that do not match.')
+
+    def handle(self, *args, **options):
+        carts = Cart.objects.annotate(
+            actual_count=Coalesce(Sum('items__quantity'), 0),
+            actual_subtotal=Coalesce(
+                Sum(F('items__quantity') * F('items__variant__price'), output_field=DecimalField()), 0,
+                output_field=DecimalField(),
+            ),
+        ).order_by('id')
+        drifted = 0
+        for cart in carts.iterator():
+            if cart.item_count == cart.actual_count and cart.subtotal == cart.actual_subtotal:
+                continue
+            drifted += 1
+            self.stdout.write(
+                f'cart {cart.pk}: stored {cart.item_count}/{cart.subtotal}, '
+                f'actual {cart.actual_count}/{cart.actual_subtotal}'
+            )
+            if options['fix']:
+                Cart.objects.filter(pk=cart.pk).update(
+                    item_count=cart.actual_count, subtotal=cart.actual_subtotal,
+                )
+        verb = 'fixed' if options['fix'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f'{drifted} drifted cart(s) {verb}'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.webhooks import WebhookEngine
+
+
+class Command(BaseCommand):
+    help = 'Deliver due WebhookEvents from the outbox; safe to run several copies side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain what is due and exit.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when idle.')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        engine = WebhookEngine()
+        try:
+            while True:
+                delivered, failed = engine.drain(options['batch_size'])
+                if delivered or failed:
+                    self.stdout.write(f'delivered {delivered}, failed {failed}')
+                if options['once']:
+                    break
+                if not (delivered or failed):
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            engine.close()
@@ -0,0 +1,39 @@
+import gzip
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from shop import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream the catalog as NDJSON or CSV, optionally only products changed since a timestamp.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=exports.FORMATS, default='ndjson')
+        parser.add_argument('--since', help='ISO 8601 timestamp; export only products changed at or after it.')
+        parser.add_argument('--output', '-o', default='-', help='File path, or - for stdout.')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output.')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since timestamp: {options['since']}")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        with ExitStack() as stack:
+            if options['output'] == '-':
+                out = sys.stdout.buffer
+            else:
+                out = stack.enter_context(open(options['output'], 'wb'))
+            if options['gzip']:
+                out = stack.enter_context(gzip.GzipFile(fileobj=out, mode='wb'))
+            for chunk in exports.export(options['format'], since, options['chunk_size']):
+                out.write(chunk)
+            out.flush()
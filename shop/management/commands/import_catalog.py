@@ -0,0 +1,44 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop import imports
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Upsert products and variants (by sku) from a CSV or NDJSON file, optionally gzipped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=imports.CHUNK_SIZE, help='Products per transaction.')
+        parser.add_argument('--copy', action='store_true', help='Load variants with COPY (Postgres only).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = path[:-3] if path.endswith('.gz') else path
+        fmt = options['format'] or name.rsplit('.', 1)[-1]
+        if fmt not in ('ndjson', 'csv'):
+            raise CommandError('Cannot tell the format from the file name; pass --format.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs PostgreSQL.')
+        opener = gzip.open if path.endswith('.gz') else open
+        start = time.perf_counter()
+        with opener(path, 'rt', encoding='utf-8', newline='') as fh:
+            records = imports.read_csv(fh) if fmt == 'csv' else imports.read_ndjson(fh)
+            result = imports.import_catalog(records, options['chunk_size'], options['copy'])
+        elapsed = time.perf_counter() - start
+        for number, message in result.errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f'record {number}: {message}')
+        if len(result.errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write(f'... and {len(result.errors) - MAX_REPORTED_ERRORS} more errors')
+        self.stdout.write(
+            f'{result.products} products ({result.created_products} new), '
+            f'{result.variants} variants ({result.created_variants} new), '
+            f'{len(result.errors)} rejected in {elapsed:.1f}s '
+            f'({result.variants / elapsed if elapsed else 0:,.0f} rows/s)'
+        )
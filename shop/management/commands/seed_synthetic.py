@@ -0,0 +1,143 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+
+from shop import imports
+from shop.models import Cart, CartItem, Category, Order, OrderItem, ProductVariant
+
+PREFIX = 'synthetic'
+PASSWORD = 'synthetic-pass'
+ADJECTIVES = (
+    'classic slim relaxed waterproof lightweight insulated vintage organic recycled premium sport casual '
+    'formal rugged soft breathable'
+).split()
+MATERIALS = 'cotton wool linen denim leather canvas nylon polyester cashmere bamboo'.split()
+COLORS = 'red blue green black white grey navy olive beige pink'.split()
+SIZES = ('XS', 'S', 'M', 'L', 'XL', 'XXL')
+DEPARTMENTS = 'shoe boot sneaker jacket shirt tee hoodie jeans shorts sock hat bag scarf glove dress'.split()
+ORDER_STATUSES = ('paid', 'shipped', 'delivered', 'completed')
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset (catalog, users, carts, orders) for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--variants', type=int, default=3, help='Variants per product.')
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--carts', type=int, default=500, help='Users that get a filled cart.')
+        parser.add_argument('--orders', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1_000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch = options['batch_size']
+        categories = self.seed_categories(options['categories'])
+        result = imports.import_catalog(
+            enumerate(self.products(rng, categories, options['products'], options['variants']), 1), batch,
+        )
+        self.stdout.write(f'catalog: {result.products} products, {result.variants} variants')
+        variants = list(
+            ProductVariant.objects.filter(sku__startswith=f'{PREFIX}-').order_by('id').values_list('id', 'price', 'stock')
+        )
+        users = self.seed_users(options['users'], batch)
+        self.stdout.write(f'users: {len(users)}')
+        if variants and users:
+            # carts only hold what can still be bought, so checkout does not start with a 409
+            in_stock = [(v, price) for v, price, stock in variants if stock >= 10]
+            carts = self.seed_carts(rng, users[:options['carts']], in_stock, batch)
+            self.stdout.write(f'carts: {carts} filled')
+            orders = self.seed_orders(rng, users, [(v, price) for v, price, _ in variants], options['orders'], batch)
+            self.stdout.write(f'orders: {orders} created')
+
+    def seed_categories(self, count):
+        existing = set(Category.objects.filter(slug__startswith=f'{PREFIX}-').values_list('slug', flat=True))
+        Category.objects.bulk_create([
+            Category(name=f'{DEPARTMENTS[i % len(DEPARTMENTS)].title()}s {i}', slug=f'{PREFIX}-{i}')
+            for i in range(count) if f'{PREFIX}-{i}' not in existing
+        ])
+        return [f'{PREFIX}-{i}' for i in range(count)]
+
+    def products(self, rng, categories, count, variants_per_product):
+        """Raw product records for ``shop.imports``; skus are stable so re-running upserts."""
+        for i in range(count):
+            department = rng.choice(DEPARTMENTS)
+            material = rng.choice(MATERIALS)
+            base_price = Decimal(rng.randint(500, 30_000)) / 100
+            sizes = rng.sample(SIZES, min(variants_per_product, len(SIZES)))
+            yield {
+                'name': f'{rng.choice(ADJECTIVES).title()} {material} {department} {i}',
+                'description': ' '.join(rng.choices(ADJECTIVES + MATERIALS, k=rng.randint(8, 30))),
+                'category': rng.choice(categories),
+                'is_active': rng.random() > 0.03,
+                'variants': [
+                    {
+                        'sku': f'{PREFIX}-{i}-{n}',
+                        'price': str(base_price + n),
+                        'stock': rng.choice((0, rng.randint(1, 500))),
+                        'attributes': {
+                            'color': rng.choice(COLORS), 'size': sizes[n % len(sizes)], 'material': material,
+                            'weight_g': rng.randint(50, 2500),
+                        },
+                    }
+                    for n in range(variants_per_product)
+                ],
+            }
+
+    def seed_users(self, count, batch):
+        User = get_user_model()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username=f'{PREFIX}-{i}', email=f'{PREFIX}-{i}@example.com', password=password)
+            for i in range(count)
+        ], batch_size=batch, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=f'{PREFIX}-').order_by('id').values_list('id', flat=True))
+
+    def seed_carts(self, rng, user_ids, variants, batch):
+        have_cart = set(Cart.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+        lines = {}
+        for user_id in user_ids:
+            if user_id not in have_cart:
+                picks = rng.sample(variants, min(len(variants), rng.randint(1, 5)))
+                lines[user_id] = [(v, rng.randint(1, 3)) for v in picks]
+        carts = Cart.objects.bulk_create([
+            Cart(
+                user_id=user_id, item_count=sum(q for _, q in items),
+                subtotal=sum((price * q for (_, price), q in items), Decimal('0')),
+            )
+            for user_id, items in lines.items()
+        ], batch_size=batch)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, variant_id=variant_id, quantity=quantity)
+            for cart, items in zip(carts, lines.values()) for (variant_id, _), quantity in items
+        ], batch_size=batch)
+        return len(carts)
+
+    def seed_orders(self, rng, user_ids, variants, count, batch):
+        existing = Order.objects.filter(user_id__in=user_ids).count()
+        created = 0
+        for start in range(existing, count, batch):
+            lines = [
+                (rng.choice(user_ids), [
+                    (v, rng.randint(1, 4)) for v in rng.sample(variants, min(len(variants), rng.randint(1, 4)))
+                ])
+                for _ in range(start, min(start + batch, count))
+            ]
+            orders = Order.objects.bulk_create([
+                Order(
+                    user_id=user_id, status=rng.choice(ORDER_STATUSES), item_count=sum(q for _, q in items),
+                    total=sum((price * q for (_, price), q in items), Decimal('0')),
+                )
+                for user_id, items in lines
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, variant_id=variant_id, quantity=quantity, price=price)
+                for order, (_, items) in zip(orders, lines) for (variant_id, price), quantity in items
+            ])
+            created += len(orders)
+        return created
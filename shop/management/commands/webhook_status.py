@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from shop.circuit import DestinationGuard, metrics
+from shop.models import WebhookEvent
+from shop.webhooks import destinations
+
+
+class Command(BaseCommand):
+    help = 'Show outbox backlog plus circuit state and shed-load counters per webhook destination.'
+
+    def handle(self, *args, **options):
+        counts = WebhookEvent.objects.aggregate(
+            pending=Count('id', filter=Q(delivered=False, dead_lettered=False)),
+            dead=Count('id', filter=Q(dead_lettered=True)),
+        )
+        self.stdout.write(f"pending {counts['pending']}, dead-lettered {counts['dead']}")
+        for url in destinations(None):
+            guard = DestinationGuard(url)
+            stats = ', '.join(f'{k} {v}' for k, v in metrics(guard.name).items())
+            self.stdout.write(f'{url} [{guard.name}]: circuit {guard.breaker.state()}; {stats}')
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+SEARCH_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS product_search_document_gin ON shop_product "
+    "USING gin (to_tsvector('english'::regconfig, COALESCE(search_document, '')))"
+)
+
+
+def backfill_documents(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+    attrs = {}
+    for product_id, attributes in ProductVariant.objects.values_list('product_id', 'attributes'):
+        attrs.setdefault(product_id, []).append(attributes)
+    updates = []
+    for p in Product.objects.select_related('category').only('name', 'description', 'category__name'):
+        parts = [p.name, p.description, p.category.name if p.category else '']
+        for a in attrs.get(p.pk, []):
+            if isinstance(a, dict):
+                parts.extend(f'{k} {v}' for k, v in a.items())
+        p.search_document = ' '.join(x for x in parts if x)
+        updates.append(p)
+    Product.objects.bulk_update(updates, ['search_document'], batch_size=500)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_INDEX_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_search_document_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_product_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
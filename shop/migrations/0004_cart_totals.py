@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:12
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    Cart = apps.get_model('shop', 'Cart')
+    CartItem = apps.get_model('shop', 'CartItem')
+    totals = CartItem.objects.values('cart_id').annotate(
+        n=Sum('quantity'), t=Sum(F('quantity') * F('variant__price')),
+    )
+    for row in totals:
+        Cart.objects.filter(pk=row['cart_id']).update(item_count=row['n'] or 0, subtotal=row['t'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_cart_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='dead_lettered',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('dead_lettered', False), ('delivered', False)), fields=['next_attempt_at'], name='webhook_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:28
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'variant_id')
+        .annotate(n=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        lines = CartItem.objects.filter(cart_id=row['cart_id'], variant_id=row['variant_id'])
+        lines.exclude(pk=row['keep']).delete()
+        lines.update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_webhook_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'variant'), name='cartitem_cart_variant_uniq'),
+        ),
+    ]
@@ -1,5 +1,8 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
+from django.db.models import F, Sum
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 
@@ -17,6 +20,17 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='products', db_index=True)
     is_active = models.BooleanField(default=True, db_index=True)
+    # name, description, category and variant attributes; maintained by shop.search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    # bumped by saves and stock UPDATEs; drives incremental catalog exports (shop.exports)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination: WHERE is_active [AND category_id = ?] ORDER BY id
+            models.Index(fields=['is_active', 'id'], name='product_active_id_idx'),
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -28,21 +42,47 @@ class ProductVariant(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     stock = models.PositiveIntegerField(default=0)
     attributes = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'price'], name='variant_product_price_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} [{self.sku}]"
 
 
+class ProductTombstone(models.Model):
+    # deleted products, so incremental catalog exports (shop.exports) can tell feeds to drop them
+    product_id = models.BigIntegerField(primary_key=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
 class Cart(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    # anonymous carts are keyed by the cart_token cookie (see shop.cart_store)
+    token = models.CharField(max_length=64, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # running totals maintained by shop.carts; check_cart_totals repairs drift
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(n=Sum('quantity'))['n'] or 0
 
     def total_price(self):
-        return sum(item.quantity * item.variant.price for item in self.items.all())
+        total = self.items.aggregate(t=Sum(F('quantity') * F('variant__price')))['t']
+        return total if total is not None else Decimal('0')
+
+    def apply_delta(self, count, amount):
+        """Atomically shift the stored totals; the in-memory instance is not refreshed."""
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=F('item_count') + count,
+            subtotal=F('subtotal') + amount,
+            updated_at=timezone.now(),
+        )
 
 
 class CartItem(models.Model):
@@ -50,6 +90,12 @@ class CartItem(models.Model):
     variant = models.ForeignKey(ProductVariant, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # one line per variant, so concurrent adds increment instead of duplicating
+            models.UniqueConstraint(fields=['cart', 'variant'], name='cartitem_cart_variant_uniq'),
+        ]
+
 
 class Order(models.Model):
     STATUS = (
@@ -60,10 +106,18 @@ class Order(models.Model):
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
     )
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS, default='created')
     created_at = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # units across all lines, written with the order so history listings need no aggregate
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # order history: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -88,12 +142,27 @@ class WebhookEvent(models.Model):
     delivered = models.BooleanField(default=False)
     attempts = models.PositiveIntegerField(default=0)
     last_attempt = models.DateTimeField(null=True, blank=True)
+    # outbox schedule (see shop.webhooks): when the event may next be claimed
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # gave up after WEBHOOK_MAX_ATTEMPTS failed deliveries
+    dead_lettered = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # dispatchers scan only pending rows: WHERE NOT delivered AND NOT dead_lettered ORDER BY next_attempt_at
+            models.Index(
+                fields=['next_attempt_at'], name='webhook_pending_idx',
+                condition=models.Q(delivered=False, dead_lettered=False),
+            ),
+        ]
 
     def mark_attempt(self):
+        # targeted UPDATE with an atomic increment; never rewrites payload
+        now = timezone.now()
+        WebhookEvent.objects.filter(pk=self.pk).update(attempts=F('attempts') + 1, last_attempt=now)
         self.attempts += 1
-        self.last_attempt = timezone.now()
-        self.save()
+        self.last_attempt = now
 
     def mark_delivered(self):
+        WebhookEvent.objects.filter(pk=self.pk).update(delivered=True)
         self.delivered = True
-        self.save()
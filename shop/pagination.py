@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """Keyset pagination on ``id``: every page is an indexed range scan, however deep."""
+
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class OrderCursorPagination(CursorPagination):
+    """Newest orders first, walked along the ``(user, created_at, id)`` index."""
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
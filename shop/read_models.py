@@ -0,0 +1,60 @@
+"""Catalog read model: products as plain dicts built from ``.values()`` rows.
+
+``ProductSerializer`` instantiates a field tree and walks it for every
+product and variant. The catalog endpoints only need its output, so they
+read ``.values()`` rows (one query for products, one for all their
+variants), group the variants in a single pass and format prices the way
+``DecimalField`` does. ``test_read_models`` keeps the output identical to
+the serializers.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from .models import ProductVariant
+from .serializers import ProductSerializer, ProductVariantSerializer
+
+PRODUCT_FIELDS = [f for f in ProductSerializer.Meta.fields if f != 'variants']
+VARIANT_FIELDS = ProductVariantSerializer.Meta.fields
+CENT = Decimal('0.01')
+
+
+def format_price(value):
+    # DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING
+    if value is None:
+        return None
+    return '{:f}'.format(Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def product_values(qs, fields=None):
+    """``qs`` as ``.values()`` rows holding the columns ``fields`` needs (``id`` always)."""
+    columns = [f for f in (fields or PRODUCT_FIELDS) if f in PRODUCT_FIELDS]
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    return qs.values(*columns)
+
+
+def variants_by_product(product_ids):
+    grouped = {pk: [] for pk in product_ids}
+    rows = (
+        ProductVariant.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', 'id')
+        .values_list('product_id', *VARIANT_FIELDS)
+    )
+    for product_id, pk, sku, price, stock, attributes in rows:
+        grouped[product_id].append(
+            {'id': pk, 'sku': sku, 'price': format_price(price), 'stock': stock, 'attributes': attributes}
+        )
+    return grouped
+
+
+def serialize_products(rows, fields=None):
+    """Turn product rows from ``product_values`` into ``ProductSerializer``-shaped dicts."""
+    fields = fields or ProductSerializer.Meta.fields
+    keys = [f for f in ProductSerializer.Meta.fields if f in fields and f != 'variants']
+    variants = variants_by_product([r['id'] for r in rows]) if 'variants' in fields else None
+    results = []
+    for row in rows:
+        item = {k: row[k] for k in keys}
+        if variants is not None:
+            item['variants'] = variants[row['id']]
+        results.append(item)
+    return results
@@ -0,0 +1,29 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: pip install shopsphere[speedups]
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` encoding with orjson when it is installed.
+
+    Compact output is JSON equivalent to what ``JSONRenderer`` produces:
+    datetimes, Decimals and lazy strings go through DRF's own encoder, so
+    they render identically. Floats may be spelled differently (``1e16``
+    rather than ``1e+16``, ``1e-7`` rather than ``1e-07``) but parse to the
+    same value, and NaN/Infinity render as ``null`` instead of raising.
+    Indented (``; indent=``) or ASCII-only responses fall back to the stdlib
+    path.
+    """
+
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # JSONRenderer escapes these so the output is also valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,109 @@
+"""Read-replica routing with read-your-writes stickiness.
+
+Replicas are the aliases in ``settings.DATABASE_REPLICAS`` (built from
+``DATABASE_REPLICA_URLS``). ``ReplicaRouter`` sends every write to
+``default`` and only sends reads to a replica inside a ``reads()`` scope.
+Catalog pages, GraphQL queries and order history open one. Everything else
+keeps reading the primary, including code that writes. With no replicas
+configured, ``reads()`` does nothing.
+
+Replicas lag the primary, so writers are pinned: ``pin(key)`` keeps reads
+for that key on the primary for ``REPLICA_PIN_SECONDS``. Keys are cart
+owners (``user:<id>`` or ``anon:<cart token>``, see ``pin_key``), pinned
+after cart and checkout writes, and ``catalog``, pinned by every catalog
+cache bump so a page is never rebuilt from a replica that lacks the write.
+The pin check costs one cache round trip, made on the scope's first query.
+Cache hits therefore pay nothing, and when the cache cannot be reached the
+scope stays on the primary.
+"""
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG = 'catalog'
+
+_scope = ContextVar('replica_reads', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def _pin_cache_key(key):
+    return f'db:pinned:{key}'
+
+
+def pin(key):
+    """Keep reads for ``key`` on the primary while replicas catch up with a write."""
+    if key is None or not replicas():
+        return
+    try:
+        cache.set(_pin_cache_key(key), 1, settings.REPLICA_PIN_SECONDS)
+    except Exception:
+        logger.warning('Could not pin %s to the primary database', key, exc_info=True)
+
+
+def pin_key(request, user_id=None):
+    """The caller's cart owner key, or None for a visitor who has no cart yet."""
+    from .cart_store import COOKIE_NAME, TOKEN_RE
+    if user_id is not None:
+        return f'user:{user_id}'
+    token = request.COOKIES.get(COOKIE_NAME)
+    return f'anon:{token}' if token and TOKEN_RE.match(token) else None
+
+
+class _Scope:
+    def __init__(self, keys):
+        self.keys = [k for k in keys if k is not None]
+        self.db = None
+
+    def resolve(self):
+        if self.db is None:
+            self.db = random.choice(replicas())
+            if self.keys:
+                try:
+                    pinned = cache.get_many([_pin_cache_key(k) for k in self.keys])
+                except Exception:
+                    logger.warning('Replica pins unavailable, reading from the primary', exc_info=True)
+                    pinned = True
+                if pinned:
+                    self.db = 'default'
+        return self.db
+
+
+@contextmanager
+def reads(*keys):
+    """Route reads in this block to a replica unless one of ``keys`` is pinned.
+
+    Nested scopes keep the outer decision.
+    """
+    if _scope.get() is not None or not replicas():
+        yield
+        return
+    token = _scope.set(_Scope(keys))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        return None if scope is None else scope.resolve()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        dbs = {'default', *replicas()}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
@@ -1,25 +1,48 @@
-from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch
 
-from .models import Product
-
-CACHE_TTL = 60  # seconds for demo
+from . import catalog_cache, replicas
+from .models import Order, OrderItem, Product, ProductVariant
 
 
 class ProductRepository:
     def list_active(self):
-        key = 'products:active'
-        data = cache.get(key)
-        if data is not None:
-            return data
-        qs = Product.objects.filter(is_active=True).prefetch_related('variants', 'category')
-        
-        data = list(qs)
-        cache.set(key, data, CACHE_TTL)
-        return data
+        """Active products with variants as serialized dicts, cached per catalog generation."""
+        with replicas.reads(replicas.CATALOG):
+            return catalog_cache.cached('products:active', self._build_active)
+
+    def filter_active(self, category=None, min_price=None, max_price=None, in_stock=False):
+        """Active products narrowed by category slug and by variant price/stock.
+
+        Variant conditions are a correlated EXISTS so products are never
+        duplicated and keyset ordering on ``id`` stays intact.
+        """
+        qs = Product.objects.filter(is_active=True)
+        if category:
+            qs = qs.filter(category__slug=category)
+        variant_filter = {}
+        if min_price is not None:
+            variant_filter['price__gte'] = min_price
+        if max_price is not None:
+            variant_filter['price__lte'] = max_price
+        if in_stock:
+            variant_filter['stock__gt'] = 0
+        if variant_filter:
+            variants = ProductVariant.objects.filter(product=OuterRef('pk'), **variant_filter)
+            qs = qs.filter(Exists(variants))
+        return qs
+
+    def _build_active(self):
+        from . import read_models
+        rows = read_models.product_values(Product.objects.filter(is_active=True).order_by('id'))
+        return read_models.serialize_products(list(rows))
 
 
 class OrderRepository:
-    def get_user_orders(self, user):
-        return (
-            user.orders.select_related().prefetch_related('items__variant')
-        )
+    def get_user_orders(self, user, with_items=True):
+        """Newest first; with items that is two queries (orders, then lines joined to variants)."""
+        qs = Order.objects.filter(user_id=user.pk).order_by('-created_at', '-id')
+        if with_items:
+            qs = qs.prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('variant').order_by('id'))
+            )
+        return qs
@@ -1,6 +1,9 @@
 import graphene
 from graphene_django import DjangoObjectType
+from . import replicas
 from .models import Product, ProductVariant, Order, OrderItem
+from .checkout import EmptyCart, InsufficientStock, UnknownVariants, create_orders
+from .graphql_loaders import ORDER_PLAN, PRODUCT_PLAN, get_loaders, load_related, optimize, queue
 
 class ProductVariantType(DjangoObjectType):
     class Meta:
@@ -12,58 +15,97 @@ class ProductType(DjangoObjectType):
         model = Product
         fields = ('id', 'name', 'description', 'variants')
 
+    def resolve_variants(self, info):
+        return load_related(get_loaders(info).variants_by_product, self, 'variants', self.pk)
+
 class OrderItemType(DjangoObjectType):
     class Meta:
         model = OrderItem
         fields = ('id', 'variant', 'quantity', 'price')
 
+    def resolve_variant(self, info):
+        return load_related(get_loaders(info).variant, self, 'variant', self.variant_id)
+
 class OrderType(DjangoObjectType):
     class Meta:
         model = Order
         fields = ('id', 'user', 'status', 'total', 'items')
 
-    def resolve_total(self, info):
-        try:
-            return float(self.total)
-        except Exception:
-            return None
+    def resolve_items(self, info):
+        return load_related(get_loaders(info).items_by_order, self, 'items', self.pk)
+
+class OrderLineInput(graphene.InputObjectType):
+    variant_id = graphene.Int(required=True)
+    quantity = graphene.Int(default_value=1)
+
+class OrderInput(graphene.InputObjectType):
+    lines = graphene.List(graphene.NonNull(OrderLineInput), required=True)
+
+def _create_orders(info, orders):
+    user = info.context.user
+    if not user or not user.is_authenticated:
+        raise Exception('Authentication required')
+    try:
+        created = create_orders(user, orders)
+    except (EmptyCart, UnknownVariants, InsufficientStock, ValueError) as exc:
+        raise Exception(str(exc) or 'Order has no lines')
+    replicas.pin(replicas.pin_key(info.context, user.pk))
+    # the new lines are already in memory; let nested selections reuse them
+    loaders = get_loaders(info)
+    for order, items in created:
+        loaders.items_by_order.prime(order.pk, items)
+        for item in items:
+            loaders.variant.prime(item.variant_id, item.variant)
+    return [order for order, _ in created]
 
 class CreateOrder(graphene.Mutation):
     class Arguments:
-        items = graphene.List(graphene.Int, required=True)  # variant ids
+        items = graphene.List(graphene.Int)  # variant ids, quantity 1 each
+        lines = graphene.List(graphene.NonNull(OrderLineInput))
 
     ok = graphene.Boolean()
     order = graphene.Field(lambda: OrderType)
     order_id = graphene.Int()
 
-    def mutate(self, info, items):
-        user = info.context.user
-        if not user or not user.is_authenticated:
-            raise Exception('Authentication required')
-        order = Order.objects.create(user=user, total=0)
-        total = 0
-        for vid in items:
-            variant = ProductVariant.objects.get(pk=vid)
-            OrderItem.objects.create(order=order, variant=variant, quantity=1, price=variant.price)
-            total += float(variant.price)
-        order.total = total
-        order.save()
+    def mutate(self, info, items=None, lines=None):
+        order_lines = [(vid, 1) for vid in items or []]
+        order_lines += [(line.variant_id, line.quantity) for line in lines or []]
+        order = _create_orders(info, [order_lines])[0]
         return CreateOrder(ok=True, order=order, order_id=order.id)
 
+class CreateOrders(graphene.Mutation):
+    """Create many orders in one call (back-office / B2B imports)."""
+
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(OrderInput), required=True)
+
+    ok = graphene.Boolean()
+    orders = graphene.List(lambda: OrderType)
+    order_ids = graphene.List(graphene.Int)
+
+    def mutate(self, info, orders):
+        created = _create_orders(info, [
+            [(line.variant_id, line.quantity) for line in order.lines] for order in orders
+        ])
+        return CreateOrders(ok=True, orders=created, order_ids=[o.id for o in created])
+
 class Query(graphene.ObjectType):
     products = graphene.List(ProductType)
     orders = graphene.List(OrderType)
 
     def resolve_products(self, info):
-        return Product.objects.filter(is_active=True)
+        products = optimize(Product.objects.filter(is_active=True), info, PRODUCT_PLAN)
+        return queue(products, get_loaders(info).variants_by_product)
 
     def resolve_orders(self, info):
         user = info.context.user
         if not user or not user.is_authenticated:
             return Order.objects.none()
-        return Order.objects.filter(user=user)
+        orders = optimize(Order.objects.filter(user_id=user.pk), info, ORDER_PLAN)
+        return queue(orders, get_loaders(info).items_by_order)
 
 class Mutation(graphene.ObjectType):
     create_order = CreateOrder.Field()
+    create_orders = CreateOrders.Field()
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
@@ -0,0 +1,250 @@
+"""Full-text product search with category and attribute facets.
+
+Each product carries a denormalized ``search_document`` (name, description,
+category name and variant attributes) kept current by ``shop.signals``. On
+Postgres it is queried with ``SearchVector``/``SearchQuery`` against a GIN
+expression index (migration 0003); on other databases a per-process
+inverted index is built lazily and updated incrementally from the same
+signals, and rebuilt when another process moved the catalog generation.
+"""
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef, Q
+
+from . import catalog_cache
+from .models import Product, ProductVariant
+
+SEARCH_CONFIG = 'english'
+TOKEN_RE = re.compile(r'\w+')
+FACET_SCALARS = (str, int, float, bool)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_document(name, description, category_name, attributes_list):
+    parts = [name, description, category_name]
+    for attrs in attributes_list:
+        if isinstance(attrs, dict):
+            parts.extend(f'{key} {value}' for key, value in attrs.items())
+    return ' '.join(p for p in parts if p)
+
+
+def facet_pairs(attributes_list):
+    pairs = set()
+    for attrs in attributes_list:
+        if isinstance(attrs, dict):
+            pairs.update((str(k), str(v)) for k, v in attrs.items() if isinstance(v, FACET_SCALARS))
+    return frozenset(pairs)
+
+
+def facet_values(value):
+    """The JSON scalars ``facet_pairs`` would render as ``value``: ``'42'`` is ``'42'`` or ``42``."""
+    values = [value]
+    for text in (value, value.lower()):
+        try:
+            decoded = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(decoded, FACET_SCALARS) and str(decoded) == value and decoded not in values:
+            values.append(decoded)
+    return values
+
+
+def load_rows(product_ids=None, chunk_size=2000):
+    """Yield ``(product_row, [variant attributes])`` using two queries per chunk."""
+    qs = Product.objects.order_by('id').values(
+        'id', 'name', 'description', 'is_active', 'category__slug', 'category__name',
+    )
+    if product_ids is not None:
+        qs = qs.filter(pk__in=list(product_ids))
+    chunk = []
+    for row in qs.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_attributes(chunk)
+            chunk = []
+    if chunk:
+        yield from _with_attributes(chunk)
+
+
+def _with_attributes(rows):
+    attrs = defaultdict(list)
+    variants = ProductVariant.objects.filter(product_id__in=[r['id'] for r in rows])
+    for product_id, attributes in variants.values_list('product_id', 'attributes'):
+        attrs[product_id].append(attributes)
+    for row in rows:
+        yield row, attrs[row['id']]
+
+
+def document_for(row, attributes_list):
+    return build_document(row['name'], row['description'], row['category__name'], attributes_list)
+
+
+class InvertedIndex:
+    """Token -> {product_id: term frequency} postings for active products."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.docs = {}
+        self.generation = None
+        self.lock = threading.RLock()
+
+    def add(self, product_id, text, category, facets):
+        with self.lock:
+            self.remove(product_id)
+            counts = Counter(tokenize(text))
+            for token, n in counts.items():
+                self.postings[token][product_id] = n
+            self.docs[product_id] = (category, facets, tuple(counts))
+
+    def remove(self, product_id):
+        with self.lock:
+            doc = self.docs.pop(product_id, None)
+            if doc is None:
+                return
+            for token in doc[2]:
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(product_id, None)
+                    if not postings:
+                        del self.postings[token]
+
+    def index_row(self, row, attributes_list):
+        if not row['is_active']:
+            self.remove(row['id'])
+            return
+        self.add(
+            row['id'], document_for(row, attributes_list), row['category__slug'], facet_pairs(attributes_list),
+        )
+
+    def match(self, tokens):
+        """Return ``{product_id: score}`` for products containing every token."""
+        with self.lock:
+            lists = sorted((self.postings.get(t, {}) for t in set(tokens)), key=len)
+            if not lists or not lists[0]:
+                return {}
+            scores = dict(lists[0])
+            for postings in lists[1:]:
+                scores = {pid: s + postings[pid] for pid, s in scores.items() if pid in postings}
+            return scores
+
+    def search(self, query, category=None, attributes=(), limit=20, offset=0):
+        scores = self.match(tokenize(query))
+        with self.lock:
+            hits = []
+            for pid, score in scores.items():
+                cat, facets, _ = self.docs[pid]
+                if category and cat != category:
+                    continue
+                if any(pair not in facets for pair in attributes):
+                    continue
+                hits.append((pid, score, cat, facets))
+        category_counts = Counter(cat for _, _, cat, _ in hits if cat)
+        attribute_counts = defaultdict(Counter)
+        for _, _, _, facets in hits:
+            for key, value in facets:
+                attribute_counts[key][value] += 1
+        hits.sort(key=lambda h: (-h[1], h[0]))
+        return {
+            'count': len(hits),
+            'ids': [h[0] for h in hits[offset:offset + limit]],
+            'facets': _facets(category_counts, attribute_counts),
+        }
+
+
+def _facets(category_counts, attribute_counts):
+    return {
+        'category': dict(category_counts.most_common()),
+        'attributes': {key: dict(values.most_common()) for key, values in sorted(attribute_counts.items())},
+    }
+
+
+class PostgresSearch:
+    def search(self, query, category=None, attributes=(), limit=20, offset=0):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = SearchVector('search_document', config=SEARCH_CONFIG)
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        qs = Product.objects.filter(is_active=True).alias(document=vector).filter(document=search_query)
+        if category:
+            qs = qs.filter(category__slug=category)
+        for key, value in attributes:
+            match = Q()
+            for candidate in facet_values(value):
+                match |= Q(attributes__contains={key: candidate})
+            variants = ProductVariant.objects.filter(match, product=OuterRef('pk'))
+            qs = qs.filter(Exists(variants))
+        ranked = qs.annotate(rank=SearchRank(vector, search_query)).order_by('-rank', 'id')
+        ids = list(ranked.values_list('id', flat=True)[offset:offset + limit])
+
+        category_counts = Counter({
+            row['category__slug']: row['n']
+            for row in qs.order_by().values('category__slug').annotate(n=Count('id'))
+            if row['category__slug']
+        })
+        attrs_by_product = defaultdict(list)
+        variants = ProductVariant.objects.filter(product__in=qs.values('pk'))
+        for product_id, attrs in variants.values_list('product_id', 'attributes'):
+            attrs_by_product[product_id].append(attrs)
+        attribute_counts = defaultdict(Counter)
+        for attrs_list in attrs_by_product.values():
+            for key, value in facet_pairs(attrs_list):
+                attribute_counts[key][value] += 1
+        return {
+            'count': qs.count(),
+            'ids': ids,
+            'facets': _facets(category_counts, attribute_counts),
+        }
+
+
+_index = InvertedIndex()
+
+
+def _current_generation():
+    try:
+        return catalog_cache.get_generation()
+    except Exception:
+        # without a shared cache we can only trust our own incremental updates
+        return 0 if _index.generation is None else _index.generation
+
+
+def get_local_index():
+    """Return the in-process index, rebuilding it if the catalog changed elsewhere."""
+    generation = _current_generation()
+    with _index.lock:
+        if _index.generation != generation:
+            _index.postings.clear()
+            _index.docs.clear()
+            for row, attributes_list in load_rows():
+                _index.index_row(row, attributes_list)
+            _index.generation = generation
+    return _index
+
+
+def search(query, category=None, attributes=(), limit=20, offset=0):
+    """Search active products; returns ``{'count', 'ids', 'facets'}`` with ids in rank order."""
+    if connection.vendor == 'postgresql':
+        return PostgresSearch().search(query, category, attributes, limit, offset)
+    return get_local_index().search(query, category, attributes, limit, offset)
+
+
+def refresh_documents(product_ids):
+    """Recompute ``search_document`` for ``product_ids`` and update the local index."""
+    updates = []
+    seen = set()
+    for row, attributes_list in load_rows(product_ids):
+        seen.add(row['id'])
+        updates.append(Product(pk=row['id'], search_document=document_for(row, attributes_list)))
+        if _index.generation is not None:
+            _index.index_row(row, attributes_list)
+    Product.objects.bulk_update(updates, ['search_document'], batch_size=500)
+    if _index.generation is not None:
+        for product_id in set(product_ids) - seen:
+            _index.remove(product_id)
+        _index.generation = _current_generation()
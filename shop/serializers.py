@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Product, ProductVariant, Category, Cart, CartItem
+from .models import Product, ProductVariant, Category, Cart, CartItem, Order, OrderItem
 from django.contrib.auth import get_user_model
 
 
@@ -50,6 +50,52 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'name', 'description', 'category', 'is_active', 'variants']
 
+    def __init__(self, *args, **kwargs):
+        # optional sparse fieldset, e.g. fields=['id', 'name']
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    category = serializers.SlugField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    in_stock = serializers.BooleanField(required=False, default=False)
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value):
+        requested = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = set(requested) - set(ProductSerializer.Meta.fields)
+        if unknown:
+            raise serializers.ValidationError('Unknown fields: %s' % ', '.join(sorted(unknown)))
+        return requested
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    category = serializers.SlugField(required=False)
+    attr = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+    offset = serializers.IntegerField(required=False, default=0, min_value=0)
+
+    def validate_attr(self, value):
+        # attr=color:red -> ('color', 'red')
+        pairs = []
+        for item in value:
+            key, sep, val = item.partition(':')
+            if not sep or not key:
+                raise serializers.ValidationError('Expected key:value, got %r' % item)
+            pairs.append((key, val))
+        return pairs
+
+
+class CatalogExportSerializer(serializers.Serializer):
+    format = serializers.ChoiceField(choices=['ndjson', 'csv'], required=False, default='ndjson')
+    since = serializers.DateTimeField(required=False)
+
 
 class CartItemSerializer(serializers.ModelSerializer):
     variant = ProductVariantSerializer(read_only=True)
@@ -64,7 +110,31 @@ class CartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'created_at', 'updated_at']
+        fields = ['id', 'user', 'items', 'item_count', 'subtotal', 'created_at', 'updated_at']
+        read_only_fields = ['item_count', 'subtotal']
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='variant.sku', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'variant', 'sku', 'quantity', 'price']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'status', 'created_at', 'total', 'item_count', 'items']
+
+    def __init__(self, *args, **kwargs):
+        # summary listings leave the lines out (and skip their prefetch)
+        with_items = kwargs.pop('with_items', True)
+        super().__init__(*args, **kwargs)
+        if not with_items:
+            self.fields.pop('items')
 
 
 class AuthTokenSerializer(serializers.Serializer):
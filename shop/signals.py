@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalog_cache, inventory, search
+from .models import Category, Product, ProductTombstone, ProductVariant
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_catalog(sender, using, **kwargs):
+    # after commit: a rebuild racing the write must not cache the old rows under the new generation
+    transaction.on_commit(catalog_cache.bump_generation, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reindex_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.refresh_documents([instance.pk])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reindex_variant_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.refresh_documents([instance.product_id])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reset_stock_counter(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'stock' in update_fields):
+        inventory.forget_stock([instance.pk])
+
+
+@receiver(post_delete, sender=ProductVariant)
+def touch_variant_product(sender, instance, **kwargs):
+    # exports list a product with its variants, so losing one is a change to the product
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    ProductTombstone.objects.update_or_create(product_id=instance.pk, defaults={'deleted_at': timezone.now()})
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reindex_category_products(sender, instance, raw=False, created=False, **kwargs):
+    if raw or created:
+        return
+    product_ids = getattr(instance, '_product_ids', None)
+    if product_ids is None:
+        product_ids = list(instance.products.values_list('pk', flat=True))
+    if product_ids:
+        search.refresh_documents(product_ids)
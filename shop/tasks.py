@@ -9,27 +9,39 @@ def deliver_webhook(self, event_id):
         ev = WebhookEvent.objects.get(pk=event_id)
     except WebhookEvent.DoesNotExist:
         return False
-    ev.mark_attempt()
     # delegate actual HTTP delivery to helper so it can be tested synchronously
-    from .tasks_helpers import deliver_event
+    from .tasks_helpers import post_event
     # In a real setup you'd look up subscriber URLs; here we send to a configured endpoint
     url = getattr(settings, 'WEBHOOK_DELIVERY_URL', None)
     if not url:
+        ev.mark_attempt()
         ev.mark_delivered()
         return True
+    from .circuit import DestinationGuard
+    guard = DestinationGuard(url)
+    if not guard.admit():
+        # breaker open or rate limited: come back later without holding the worker,
+        # using up an attempt or a retry
+        self.apply_async(
+            (event_id,), countdown=getattr(settings, 'WEBHOOK_SHED_DELAY', 10), retries=self.request.retries,
+        )
+        return None
+    ev.mark_attempt()
+    # the breaker needs the real status (429/503 slow the bucket down); None is a connection error
+    status = None
     try:
-        success = deliver_event(url, ev.payload)
-        if success:
-            ev.mark_delivered()
-            return True
-        else:
-            raise requests.RequestException('delivery failed')
+        status = post_event(url, ev.payload)
     except requests.RequestException:
-        try:
-            countdown = min(60 * (2 ** self.request.retries), 3600)
-            raise self.retry(countdown=countdown)
-        except self.MaxRetriesExceededError:
-            return False
+        pass
+    guard.observe(status)
+    if status is not None and 200 <= status < 300:
+        ev.mark_delivered()
+        return True
+    try:
+        countdown = min(60 * (2 ** self.request.retries), 3600)
+        raise self.retry(countdown=countdown)
+    except self.MaxRetriesExceededError:
+        return False
 
 
 def deliver_webhook_sync(event_id):
@@ -54,3 +66,51 @@ def deliver_webhook_sync(event_id):
     except requests.RequestException:
         return False
     return False
+
+
+@shared_task
+def flush_inventory():
+    """Apply committed Redis stock reservations to ProductVariant.stock."""
+    from .inventory import get_inventory
+    inventory = get_inventory()
+    if inventory is None:
+        return 0
+    return len(inventory.flush())
+
+
+@shared_task
+def reap_inventory_holds():
+    """Return stock held by abandoned (expired) reservations."""
+    from .inventory import get_inventory
+    inventory = get_inventory()
+    if inventory is None:
+        return 0
+    return inventory.reap()
+
+
+@shared_task
+def persist_carts(owners=None):
+    """Write Redis carts behind to Cart/CartItem (idle carts, or ``owners`` right away)."""
+    from .cart_store import RedisCartStore, get_store
+    store = get_store()
+    if not isinstance(store, RedisCartStore):
+        return 0
+    return store.persist(owners)
+
+
+@shared_task
+def deliver_pending_webhooks(batch_size=None):
+    """Drain undelivered WebhookEvents through the pooled, batched engine."""
+    from .webhooks import get_engine
+    delivered, failed = get_engine().drain(batch_size)
+    return {'delivered': delivered, 'failed': failed}
+
+
+@shared_task
+def flush_webhook_ingest():
+    """Bulk-insert webhooks buffered by WebhookReceiver in 'buffered' ingest mode."""
+    from .webhook_ingest import get_buffer
+    if getattr(settings, 'WEBHOOK_INGEST_MODE', 'direct') != 'buffered':
+        return 0
+    # bounded, so one run ends well inside the lock TTL; the next beat picks up the rest
+    return get_buffer().flush(max_batches=getattr(settings, 'WEBHOOK_INGEST_FLUSH_BATCHES', 20))
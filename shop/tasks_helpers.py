@@ -11,3 +11,10 @@ def deliver_event(url, payload, timeout=5):
     except requests.RequestException:
         return False
     return True
+
+
+def post_event(url, payload, timeout=5):
+    """POST payload to url and return the response status code.
+    Connection errors and timeouts raise ``requests.RequestException``.
+    """
+    return requests.post(url, json=payload, timeout=timeout).status_code
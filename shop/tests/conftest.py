@@ -0,0 +1,23 @@
+import pytest
+import redis
+from django.conf import settings
+
+
+@pytest.fixture(autouse=True)
+def query_budgets(settings):
+    """Every request in the suite runs instrumented; a view over its ``query_budget`` fails the test."""
+    settings.QUERY_INSTRUMENTATION = True
+    settings.QUERY_BUDGET_STRICT = True
+
+
+@pytest.fixture
+def redis_client():
+    """Raw client for tests that need real Redis commands (Lua, hashes); skipped without a server."""
+    client = redis.Redis.from_url(settings.REDIS_URL)
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip('Redis is not available')
+    yield client
+    for key in client.scan_iter('test:*'):
+        client.delete(key)
@@ -0,0 +1,138 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from shop import async_cache, cart_store
+from shop.cart_store import COOKIE_NAME, RedisCartStore
+from shop.models import Cart, Category, Product, ProductVariant, WebhookEvent
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def call(method, path, *args, cookies=None, **kwargs):
+    client = AsyncClient()
+    client.cookies.load(cookies or {})
+
+    async def request():
+        return await getattr(client, method)(path, *args, **kwargs)
+    response = async_to_sync(request)()
+    return response, json.loads(response.content)
+
+
+@pytest.fixture
+def catalog(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+    category = Category.objects.create(name='Books', slug='books')
+    variants = []
+    for i in range(5):
+        product = Product.objects.create(name=f'P{i}', category=category)
+        variants.append(ProductVariant.objects.create(product=product, sku=f'P{i}-1', price=f'{i + 1}.50', stock=3))
+    return variants
+
+
+def token_for(username):
+    client = APIClient()
+    client.post('/api/auth/register/', {'username': username, 'password': 'pw'})
+    return client.post('/api/auth/login/', {'username': username, 'password': 'pw'}).data['access']
+
+
+@pytest.mark.django_db
+def test_product_list_matches_sync_view_and_is_cached(catalog, django_assert_num_queries):
+    sync = APIClient().get('/api/products/', {'page_size': 2, 'in_stock': 'true'}).json()
+    with django_assert_num_queries(2):
+        response, data = call('get', '/api/async/products/', {'page_size': 2, 'in_stock': 'true'})
+    assert 'desc="2 queries"' in response['Server-Timing']
+    assert data['results'] == sync['results']
+    assert data['next'].startswith('http://testserver/api/async/products/?cursor=')
+    with django_assert_num_queries(0):
+        assert call('get', '/api/async/products/', {'page_size': 2, 'in_stock': 'true'})[1] == data
+    response, errors = call('get', '/api/async/products/', {'min_price': 'abc'})
+    assert response.status_code == 400 and 'min_price' in errors
+
+
+@pytest.mark.django_db
+def test_cart_read_for_anonymous_and_token_users(catalog):
+    client = APIClient()
+    client.post('/api/cart/add/', {'variant_id': catalog[0].pk, 'quantity': 2}, format='json')
+    anon = client.cookies[COOKIE_NAME].value
+    response, data = call('get', '/api/async/cart/', cookies={COOKIE_NAME: anon})
+    assert data == client.get('/api/cart/').json()
+    assert [(i['variant']['sku'], i['quantity']) for i in data['items']] == [('P0-1', 2)]
+
+    # logging in merges the anonymous cart and drops the cookie
+    access = token_for('async-buyer')
+    response, data = call(
+        'get', '/api/async/cart/', cookies={COOKIE_NAME: anon}, headers={'Authorization': f'Bearer {access}'},
+    )
+    assert data['user'] is not None and data['item_count'] == 2
+    assert response.cookies[COOKIE_NAME].value == ''
+    assert not Cart.objects.filter(token=anon).exists()
+
+    response, data = call('get', '/api/async/cart/')
+    assert data['items'] == [] and COOKIE_NAME not in response.cookies
+    response, data = call('get', '/api/async/cart/', headers={'Authorization': 'Bearer nope'})
+    assert response.status_code == 401 and response['WWW-Authenticate'].startswith('Bearer')
+
+
+@pytest.mark.django_db
+def test_webhook_ingest(settings, django_assert_num_queries):
+    settings.CACHES = LOCMEM
+    settings.WEBHOOK_SECRET = 'supersecret'
+    cache.clear()
+    raw = json.dumps({'event': 'order.paid', 'id': 1}).encode()
+    headers = {
+        'X-Signature': hmac.new(b'supersecret', raw, hashlib.sha256).hexdigest(), 'Idempotency-Key': 'k1',
+    }
+    with django_assert_num_queries(1):
+        response, data = call('post', '/api/async/webhook/', raw, content_type='application/json', headers=headers)
+    assert data == {'status': 'received'}
+    assert call('post', '/api/async/webhook/', raw, content_type='application/json', headers=headers)[1] == {
+        'status': 'duplicate',
+    }
+    response, _ = call('post', '/api/async/webhook/', raw, content_type='application/json', headers={
+        'X-Signature': 'bad',
+    })
+    assert response.status_code == 400
+    assert list(WebhookEvent.objects.values_list('event', flat=True)) == ['order.paid']
+
+
+@pytest.mark.django_db
+def test_redis_cart_store_reads_on_async_client(redis_client, catalog, settings, monkeypatch):
+    settings.CART_BACKEND = 'redis'
+    store = RedisCartStore(client=redis_client, ttl=60, persist_after=60)
+    store.prefix = 'test:cart'
+    monkeypatch.setattr(cart_store, '_store', store)
+    client = APIClient()
+    client.post('/api/cart/add/', {'variant_id': catalog[1].pk, 'quantity': 3}, format='json')
+    anon = client.cookies[COOKIE_NAME].value
+    expected = client.get('/api/cart/').json()
+    _, data = call('get', '/api/async/cart/', cookies={COOKIE_NAME: anon})
+    assert {k: v for k, v in data.items() if k != 'updated_at'} == \
+        {k: v for k, v in expected.items() if k != 'updated_at'}
+    assert data['subtotal'] == '7.50'
+
+
+def test_redis_cache_adapter_shares_entries_with_django_redis(redis_client, settings):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': django_settings.REDIS_URL, 'KEY_PREFIX': 'test',
+    }}
+    cache.set('shared', {'a': 1})
+    cache.set('counter', 5)
+
+    async def roundtrip():
+        acache = async_cache.get_cache()
+        assert isinstance(acache, async_cache.RedisCache)
+        seen = (await acache.aget('shared'), await acache.aget('counter'), await acache.aadd('shared', 2))
+        await acache.aset_many({'written': [1, 2]}, 30)
+        await acache.adelete('counter')
+        return seen + (await acache.aget_many(['shared', 'written', 'counter']),)
+
+    assert async_to_sync(roundtrip)() == ({'a': 1}, 5, False, {'shared': {'a': 1}, 'written': [1, 2]})
+    assert cache.get('written') == [1, 2] and cache.get('counter') is None
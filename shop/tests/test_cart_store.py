@@ -0,0 +1,139 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from shop import cart_store
+from shop.cart_store import COOKIE_NAME, RedisCartStore
+from shop.models import Category, Product, ProductVariant, Cart, Order
+
+User = get_user_model()
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _variants(slug, n=2):
+    cat = Category.objects.create(name=slug, slug=slug)
+    p = Product.objects.create(name='P', description='', category=cat)
+    return [
+        ProductVariant.objects.create(product=p, sku=f'{slug}-{i}', price='2.50', stock=10) for i in range(n)
+    ]
+
+
+def _login(client, username):
+    client.post('/api/auth/register/', {'username': username, 'password': 'pw'})
+    login = client.post('/api/auth/login/', {'username': username, 'password': 'pw'}).data
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {login['access']}")
+
+
+@pytest.fixture
+def redis_store(redis_client, settings, monkeypatch):
+    settings.CACHES = LOCMEM
+    cache.clear()  # variant pks are reused after rollback; drop entries cached by earlier tests
+    settings.CART_BACKEND = 'redis'
+    store = RedisCartStore(client=redis_client, ttl=60, persist_after=60)
+    store.prefix = 'test:cart'
+    monkeypatch.setattr(cart_store, '_store', store)
+    return store
+
+
+def _anonymous_cart_then_login(username):
+    a, b = _variants(username)
+    client = APIClient()
+    r = client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 2}, format='json')
+    assert r.status_code == 200 and r.data['item_count'] == 2
+    token = r.cookies[COOKIE_NAME].value
+    assert client.get('/api/cart/').data['item_count'] == 2
+
+    _login(client, username)
+    client.post('/api/cart/add/', {'variant_id': b.id, 'quantity': 1}, format='json')
+    data = client.get('/api/cart/').data
+    assert sorted((i['variant']['sku'], i['quantity']) for i in data['items']) == [
+        (f'{username}-0', 2), (f'{username}-1', 1),
+    ]
+    return client, token
+
+
+@pytest.mark.django_db
+def test_database_store_merges_anonymous_cart_on_login():
+    client, token = _anonymous_cart_then_login('cs1')
+    assert not Cart.objects.filter(token=token).exists()
+    assert client.post('/api/checkout/', {'address': '1 Main St'}, format='json').status_code == 200
+    assert client.get('/api/cart/').data['items'] == []
+
+
+@pytest.mark.django_db
+def test_checkout_requires_login():
+    _variants('cs2')
+    assert APIClient().post('/api/checkout/', {'address': '1 Main St'}, format='json').status_code == 401
+
+
+@pytest.mark.django_db
+def test_redis_store_serves_carts_and_writes_behind(redis_store, django_assert_num_queries):
+    client, _ = _anonymous_cart_then_login('cs3')
+    assert not Cart.objects.filter(user__username='cs3').exists()  # nothing written yet
+
+    with django_assert_num_queries(0):  # user from the token claims, variants from the cache
+        data = client.get('/api/cart/').data
+    assert (data['item_count'], data['subtotal']) == (3, '7.50')
+
+    variant_id = data['items'][0]['id']
+    assert client.patch(f'/api/cart/item/{variant_id}/', {'quantity': 5}, format='json').data['item_count'] == 6
+    assert client.delete('/api/cart/item/999999/').status_code == 404
+
+    assert redis_store.persist(idle=-1) >= 1
+    user_cart = Cart.objects.get(user__username='cs3')
+    assert (user_cart.item_count, str(user_cart.subtotal)) == (6, '15.00')
+    assert redis_store.dirty_owners(idle=-1) == []
+
+
+@pytest.mark.django_db
+def test_redis_store_checkout_and_hydration(redis_store):
+    a, _ = _variants('cs4')
+    client = APIClient()
+    _login(client, 'cs4')
+    client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 3}, format='json')
+    redis_store.persist(idle=-1)
+
+    # an evicted cart is read back from the database
+    redis_store.client.delete(redis_store._key(f'user:{Cart.objects.get(user__username="cs4").user_id}'))
+    assert client.get('/api/cart/').data['item_count'] == 3
+
+    # a checkout already running for this cart holds the lock
+    owner_key = redis_store._key(f'user:{Cart.objects.get(user__username="cs4").user_id}')
+    redis_store.client.set(f'{owner_key}:checkout', 'other')
+    r = client.post('/api/checkout/', {'address': '1 Main St'}, format='json')
+    assert r.status_code == 409 and r.data['detail'] == 'Checkout in progress'
+    assert redis_store.client.get(f'{owner_key}:checkout') == b'other'  # not ours to release
+    redis_store.client.delete(f'{owner_key}:checkout')
+
+    r = client.post('/api/checkout/', {'address': '1 Main St'}, format='json')
+    assert r.status_code == 200
+    assert Order.objects.get(pk=r.data['order_id']).items.get().quantity == 3
+    assert client.get('/api/cart/').data['items'] == []
+    redis_store.persist(idle=-1)
+    assert not Cart.objects.get(user__username='cs4').items.exists()
+
+
+@pytest.mark.django_db
+def test_redis_checkout_failures_leave_no_order_and_keep_the_cart(redis_store, monkeypatch):
+    a, _ = _variants('cs5')
+    client = APIClient()
+    _login(client, 'cs5')
+    client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 2}, format='json')
+    owner = f'user:{User.objects.get(username="cs5").pk}'
+
+    def down(*args, **kwargs):
+        raise ConnectionError('redis down')
+    # emptying the cart fails: no order is written
+    subtract = redis_store._subtract
+    monkeypatch.setattr(redis_store, '_subtract', down)
+    with pytest.raises(ConnectionError):
+        redis_store.checkout(owner, User.objects.get(username='cs5'))
+    monkeypatch.setattr(redis_store, '_subtract', subtract)
+    assert not Order.objects.exists() and redis_store.read(owner)[1] == {a.id: 2}
+
+    # writing the order fails: the lines go back into the cart
+    monkeypatch.setattr(cart_store, 'order_from_lines', down)
+    with pytest.raises(ConnectionError):
+        redis_store.checkout(owner, User.objects.get(username='cs5'))
+    assert not Order.objects.exists() and redis_store.read(owner)[1] == {a.id: 2}
+    assert not redis_store.client.exists(f'{redis_store._key(owner)}:checkout')
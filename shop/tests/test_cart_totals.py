@@ -0,0 +1,85 @@
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from shop import carts
+from shop.checkout import place_order
+from django.contrib.auth import get_user_model
+from shop.models import Category, Product, ProductVariant, Cart, CartItem
+
+User = get_user_model()
+
+
+def _setup(username):
+    client = APIClient()
+    client.post('/api/auth/register/', {'username': username, 'password': 'pw'})
+    login = client.post('/api/auth/login/', {'username': username, 'password': 'pw'}).data
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {login['access']}")
+    cat = Category.objects.create(name=username, slug=username)
+    p = Product.objects.create(name='P', description='', category=cat)
+    a = ProductVariant.objects.create(product=p, sku=f'{username}-a', price='2.50', stock=10)
+    b = ProductVariant.objects.create(product=p, sku=f'{username}-b', price='4.00', stock=10)
+    return client, a, b
+
+
+@pytest.mark.django_db
+def test_totals_follow_add_update_and_remove():
+    client, a, b = _setup('ct1')
+    r = client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 2}, format='json')
+    assert r.data['item_count'] == 2
+    r = client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 1}, format='json')
+    client.post('/api/cart/add/', {'variant_id': b.id, 'quantity': 1}, format='json')
+    cart = Cart.objects.get(pk=r.data['cart_id'])
+    assert (cart.item_count, cart.subtotal) == (4, Decimal('11.50'))
+
+    item = cart.items.get(variant=a)
+    data = client.patch(f'/api/cart/item/{item.id}/', {'quantity': 1}, format='json').data
+    assert (data['item_count'], data['subtotal']) == (2, '6.50')
+    data = client.delete(f'/api/cart/item/{item.id}/').data
+    assert (data['item_count'], data['subtotal']) == (1, '4.00')
+    assert cart.total_items() == 1 and cart.total_price() == Decimal('4.00')
+
+
+@pytest.mark.django_db
+def test_add_to_cart_query_count_independent_of_cart_size():
+    client, a, _ = _setup('ct2')
+    cart = Cart.objects.create(user=User.objects.get(username='ct2'))
+    for i in range(20):
+        v = ProductVariant.objects.create(product=a.product, sku=f'ct2-{i}', price='1.00', stock=5)
+        carts.add_item(cart, v, 1)
+    with CaptureQueriesContext(connection) as ctx:
+        client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 1}, format='json')
+    assert not any('SUM(' in q['sql'].upper() for q in ctx.captured_queries)
+    cart.refresh_from_db()
+    assert cart.item_count == 21
+
+
+@pytest.mark.django_db
+def test_checkout_resets_totals():
+    client, a, _ = _setup('ct3')
+    client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 3}, format='json')
+    cart = Cart.objects.get(user__username='ct3')
+    place_order(cart, cart.user)
+    cart.refresh_from_db()
+    assert (cart.item_count, cart.subtotal) == (0, Decimal('0'))
+
+
+@pytest.mark.django_db
+def test_check_cart_totals_repairs_drift():
+    client, a, _ = _setup('ct4')
+    client.post('/api/cart/add/', {'variant_id': a.id, 'quantity': 2}, format='json')
+    cart = Cart.objects.get(user__username='ct4')
+    CartItem.objects.filter(cart=cart).update(quantity=5)
+    out = StringIO()
+    call_command('check_cart_totals', stdout=out)
+    assert '1 drifted cart(s) found' in out.getvalue()
+    call_command('check_cart_totals', '--fix', stdout=StringIO())
+    cart.refresh_from_db()
+    assert (cart.item_count, cart.subtotal) == (5, Decimal('12.50'))
+    out = StringIO()
+    call_command('check_cart_totals', stdout=out)
+    assert '0 drifted cart(s) found' in out.getvalue()
@@ -0,0 +1,69 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from shop.checkout import EmptyCart, InsufficientStock, place_order
+from shop.models import Category, Product, ProductVariant, Cart, CartItem, Order
+
+User = get_user_model()
+
+
+def _cart_with_lines(username, n, stock=10, qty=2):
+    user = User.objects.create_user(username=username, password='pw')
+    cart = Cart.objects.create(user=user)
+    cat = Category.objects.create(name=username, slug=username)
+    p = Product.objects.create(name='P', description='', category=cat)
+    for i in range(n):
+        v = ProductVariant.objects.create(product=p, sku=f'{username}-{i}', price='2.50', stock=stock)
+        CartItem.objects.create(cart=cart, variant=v, quantity=qty)
+    return user, cart
+
+
+@pytest.mark.django_db
+def test_place_order_reserves_stock_and_empties_cart():
+    user, cart = _cart_with_lines('co1', 3)
+    order = place_order(cart, user)
+    assert order.items.count() == 3
+    assert str(order.total) == '15.00'
+    assert set(ProductVariant.objects.values_list('stock', flat=True)) == {8}
+    assert not cart.items.exists()
+
+
+@pytest.mark.django_db
+def test_place_order_rejects_oversell_and_rolls_back():
+    user, cart = _cart_with_lines('co2', 2, stock=1)
+    with pytest.raises(InsufficientStock) as exc:
+        place_order(cart, user)
+    assert exc.value.skus == ['co2-0', 'co2-1']
+    assert Order.objects.count() == 0
+    assert set(ProductVariant.objects.values_list('stock', flat=True)) == {1}
+    assert cart.items.count() == 2
+
+
+@pytest.mark.django_db
+def test_place_order_empty_cart():
+    user = User.objects.create_user(username='co3', password='pw')
+    with pytest.raises(EmptyCart):
+        place_order(Cart.objects.create(user=user), user)
+
+
+@pytest.mark.django_db
+def test_place_order_query_count_independent_of_cart_size():
+    counts = []
+    for username, n in (('small', 1), ('large', 8)):
+        user, cart = _cart_with_lines(username, n)
+        with CaptureQueriesContext(connection) as ctx:
+            place_order(cart, user)
+        counts.append(len(ctx.captured_queries))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.django_db
+def test_second_checkout_of_same_cart_is_empty():
+    # both callers loaded the cart before either checked out
+    user, cart = _cart_with_lines('co4', 2, qty=1)
+    place_order(cart, user)
+    with pytest.raises(EmptyCart):
+        place_order(cart, user)
+    assert Order.objects.count() == 1
+    assert set(ProductVariant.objects.values_list('stock', flat=True)) == {9}
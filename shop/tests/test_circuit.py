@@ -0,0 +1,62 @@
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from shop.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, TokenBucket, destination_key, metrics
+from shop.models import WebhookEvent
+from shop.webhooks import WebhookEngine
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def locmem(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+
+
+def test_breaker_trips_probes_and_closes(locmem):
+    breaker = CircuitBreaker('b1', threshold=3, window=60, reset_timeout=30)
+    for _ in range(2):
+        breaker.failure(now=100)
+    assert breaker.state(now=100) == CLOSED
+    breaker.failure(now=100)
+    assert breaker.state(now=100) == OPEN
+    assert breaker.allow(5, now=110) == 0
+
+    assert breaker.state(now=131) == HALF_OPEN
+    assert breaker.allow(5, now=131) == 1  # a single probe
+    assert breaker.allow(5, now=131) == 0
+    breaker.failure(now=131)  # failed probe re-opens
+    assert breaker.state(now=140) == OPEN
+
+    assert breaker.allow(now=162) == 1
+    breaker.success()
+    assert breaker.state() == CLOSED
+    assert metrics('b1') == {'trips': 2, 'shed_open': 14, 'shed_rate': 0, 'throttled': 0}
+
+
+@pytest.mark.django_db
+def test_engine_defers_events_for_open_circuit_without_spending_attempts(locmem, settings):
+    settings.WEBHOOK_DELIVERY_URL = 'http://127.0.0.1:9/hook'
+    CircuitBreaker(destination_key(settings.WEBHOOK_DELIVERY_URL), threshold=1).failure()
+    WebhookEvent.objects.bulk_create([WebhookEvent(event='e', payload={'n': i}) for i in range(3)])
+    engine = WebhookEngine(workers=2)
+    try:
+        assert engine.drain() == (0, 0)
+    finally:
+        engine.close()
+    assert set(WebhookEvent.objects.values_list('attempts', 'delivered')) == {(0, False)}
+    assert WebhookEvent.objects.filter(next_attempt_at__lte=timezone.now()).count() == 0
+
+
+def test_token_bucket_limits_and_adapts(redis_client, locmem):
+    bucket = TokenBucket('test:b2', rate=10, capacity=5, client=redis_client)
+    bucket.key = 'test:bucket'
+    assert bucket.take(8, now=1000) == 5
+    assert bucket.take(1, now=1000) == 0
+    assert bucket.take(3, now=1000.2) == 2  # refilled at 10/s
+    assert bucket.slow_down() == 0.5
+    assert bucket.take(5, now=1001.2) == 5  # 1s at 5/s
+    assert bucket.take(5, now=1001.7) == 2
+    assert bucket.speed_up() == pytest.approx(0.55)
+    assert metrics('test:b2')['shed_rate'] == 3 + 1 + 1 + 3
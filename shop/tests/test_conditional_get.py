@@ -0,0 +1,94 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from shop.inventory import apply_stock_deltas
+from shop.models import Cart, Category, Product, ProductVariant
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def variants(settings):
+    settings.CACHES = LOCMEM
+    settings.CATALOG_SHARED_MAX_AGE = 3
+    cache.clear()
+    category = Category.objects.create(name='Books', slug='books')
+    return [
+        ProductVariant.objects.create(
+            product=Product.objects.create(name=f'P{i}', category=category), sku=f'P{i}-1', price='2.00', stock=5,
+        )
+        for i in range(3)
+    ]
+
+
+@pytest.mark.django_db
+def test_product_list_revalidates_with_zero_queries(
+    variants, django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    client = APIClient()
+    first = client.get('/api/products/', {'page_size': 2})
+    etag = first['ETag']
+    assert etag.startswith('"') and not etag.startswith('W/')
+    assert first['Cache-Control'] == 'public, max-age=0, s-maxage=3'
+    assert {'Accept', 'Authorization'} <= {v.strip() for v in first['Vary'].split(',')}
+
+    with django_assert_num_queries(0):
+        response = client.get('/api/products/', {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304 and response.content == b''
+    assert response['ETag'] == etag
+    assert client.get(
+        '/api/products/', {'page_size': 2}, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'],
+    ).status_code == 304
+
+    # another page, or a catalog write, is a different representation
+    assert client.get('/api/products/', {'page_size': 3}, HTTP_IF_NONE_MATCH=etag).status_code == 200
+    variants[0].price = '3.00'
+    with django_capture_on_commit_callbacks(execute=True):
+        variants[0].save()
+    changed = client.get('/api/products/', {'page_size': 2}, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200 and changed['ETag'] != etag
+    assert changed.json()['results'][0]['variants'][0]['price'] == '3.00'
+
+    client.credentials(HTTP_AUTHORIZATION='Bearer nope')
+    assert client.get('/api/products/', {'page_size': 2}).status_code == 401
+
+
+@pytest.mark.django_db
+def test_cart_revalidates_until_the_cart_changes(
+    variants, django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    client = APIClient()
+    client.post('/api/cart/add/', {'variant_id': variants[0].pk, 'quantity': 1}, format='json')
+    first = client.get('/api/cart/')
+    etag = first['ETag']
+    assert first['Cache-Control'] == 'private, no-cache'
+    assert {'Authorization', 'Cookie'} <= {v.strip() for v in first['Vary'].split(',')}
+
+    with django_assert_num_queries(1):  # the cart's updated_at; no items, no serialization
+        response = client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304 and response['ETag'] == etag
+
+    client.post('/api/cart/add/', {'variant_id': variants[1].pk, 'quantity': 2}, format='json')
+    response = client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response.json()['item_count'] == 3
+    etag = response['ETag']
+    assert client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # variant data shown in the cart follows the catalog generation
+    variants[1].price = '5.00'
+    with django_capture_on_commit_callbacks(execute=True):
+        variants[1].save()
+    response = client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert [i['variant']['price'] for i in response.json()['items']] == ['2.00', '5.00']
+
+    # stock moves by UPDATE without a generation bump; the ETag still changes
+    etag = response['ETag']
+    apply_stock_deltas({variants[0].pk: 2})
+    response = client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response.json()['items'][0]['variant']['stock'] == 3
+
+    # a new visitor has no cart to validate against, and reading it stores nothing
+    fresh = APIClient().get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+    assert fresh.status_code == 200 and fresh.json()['items'] == []
+    assert Cart.objects.count() == 1 and 'cart_token' not in fresh.cookies
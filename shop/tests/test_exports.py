@@ -0,0 +1,108 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from shop import exports
+from shop.inventory import apply_stock_deltas
+from shop.models import Category, Product, ProductVariant
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def catalog(settings):
+    settings.CACHES = LOCMEM
+    books = Category.objects.create(name='Books', slug='books')
+    for i in range(5):
+        p = Product.objects.create(name=f'P{i}', description='a, "quoted"\nline', category=books)
+        ProductVariant.objects.create(product=p, sku=f'P{i}-1', price='9.50', stock=i, attributes={'n': i})
+    Product.objects.create(name='Bare', category=None)
+    Product.objects.create(name='Hidden', category=books, is_active=False)
+    past = timezone.now() - datetime.timedelta(days=1)
+    Product.objects.update(updated_at=past)
+    ProductVariant.objects.update(updated_at=past)
+
+
+def body(resp):
+    raw = b''.join(resp.streaming_content)
+    return gzip.decompress(raw) if resp.get('Content-Encoding') == 'gzip' else raw
+
+
+@pytest.mark.django_db
+def test_ndjson_export_streams_active_products_in_chunks(catalog, django_assert_num_queries):
+    # one cursor over products, one variant query per chunk of 2
+    with django_assert_num_queries(4):
+        lines = b''.join(exports.export('ndjson', chunk_size=2)).splitlines()
+    products = [json.loads(line) for line in lines]
+    assert [p['name'] for p in products] == ['P0', 'P1', 'P2', 'P3', 'P4', 'Bare']
+    assert products[1]['variants'] == [{'id': products[1]['variants'][0]['id'], 'sku': 'P1-1', 'price': '9.50',
+                                        'stock': 1, 'attributes': {'n': 1}}]
+    assert products[5]['variants'] == [] and products[5]['category'] is None
+
+
+@pytest.mark.django_db
+def test_since_includes_variant_changes_and_deactivations(catalog):
+    since = timezone.now() - datetime.timedelta(minutes=1)
+    assert list(exports.iter_products(since)) == []
+    apply_stock_deltas({ProductVariant.objects.get(sku='P2-1').pk: 1})
+    hidden = Product.objects.get(name='P4')
+    hidden.is_active = False
+    hidden.save()
+    changed = {p['name']: p for p in exports.iter_products(since)}
+    assert set(changed) == {'P2', 'P4'}
+    assert changed['P2']['variants'][0]['stock'] == 1
+    assert changed['P4']['is_active'] is False
+
+
+@pytest.mark.django_db
+def test_since_includes_variant_and_product_deletions(catalog):
+    since = timezone.now() - datetime.timedelta(minutes=1)
+    ProductVariant.objects.get(sku='P1-1').delete()
+    gone = Product.objects.get(name='P3')
+    gone_id = gone.pk
+    gone.delete()
+    changed = list(exports.iter_products(since))
+    assert [(p['id'], p.get('name'), p.get('deleted', False)) for p in changed] == [
+        (Product.objects.get(name='P1').pk, 'P1', False), (gone_id, None, True),
+    ]
+    assert changed[0]['variants'] == [] and changed[1]['is_active'] is False
+    assert list(exports.iter_products(timezone.now())) == []
+
+    rows = list(csv.DictReader(io.StringIO(b''.join(exports.export('csv', since=since)).decode())))
+    assert [(r['product_id'], r['name'], r['is_active'], r['sku']) for r in rows][1] == (str(gone_id), '', 'false', '')
+    assert all(p.get('deleted') is None for p in exports.iter_products())
+
+
+@pytest.mark.django_db
+def test_export_endpoint_csv_gzip(catalog):
+    resp = APIClient().get('/api/products/export/', {'format': 'csv'}, HTTP_ACCEPT_ENCODING='gzip, br')
+    assert resp.status_code == 200 and resp.streaming
+    assert resp['Content-Type'] == 'text/csv; charset=utf-8'
+    assert 'Accept-Encoding' in resp['Vary']
+    rows = list(csv.DictReader(io.StringIO(body(resp).decode())))
+    assert len(rows) == 6
+    assert rows[0]['description'] == 'a, "quoted"\nline'
+    assert (rows[0]['sku'], rows[0]['price'], rows[0]['is_active']) == ('P0-1', '9.50', 'true')
+    assert (rows[5]['name'], rows[5]['sku'], rows[5]['category']) == ('Bare', '', '')
+
+
+@pytest.mark.django_db
+def test_export_endpoint_validates_params(catalog):
+    client = APIClient()
+    assert client.get('/api/products/export/', {'format': 'xml'}).status_code == 400
+    assert client.get('/api/products/export/', {'since': 'yesterday'}).status_code == 400
+    resp = client.get('/api/products/export/', {'since': timezone.now().isoformat()})
+    assert resp.status_code == 200 and body(resp) == b''
+
+
+@pytest.mark.django_db
+def test_export_catalog_command_writes_gzip_file(catalog, tmp_path):
+    out = tmp_path / 'catalog.ndjson.gz'
+    call_command('export_catalog', '--gzip', '-o', str(out), '--chunk-size', '4')
+    assert len(gzip.decompress(out.read_bytes()).splitlines()) == 6
@@ -28,4 +28,61 @@ def test_create_order_mutation():
     r = schema.execute(m, context_value=SimpleNamespace(user=user))
     assert not r.errors
     assert r.data['createOrder']['ok'] is True
-    assert r.data['createOrder']['orderId'] is not None
\ No newline at end of file
+    assert r.data['createOrder']['orderId'] is not None
+
+@pytest.mark.django_db
+def test_create_order_with_quantities_uses_decimal_total():
+    user = User.objects.create_user(username='m2', password='p')
+    cat = Category.objects.create(name='G3', slug='g3')
+    p = Product.objects.create(name='P', description='', category=cat, is_active=True)
+    a = ProductVariant.objects.create(product=p, sku='P-A', price='0.10', stock=5)
+    b = ProductVariant.objects.create(product=p, sku='P-B', price='0.20', stock=5)
+    m = (
+        f'mutation {{ createOrder(lines: [{{variantId: {a.id}, quantity: 3}}, {{variantId: {b.id}}}]) '
+        '{ ok order { total items { quantity variant { sku } } } } }'
+    )
+    r = schema.execute(m, context_value=SimpleNamespace(user=user))
+    assert not r.errors
+    order = r.data['createOrder']['order']
+    assert order['total'] == '0.50'
+    assert [(i['variant']['sku'], i['quantity']) for i in order['items']] == [('P-A', 3), ('P-B', 1)]
+    a.refresh_from_db()
+    assert a.stock == 2
+
+
+@pytest.mark.django_db
+def test_create_orders_bulk_uses_fixed_query_count():
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    user = User.objects.create_user(username='m3', password='p')
+    cat = Category.objects.create(name='G4', slug='g4')
+    p = Product.objects.create(name='P', description='', category=cat, is_active=True)
+    vs = [ProductVariant.objects.create(product=p, sku=f'B-{i}', price='1.00', stock=100) for i in range(5)]
+    orders = ', '.join(
+        '{lines: [%s]}' % ', '.join(f'{{variantId: {v.id}, quantity: 2}}' for v in vs[:n + 1])
+        for n in range(5)
+    )
+    m = f'mutation {{ createOrders(orders: [{orders}]) {{ ok orderIds orders {{ items {{ variant {{ sku }} }} }} }} }}'
+    with CaptureQueriesContext(connection) as ctx:
+        r = schema.execute(m, context_value=SimpleNamespace(user=user))
+    assert not r.errors
+    assert len(r.data['createOrders']['orderIds']) == 5
+    assert [len(o['items']) for o in r.data['createOrders']['orders']] == [1, 2, 3, 4, 5]
+    # in_bulk + stock UPDATE + orders INSERT + items INSERT, plus transaction statements
+    assert len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]) <= 4
+
+
+@pytest.mark.django_db
+def test_create_order_rejects_unknown_variant_and_short_stock():
+    user = User.objects.create_user(username='m4', password='p')
+    cat = Category.objects.create(name='G5', slug='g5')
+    p = Product.objects.create(name='P', description='', category=cat, is_active=True)
+    v = ProductVariant.objects.create(product=p, sku='S-1', price='1.00', stock=1)
+    ctx = SimpleNamespace(user=user)
+    r = schema.execute('mutation { createOrder(items: [999999]) { ok } }', context_value=ctx)
+    assert 'Unknown variant ids: 999999' in r.errors[0].message
+    r = schema.execute(f'mutation {{ createOrder(lines: [{{variantId: {v.id}, quantity: 2}}]) {{ ok }} }}',
+                       context_value=ctx)
+    assert 'S-1' in r.errors[0].message
+    from shop.models import Order
+    assert Order.objects.count() == 0
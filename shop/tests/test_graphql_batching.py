@@ -0,0 +1,95 @@
+import pytest
+from types import SimpleNamespace
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from shop import schema_graphql
+from shop.graphql_loaders import BatchLoader
+from shop.models import Category, Product, ProductVariant, Order, OrderItem
+from shop.schema_graphql import schema
+
+User = get_user_model()
+
+
+@pytest.fixture
+def orders():
+    user = User.objects.create_user(username='gb', password='p')
+    cat = Category.objects.create(name='GB', slug='gb')
+    variants = []
+    for i in range(4):
+        p = Product.objects.create(name=f'GB{i}', description='', category=cat)
+        for j in range(3):
+            variants.append(ProductVariant.objects.create(product=p, sku=f'GB{i}-{j}', price='1.00', stock=5))
+    for n in range(10):
+        order = Order.objects.create(user=user, total=3)
+        for v in variants[n:n + 3]:
+            OrderItem.objects.create(order=order, variant=v, quantity=1, price=v.price)
+    return user
+
+
+def _execute(query, user=None):
+    with CaptureQueriesContext(connection) as ctx:
+        result = schema.execute(query, context_value=SimpleNamespace(user=user))
+    assert not result.errors, result.errors
+    return result, len(ctx.captured_queries)
+
+
+def test_batch_loader_fetches_wanted_keys_once():
+    calls = []
+
+    def fetch(keys):
+        calls.append(sorted(keys))
+        return {k: k * 10 for k in keys}
+
+    loader = BatchLoader(fetch)
+    loader.want([1, 2, 3])
+    assert loader.load(2) == 20
+    assert loader.load(3) == 30
+    assert loader.load(4) == 40
+    assert calls == [[1, 2, 3], [4]]
+
+
+@pytest.mark.django_db
+def test_deep_orders_query_is_bounded(orders):
+    q = '{ orders { id status items { quantity variant { sku price } } } }'
+    result, count = _execute(q, orders)
+    assert len(result.data['orders']) == 10
+    assert result.data['orders'][0]['items'][0]['variant']['sku']
+    assert count <= 2
+
+
+@pytest.mark.django_db
+def test_fragment_selection_is_optimized(orders):
+    q = '''
+    { products { ...P } }
+    fragment P on ProductType { name variants { sku } }
+    '''
+    result, count = _execute(q)
+    assert len(result.data['products']) == 4
+    assert all(len(p['variants']) == 3 for p in result.data['products'])
+    assert count <= 2
+
+
+@pytest.mark.django_db
+def test_selection_without_a_plan_is_batched(orders, monkeypatch):
+    # nothing prefetched: the root resolvers queue their parents' keys for the loaders
+    monkeypatch.setattr(schema_graphql, 'PRODUCT_PLAN', ())
+    monkeypatch.setattr(schema_graphql, 'ORDER_PLAN', ())
+    result, count = _execute('{ products { variants { sku } } }')
+    assert all(len(p['variants']) == 3 for p in result.data['products']) and count == 2
+    result, count = _execute('{ orders { items { variant { sku } } } }', orders)
+    assert len(result.data['orders']) == 10 and count == 3
+
+
+@pytest.mark.django_db
+def test_loaders_batch_without_prefetch(orders):
+    # loaders serve relations of objects that did not come from an optimised root
+    from shop.graphql_loaders import Loaders
+    loaders = Loaders()
+    order_ids = list(Order.objects.values_list('id', flat=True))
+    loaders.items_by_order.want(order_ids)
+    with CaptureQueriesContext(connection) as ctx:
+        for oid in order_ids:
+            for item in loaders.items_by_order.load(oid):
+                assert loaders.variant.load(item.variant_id).sku
+    assert len(ctx.captured_queries) == 2
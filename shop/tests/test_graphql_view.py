@@ -0,0 +1,122 @@
+import hashlib
+import json
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from shop import graphql_views
+from shop.models import Category, Product, ProductVariant
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+QUERY = '{ products { id name variants { sku } } }'
+
+
+def _post(client, body):
+    resp = client.post('/graphql/', json.dumps(body), content_type='application/json')
+    return resp.status_code, resp.json()
+
+
+def _apq(query):
+    return {'persistedQuery': {'version': 1, 'sha256Hash': hashlib.sha256(query.encode()).hexdigest()}}
+
+
+@pytest.fixture
+def product(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+    cat = Category.objects.create(name='GQ', slug='gq')
+    p = Product.objects.create(name='GQ1', description='', category=cat)
+    ProductVariant.objects.create(product=p, sku='GQ1-1', price='1.00', stock=1)
+    return p
+
+
+@pytest.mark.django_db
+def test_persisted_query_round_trip(product):
+    client = Client()
+    status, body = _post(client, {'extensions': _apq(QUERY)})
+    assert body['errors'][0]['message'] == 'PersistedQueryNotFound'
+    status, body = _post(client, {'query': QUERY, 'extensions': _apq(QUERY)})
+    assert body['data']['products'][0]['name'] == 'GQ1'
+    status, body = _post(client, {'extensions': _apq(QUERY)})
+    assert body['data']['products'][0]['variants'][0]['sku'] == 'GQ1-1'
+    status, body = _post(client, {'query': '{ products { id } }', 'extensions': _apq(QUERY)})
+    assert 'errors' in body
+
+
+@pytest.mark.django_db
+def test_documents_are_parsed_once(product, monkeypatch):
+    calls = []
+    real_parse = graphql_views.parse
+    monkeypatch.setattr(graphql_views, 'parse', lambda q: calls.append(q) or real_parse(q))
+    client = Client()
+    query = '{ products { id description } }'
+    for _ in range(3):
+        assert _post(client, {'query': query})[0] == 200
+    assert calls == [query]
+
+
+@pytest.mark.django_db
+@override_settings(GRAPHQL_MAX_COST=100)
+def test_expensive_query_rejected_before_execution(product):
+    wide = '{ %s }' % ' '.join(f'p{i}: products {{ id variants {{ sku }} }}' for i in range(5))
+    with CaptureQueriesContext(connection) as ctx:
+        status, body = _post(Client(), {'query': wide})
+    assert status == 400
+    assert 'exceeds the maximum allowed cost' in body['errors'][0]['message']
+    assert not ctx.captured_queries
+
+
+def test_query_cost_multiplies_lists():
+    from shop.schema_graphql import schema
+    document = graphql_views.parse('{ products { id variants { sku price } } }')
+    op = document.definitions[0]
+    cost = graphql_views.query_cost(op.selection_set.selections, schema.graphql_schema.query_type, {}, 10)
+    assert cost == 1 + 10 * (1 + 1 + 10 * 2)
+
+
+@pytest.mark.django_db
+def test_anonymous_catalog_response_cached_until_catalog_changes(
+    product, django_capture_on_commit_callbacks,
+):
+    client = Client()
+    _post(client, {'query': QUERY})
+    with CaptureQueriesContext(connection) as ctx:
+        status, body = _post(client, {'query': QUERY})
+    assert not ctx.captured_queries
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.create(name='GQ2', description='', category=product.category)
+    status, body = _post(client, {'query': QUERY})
+    assert [p['name'] for p in body['data']['products']] == ['GQ1', 'GQ2']
+
+
+@pytest.mark.django_db
+def test_fragment_cycle_is_a_validation_error(product):
+    cyclic = (
+        '{ products { ...A } } '
+        'fragment A on ProductType { variants { sku } ...B } fragment B on ProductType { ...A }'
+    )
+    status, body = _post(Client(), {'query': cyclic})
+    assert status == 400
+    assert 'Cannot spread fragment' in body['errors'][0]['message']
+
+    from shop.schema_graphql import schema
+    document = graphql_views.parse(cyclic)
+    fragments = {d.name.value: d for d in document.definitions[1:]}
+    selections = document.definitions[0].selection_set.selections
+    assert graphql_views.query_cost(selections, schema.graphql_schema.query_type, fragments, 10) == 1 + 10 * (1 + 10)
+
+
+@pytest.mark.django_db
+def test_error_responses_are_not_cached(product, monkeypatch):
+    from shop import schema_graphql
+
+    def broken(*args):
+        raise RuntimeError('database unavailable')
+    optimize = schema_graphql.optimize
+    monkeypatch.setattr(schema_graphql, 'optimize', broken)
+    status, body = _post(Client(), {'query': QUERY})
+    assert body['errors'][0]['message'] == 'database unavailable'
+    monkeypatch.setattr(schema_graphql, 'optimize', optimize)
+    status, body = _post(Client(), {'query': QUERY})
+    assert status == 200 and body['data']['products'][0]['name'] == 'GQ1'
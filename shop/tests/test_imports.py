@@ -0,0 +1,93 @@
+import io
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from shop import catalog_cache, exports, imports, search
+from shop.models import Category, Product, ProductVariant
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+CSV = '''product_id,name,description,category,is_active,sku,price,stock,attributes
+,Trail shoe,Grippy,shoes,true,TS-1,59.90,4,"{""size"": ""42""}"
+,Trail shoe,Grippy,shoes,true,TS-2,59.90,0,"{""size"": ""43""}"
+,Wool hat,,,false,WH-1,12,1,
+,Broken,,shoes,,BR-1,abc,1,
+,Lost,,nowhere,,LO-1,1,1,
+'''
+
+
+@pytest.fixture
+def shoes(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+    return Category.objects.create(name='Shoes', slug='shoes')
+
+
+@pytest.mark.django_db
+def test_csv_import_creates_groups_and_rejects(
+    shoes, django_assert_max_num_queries, django_capture_on_commit_callbacks,
+):
+    generation = catalog_cache.get_generation()
+    # one chunk: sku lookup, product insert, variant upsert (+ savepoint bookkeeping)
+    with django_assert_max_num_queries(6), django_capture_on_commit_callbacks(execute=True):
+        result = imports.import_catalog(imports.read_csv(io.StringIO(CSV)))
+    assert (result.products, result.created_products, result.variants, result.created_variants) == (2, 2, 3, 3)
+    assert [n for n, _ in result.errors] == [4, 5]
+    assert 'price' in result.errors[0][1] and 'category' in result.errors[1][1]
+    shoe = Product.objects.get(name='Trail shoe')
+    assert shoe.category == shoes and sorted(shoe.variants.values_list('sku', flat=True)) == ['TS-1', 'TS-2']
+    assert 'shoes' in shoe.search_document.lower() and '43' in shoe.search_document
+    assert Product.objects.get(name='Wool hat').is_active is False
+    assert catalog_cache.get_generation() == generation + 1
+
+
+@pytest.mark.django_db
+def test_reimport_upserts_by_sku_and_refreshes_documents(shoes):
+    imports.import_catalog(imports.read_csv(io.StringIO(CSV)))
+    shoe = Product.objects.get(name='Trail shoe')
+    ProductVariant.objects.create(product=shoe, sku='TS-3', price='1.00', attributes={'colour': 'teal'})
+    ndjson = (
+        '{"name": "Trail shoe v2", "category": "shoes", "variants": '
+        '[{"sku": "TS-1", "price": "49.90", "stock": 9, "attributes": {"size": "42"}}]}\n'
+        'not json\n'
+    )
+    result = imports.import_catalog(imports.read_ndjson(io.StringIO(ndjson)))
+    assert (result.created_products, result.created_variants, result.errors) == (0, 0, [(2, 'invalid JSON')])
+    shoe.refresh_from_db()
+    assert shoe.name == 'Trail shoe v2' and Product.objects.count() == 2
+    variant = ProductVariant.objects.get(sku='TS-1')
+    assert (str(variant.price), variant.stock, variant.product_id) == ('49.90', 9, shoe.pk)
+    # variants that were not in the file still count towards the document
+    assert 'teal' in shoe.search_document and 'v2' in shoe.search_document
+    assert search.search('teal')['ids'] == [shoe.pk]
+
+
+@pytest.mark.django_db
+def test_existing_sku_keeps_its_product(shoes):
+    imports.import_catalog(imports.read_csv(io.StringIO(CSV)))
+    shoe, hat = Product.objects.get(name='Trail shoe'), Product.objects.get(name='Wool hat')
+    ndjson = (
+        f'{{"id": {hat.pk}, "name": "Wool hat", "variants": '
+        '[{"sku": "TS-1", "price": "39.90", "stock": 2, "attributes": {"colour": "plum"}}]}\n'
+    )
+    result = imports.import_catalog(imports.read_ndjson(io.StringIO(ndjson)))
+    assert (result.created_products, result.created_variants, result.errors) == (0, 0, [])
+    variant = ProductVariant.objects.get(sku='TS-1')
+    assert (str(variant.price), variant.stock, variant.product_id) == ('39.90', 2, shoe.pk)
+    shoe.refresh_from_db()
+    hat.refresh_from_db()
+    assert 'plum' in shoe.search_document and 'plum' not in hat.search_document
+
+
+@pytest.mark.django_db
+def test_export_round_trips_through_import(shoes, tmp_path):
+    imports.import_catalog(imports.read_csv(io.StringIO(CSV)))
+    path = tmp_path / 'catalog.ndjson'
+    path.write_bytes(b''.join(exports.export('ndjson')))
+    before = list(exports.iter_products())
+    out = io.StringIO()
+    call_command('import_catalog', str(path), stdout=out)
+    assert out.getvalue().startswith('1 products (0 new), 2 variants (0 new), 0 rejected')
+    after = list(exports.iter_products())
+    assert [(p['id'], p['name'], p['variants']) for p in after] == [(p['id'], p['name'], p['variants']) for p in before]
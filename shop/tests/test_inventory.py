@@ -0,0 +1,106 @@
+import io
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from shop import checkout, imports
+from shop import inventory as inventory_module
+from shop.checkout import InsufficientStock, place_order
+from shop.inventory import InventoryUnavailable, RedisInventory, apply_stock_deltas
+from shop.models import Category, Product, ProductVariant, Cart, CartItem
+
+User = get_user_model()
+
+
+def _variant(sku, stock):
+    cat, _ = Category.objects.get_or_create(name='Inv', slug='inv')
+    p = Product.objects.create(name=sku, description='', category=cat)
+    return ProductVariant.objects.create(product=p, sku=sku, price='4.00', stock=stock)
+
+
+@pytest.fixture
+def inventory(redis_client):
+    inv = RedisInventory(client=redis_client, hold_seconds=30)
+    inv.prefix = 'test:inv'
+    return inv
+
+
+@pytest.mark.django_db
+def test_apply_stock_deltas_single_update():
+    a, b = _variant('D-1', 10), _variant('D-2', 1)
+    assert apply_stock_deltas({a.id: 3, b.id: 5}) == 2
+    a.refresh_from_db()
+    b.refresh_from_db()
+    assert (a.stock, b.stock) == (7, 0)
+
+
+@pytest.mark.django_db
+def test_reserve_commit_and_flush(inventory):
+    v = _variant('R-1', 5)
+    token = inventory.reserve({v.id: 2})
+    assert inventory.available(v.id) == 3
+    assert inventory.commit(token) is True
+    assert inventory.flush() == {v.id: 2}
+    v.refresh_from_db()
+    assert v.stock == 3
+    assert inventory.available(v.id) == 3
+
+
+@pytest.mark.django_db
+def test_reserve_rejects_oversell_and_release_restores(inventory):
+    v = _variant('R-2', 3)
+    token = inventory.reserve({v.id: 3})
+    with pytest.raises(InventoryUnavailable):
+        inventory.reserve({v.id: 1})
+    assert inventory.release(token) is True
+    assert inventory.available(v.id) == 3
+
+
+@pytest.mark.django_db
+def test_expired_holds_are_reaped(inventory):
+    v = _variant('R-3', 2)
+    token = inventory.reserve({v.id: 2}, now=0)
+    # the next reservation reaps the abandoned hold instead of failing
+    inventory.reserve({v.id: 1})
+    assert inventory.available(v.id) == 1
+    assert inventory.commit(token) is False
+
+
+@pytest.mark.django_db
+def test_place_order_uses_redis_counters(inventory, monkeypatch):
+    monkeypatch.setattr(checkout, 'get_inventory', lambda: inventory)
+    user = User.objects.create_user(username='inv', password='pw')
+    cart = Cart.objects.create(user=user)
+    v = _variant('R-4', 2)
+    CartItem.objects.create(cart=cart, variant=v, quantity=2)
+    place_order(cart, user)
+    CartItem.objects.create(cart=cart, variant=v, quantity=1)
+    with pytest.raises(InsufficientStock):
+        place_order(cart, user)
+    # database stock only moves when deltas are flushed
+    v.refresh_from_db()
+    assert v.stock == 2
+    inventory.flush()
+    v.refresh_from_db()
+    assert v.stock == 0
+
+
+@pytest.mark.django_db
+def test_stock_written_outside_flush_reseeds_counters(inventory, monkeypatch, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(inventory_module, 'get_inventory', lambda: inventory)
+    v = _variant('R-5', 5)
+    inventory.reserve({v.id: 2})
+    assert inventory.available(v.id) == 3
+
+    v.stock = 10
+    with django_capture_on_commit_callbacks(execute=True):
+        v.save()
+    assert inventory.available(v.id) is None
+    inventory.reserve({v.id: 1})
+    assert inventory.available(v.id) == 7  # the new stock less both holds
+
+    line = {'name': 'R-5', 'variants': [{'sku': 'R-5', 'price': '4.00', 'stock': 4}]}
+    with django_capture_on_commit_callbacks(execute=True):
+        imports.import_catalog(imports.read_ndjson(io.StringIO(json.dumps(line))))
+    inventory.reserve({v.id: 1})
+    assert inventory.available(v.id) == 0
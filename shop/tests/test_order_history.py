@@ -0,0 +1,66 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from shop.checkout import create_orders
+from shop.models import Category, Order, OrderItem, Product, ProductVariant
+
+User = get_user_model()
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def buyer(settings):
+    settings.CACHES = LOCMEM
+    product = Product.objects.create(name='P', category=Category.objects.create(name='C', slug='c'))
+    variants = [
+        ProductVariant.objects.create(product=product, sku=f'V{i}', price='2.50', stock=1000) for i in range(3)
+    ]
+    user = User.objects.create_user('buyer', password='pw')
+    other = User.objects.create_user('other', password='pw')
+    create_orders(other, [[(variants[0].pk, 1)]])
+    return user, variants
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.mark.django_db
+def test_history_is_paginated_newest_first_and_own_orders_only(buyer):
+    user, variants = buyer
+    created = create_orders(user, [[(variants[i % 3].pk, i + 1), (variants[0].pk, 1)] for i in range(5)])
+    client = client_for(user)
+    resp = client.get('/api/orders/', {'page_size': 3})
+    first = resp.data['results']
+    assert [o['id'] for o in first] == [o.pk for o, _ in reversed(created)][:3]
+    assert first[0]['item_count'] == 6 and first[0]['total'] == '15.00'
+    assert [(i['sku'], i['quantity']) for i in first[0]['items']] == [('V1', 5), ('V0', 1)]
+    rest = client.get(resp.data['next']).data
+    assert len(rest['results']) == 2 and rest['next'] is None
+    assert APIClient().get('/api/orders/').status_code == 401
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('orders', [3, 40])
+def test_query_count_does_not_grow_with_orders(buyer, orders, django_assert_num_queries):
+    user, variants = buyer
+    create_orders(user, [[(v.pk, 1) for v in variants]] * orders)
+    client = client_for(user)
+    with django_assert_num_queries(2):  # orders page, lines joined to variants
+        assert len(client.get('/api/orders/', {'page_size': 50}).data['results']) == orders
+    with django_assert_num_queries(1):
+        summary = client.get('/api/orders/', {'summary': 'true'}).data['results']
+    assert 'items' not in summary[0] and summary[0]['item_count'] == 3
+
+
+@pytest.mark.django_db
+def test_item_count_written_on_checkout(buyer):
+    user, variants = buyer
+    Order.objects.all().delete()
+    order = Order.objects.create(user=user)
+    OrderItem.objects.create(order=order, variant=variants[0], quantity=2, price='2.50')
+    (created, _), = create_orders(user, [[(variants[0].pk, 2), (variants[1].pk, 4)]])
+    assert Order.objects.get(pk=created.pk).item_count == 6
+    assert list(user.orders.order_by('id')) == [order, created]
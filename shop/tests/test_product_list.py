@@ -0,0 +1,73 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from shop.models import Category, Product, ProductVariant
+
+DUMMY = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@pytest.fixture
+def catalog():
+    books = Category.objects.create(name='Books', slug='books')
+    toys = Category.objects.create(name='Toys', slug='toys')
+    for i in range(7):
+        cat = books if i % 2 == 0 else toys
+        p = Product.objects.create(name=f'P{i}', description='', category=cat)
+        ProductVariant.objects.create(product=p, sku=f'P{i}-1', price=f'{i + 1}.00', stock=i % 3)
+    Product.objects.create(name='Hidden', description='', category=books, is_active=False)
+
+
+def _ids(resp):
+    return [p['id'] for p in resp.data['results']]
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=DUMMY)
+def test_cursor_pages_cover_catalog_once(catalog):
+    client = APIClient()
+    resp = client.get('/api/products/', {'page_size': 3})
+    seen = _ids(resp)
+    while resp.data['next']:
+        resp = client.get(resp.data['next'])
+        seen += _ids(resp)
+    assert seen == sorted(seen)
+    assert len(seen) == 7
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=DUMMY)
+def test_filters_by_category_price_and_stock(catalog):
+    client = APIClient()
+    names = lambda resp: [p['name'] for p in resp.data['results']]  # noqa: E731
+    assert names(client.get('/api/products/', {'category': 'toys'})) == ['P1', 'P3', 'P5']
+    assert names(client.get('/api/products/', {'min_price': '3', 'max_price': '5'})) == ['P2', 'P3', 'P4']
+    assert names(client.get('/api/products/', {'in_stock': 'true'})) == ['P1', 'P2', 'P4', 'P5']
+    resp = client.get('/api/products/', {'min_price': 'abc'})
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=DUMMY)
+def test_sparse_fieldset_skips_variants(catalog):
+    client = APIClient()
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get('/api/products/', {'fields': 'id,name'})
+    assert set(resp.data['results'][0]) == {'id', 'name'}
+    assert not any('shop_productvariant' in q['sql'] for q in ctx.captured_queries)
+    assert client.get('/api/products/', {'fields': 'id,secret'}).status_code == 400
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=DUMMY)
+def test_deep_page_costs_same_queries_as_first(catalog):
+    client = APIClient()
+    with CaptureQueriesContext(connection) as first:
+        resp = client.get('/api/products/', {'page_size': 2})
+    for _ in range(2):
+        resp = client.get(resp.data['next'])
+    with CaptureQueriesContext(connection) as deep:
+        client.get(resp.data['next'])
+    assert len(deep.captured_queries) == len(first.captured_queries)
+    assert 'OFFSET' not in deep.captured_queries[0]['sql'].upper()
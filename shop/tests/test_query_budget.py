@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.test import APIClient
+from shop.models import Category, Product, ProductVariant
+from shop_sphere.middleware import QueryBudgetExceeded, QueryInstrumentationMiddleware
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def run_view(view, settings, **overrides):
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    middleware = QueryInstrumentationMiddleware(lambda request: view(request))
+    request = RequestFactory().get('/x/')
+    middleware.process_view(request, view, (), {})
+    return request, middleware(request)
+
+
+def n_plus_one(request):
+    for product in Product.objects.all():
+        list(product.variants.all())
+    return HttpResponse()
+
+
+@pytest.fixture
+def catalog(settings):
+    settings.CACHES = LOCMEM
+    for i in range(6):
+        product = Product.objects.create(name=f'P{i}', category=None)
+        ProductVariant.objects.create(product=product, sku=f'S{i}', price='1.00')
+
+
+@pytest.mark.django_db
+def test_counts_queries_and_flags_repeated_shapes(catalog, settings, caplog):
+    with caplog.at_level(logging.WARNING, logger='shop_sphere.middleware'):
+        request, response = run_view(n_plus_one, settings, QUERY_BUDGET_STRICT=False)
+    assert request.query_stats.count == 7
+    assert response['Server-Timing'].endswith('desc="7 queries"')
+    [record] = caplog.records
+    assert 'Possible N+1 in /x/: 6 x SELECT' in record.getMessage()
+
+
+@pytest.mark.django_db
+def test_budget_warns_or_raises(catalog, settings, caplog):
+    n_plus_one.query_budget = 3
+    try:
+        with caplog.at_level(logging.WARNING, logger='shop_sphere.middleware'):
+            run_view(n_plus_one, settings, QUERY_BUDGET_STRICT=False, QUERY_REPEAT_THRESHOLD=100)
+        assert caplog.records[0].getMessage() == '/x/ ran 7 queries, budget is 3'
+        with pytest.raises(QueryBudgetExceeded):
+            run_view(n_plus_one, settings, QUERY_BUDGET_STRICT=True)
+    finally:
+        del n_plus_one.query_budget
+
+
+@pytest.mark.django_db
+def test_view_budgets_hold_and_instrumentation_can_be_disabled(catalog, settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    Category.objects.create(name='C', slug='c')
+    resp = APIClient().get('/api/products/')
+    assert len(resp.data['results']) == 6 and 'desc="2 queries"' in resp['Server-Timing']
+    settings.QUERY_INSTRUMENTATION = False
+    assert 'Server-Timing' not in APIClient().get('/api/products/')
@@ -0,0 +1,63 @@
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+from django.db.models import Prefetch
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from shop import read_models
+from shop.models import Category, Product, ProductVariant
+from shop.renderers import FastJSONRenderer
+from shop.serializers import ProductSerializer
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def catalog(settings):
+    settings.CACHES = LOCMEM
+    books = Category.objects.create(name='Books', slug='books')
+    first = Product.objects.create(name='Ünïcode \u2028 book', description='long ' * 20, category=books)
+    ProductVariant.objects.create(product=first, sku='B-2', price=Decimal('1.5'), stock=0,
+                                  attributes={'size': 'L', 'tags': ['a', 'b'], 'weight': 1.25})
+    ProductVariant.objects.create(product=first, sku='B-1', price=Decimal('1234.99'), stock=3)
+    Product.objects.create(name='No variants', category=None)
+    Product.objects.create(name='Hidden', category=books, is_active=False)
+    return Product.objects.order_by('id')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fields', [None, ['id', 'name'], ['variants', 'category'], ['name', 'is_active']])
+def test_fast_path_matches_product_serializer(catalog, fields):
+    expected = ProductSerializer(
+        catalog.prefetch_related(Prefetch('variants', ProductVariant.objects.order_by('id'))),
+        many=True, fields=fields,
+    ).data
+    actual = read_models.serialize_products(list(read_models.product_values(catalog, fields)), fields)
+    assert actual == expected
+    assert [list(item) for item in actual] == [list(item) for item in expected]
+    assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+
+
+@pytest.mark.django_db
+def test_fast_path_uses_two_queries(catalog, django_assert_num_queries):
+    with django_assert_num_queries(2):
+        read_models.serialize_products(list(read_models.product_values(catalog)))
+
+
+def test_fast_renderer_matches_json_renderer():
+    data = {
+        'when': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2024, 5, 1),
+        'price': Decimal('9.99'),
+        'label': gettext_lazy('Cart empty'),
+        'text': 'naïve \u2028 line',
+        'nested': [{'a': None, 'b': True, 'c': 1.5}, (1, 2)],
+        3: 'int key',
+    }
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+    assert FastJSONRenderer().render(None) == b''
+    # floats are the same numbers, not necessarily the same digits
+    floats = [1e16, 1e-07, 0.1, 1.5]
+    assert json.loads(FastJSONRenderer().render(floats)) == json.loads(JSONRenderer().render(floats)) == floats
@@ -0,0 +1,111 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from rest_framework.test import APIClient
+from shop import replicas
+from shop.models import Category, Order, Product, ProductVariant
+
+User = get_user_model()
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+ALIAS = 'replica_test'
+
+
+@pytest.fixture
+def replica(settings, tmp_path):
+    """A second SQLite database standing in for a replica that has not caught up with the primary."""
+    settings.CACHES = LOCMEM
+    cache.clear()
+    connections.settings[ALIAS] = connections.configure_settings({
+        'default': connections.settings['default'],
+        ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(tmp_path / 'replica.sqlite3')},
+    })[ALIAS]
+    call_command('migrate', database=ALIAS, verbosity=0)
+    settings.DATABASE_REPLICAS = [ALIAS]
+    yield ALIAS
+    connections[ALIAS].close()
+    del connections[ALIAS]
+    del connections.settings[ALIAS]
+
+
+def catalog(db, name):
+    category, _ = Category.objects.db_manager(db).get_or_create(slug='c', defaults={'name': 'C'})
+    product = Product.objects.db_manager(db).create(name=name, category=category)
+    return ProductVariant.objects.db_manager(db).create(product=product, sku=f'{name}-1', price='1.00', stock=5)
+
+
+def names(client, path='/api/products/'):
+    return [p['name'] for p in client.get(path).json()['results']]
+
+
+@pytest.mark.django_db
+def test_reads_fall_back_to_primary_without_replicas(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+    catalog('default', 'primary')
+    with replicas.reads('user:1'):
+        assert Product.objects.get().name == 'primary'
+    assert names(APIClient()) == ['primary']
+
+
+@pytest.mark.django_db
+def test_catalog_reads_go_to_replica_until_a_write_pins_the_caller(
+    replica, django_assert_num_queries, django_capture_on_commit_callbacks,
+):
+    variant = catalog('default', 'primary')
+    cache.clear()  # drop the catalog pin left by creating it
+    catalog(replica, 'replica')
+    cache.clear()
+    client = APIClient()
+    with django_assert_num_queries(0):  # two queries, both on the replica
+        assert names(client) == ['replica']
+
+    # adding to the cart pins the anonymous cart owner to the primary
+    assert client.post('/api/cart/add/', {'variant_id': variant.pk, 'quantity': 1}, format='json').status_code == 200
+    assert names(client, '/api/products/?in_stock=true') == ['primary']
+    assert names(APIClient(), '/api/products/?page_size=3') == ['replica']
+
+    # a catalog write pins every catalog rebuild
+    with django_capture_on_commit_callbacks(execute=True):
+        catalog('default', 'another')
+    assert names(APIClient(), '/api/products/?page_size=5') == ['primary', 'another']
+    cache.clear()
+    assert names(APIClient(), '/api/products/?page_size=5') == ['replica']
+
+
+@pytest.mark.django_db
+def test_order_history_and_graphql_queries_read_your_writes(replica):
+    variant = catalog('default', 'primary')
+    User.objects.create_user('reader', password='pw')
+    client = APIClient()
+    access = client.post('/api/auth/login/', {'username': 'reader', 'password': 'pw'}).data['access']
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    cache.clear()
+    assert client.get('/api/orders/').json()['results'] == []
+    assert client.post('/graphql/', {'query': '{ products { name } }'}, format='json').json() == {
+        'data': {'products': []},
+    }
+
+    client.post('/api/cart/add/', {'variant_id': variant.pk, 'quantity': 2}, format='json')
+    assert client.post('/api/checkout/', {'address': 'Addr'}, format='json').status_code == 200
+    assert [o['item_count'] for o in client.get('/api/orders/').json()['results']] == [2]
+    assert client.post('/graphql/', {'query': '{ orders { total } }'}, format='json').json() == {
+        'data': {'orders': [{'total': '2.00'}]},
+    }
+    assert Order.objects.using(replica).count() == 0  # writes never go to the replica
+
+
+def test_unreachable_pin_cache_keeps_reads_on_primary(settings, monkeypatch):
+    settings.DATABASE_REPLICAS = [ALIAS]
+
+    def down(keys):
+        raise ConnectionError('cache down')
+    monkeypatch.setattr(replicas.cache, 'get_many', down)
+    with replicas.reads('user:1'):
+        assert replicas.ReplicaRouter().db_for_read(Product) == 'default'
+        with replicas.reads():
+            assert replicas.ReplicaRouter().db_for_read(Product) == 'default'
+    with replicas.reads():
+        assert replicas.ReplicaRouter().db_for_read(Product) == ALIAS
+    assert replicas.ReplicaRouter().db_for_read(Product) is None
@@ -1,14 +1,18 @@
 import pytest
+from django.core.cache import cache
+from django.db import transaction
 from django.test import override_settings
+from shop import catalog_cache
 from shop.repositories import ProductRepository
 from shop.models import Category, Product, ProductVariant
 
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
 
 @pytest.mark.django_db
-@override_settings(CACHES={
-    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
-})
-def test_product_repository_caching():
+@override_settings(CACHES=LOCMEM)
+def test_product_repository_caching(django_capture_on_commit_callbacks):
+    cache.clear()
     cat = Category.objects.create(name='T1', slug='t1')
     p1 = Product.objects.create(name='P1', description='', category=cat, is_active=True)
     Product.objects.create(name='P2', description='', category=cat, is_active=True)
@@ -16,7 +20,48 @@ def test_product_repository_caching():
     repo = ProductRepository()
     first = repo.list_active()
     assert len(first) >= 2
-    # create another product and ensure cached result still returns old list
-    Product.objects.create(name='P3', description='', category=cat, is_active=True)
+    assert isinstance(first[0], dict)
+    p1_row = next(p for p in first if p['name'] == 'P1')
+    assert p1_row['variants'][0]['sku'] == 'P1-1'
+    # saving a product bumps the catalog generation, so the next read rebuilds
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.create(name='P3', description='', category=cat, is_active=True)
     second = repo.list_active()
-    assert any(p.name == 'P1' for p in second)
+    assert any(p['name'] == 'P1' for p in second)
+    assert any(p['name'] == 'P3' for p in second)
+
+
+@pytest.mark.django_db
+@override_settings(CACHES=LOCMEM)
+def test_variant_and_category_writes_bump_generation(django_capture_on_commit_callbacks):
+    cache.clear()
+    start = catalog_cache.get_generation()
+    with django_capture_on_commit_callbacks(execute=True), transaction.atomic():
+        cat = Category.objects.create(name='T2', slug='t2')
+        p = Product.objects.create(name='P', description='', category=cat)
+        v = ProductVariant.objects.create(product=p, sku='P-9', price='1.00', stock=1)
+        v.delete()
+        # a rebuild during the transaction still sees the old generation
+        assert catalog_cache.get_generation() == start
+    assert catalog_cache.get_generation() == start + 4
+
+
+@override_settings(CACHES=LOCMEM)
+def test_cached_serves_stale_while_another_worker_rebuilds():
+    cache.clear()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return ['v%d' % len(calls)]
+
+    assert catalog_cache.cached('t', build) == ['v1']
+    catalog_cache.bump_generation()
+    # another worker holds the rebuild lock: we get the stale value, not a second build
+    cache.add('catalog:t:lock', 1, 30)
+    assert catalog_cache.cached('t', build) == ['v1']
+    assert len(calls) == 1
+    cache.delete('catalog:t:lock')
+    assert catalog_cache.cached('t', build) == ['v2']
+    assert catalog_cache.cached('t', build) == ['v2']
+    assert len(calls) == 2
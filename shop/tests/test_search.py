@@ -0,0 +1,91 @@
+import pytest
+from rest_framework.test import APIClient
+from shop import search
+from shop.models import Category, Product, ProductVariant
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    # the local index is per-process; force a rebuild against this test's data
+    search._index.generation = None
+
+
+@pytest.fixture
+def catalog():
+    shoes = Category.objects.create(name='Shoes', slug='shoes')
+    shirts = Category.objects.create(name='Shirts', slug='shirts')
+    runner = Product.objects.create(name='Trail Runner', description='Light running shoe', category=shoes)
+    ProductVariant.objects.create(product=runner, sku='TR-R', price='80.00', attributes={'color': 'red', 'size': 42})
+    ProductVariant.objects.create(product=runner, sku='TR-B', price='80.00', attributes={'color': 'blue', 'size': 43})
+    road = Product.objects.create(name='Road Runner', description='Running shoe for asphalt', category=shoes)
+    ProductVariant.objects.create(product=road, sku='RR-B', price='90.00', attributes={'color': 'blue'})
+    tee = Product.objects.create(name='Running Tee', description='Breathable', category=shirts)
+    ProductVariant.objects.create(product=tee, sku='RT-R', price='20.00', attributes={'color': 'red'})
+    Product.objects.create(name='Old Runner', description='running', category=shoes, is_active=False)
+    return runner, road, tee
+
+
+def test_inverted_index_and_semantics():
+    index = search.InvertedIndex()
+    index.add(1, 'red trail runner', 'shoes', frozenset({('color', 'red')}))
+    index.add(2, 'blue road runner runner', 'shoes', frozenset({('color', 'blue')}))
+    assert index.search('runner')['ids'] == [2, 1]
+    assert index.search('red runner')['ids'] == [1]
+    assert index.search('runner', attributes=[('color', 'blue')])['ids'] == [2]
+    index.remove(2)
+    assert index.search('road')['count'] == 0
+
+
+@pytest.mark.django_db
+def test_search_facets_and_filters(catalog):
+    runner, road, tee = catalog
+    result = search.search('running')
+    assert set(result['ids']) == {runner.id, road.id, tee.id}
+    assert result['facets']['category'] == {'shoes': 2, 'shirts': 1}
+    assert result['facets']['attributes']['color'] == {'red': 2, 'blue': 2}
+    assert search.search('running', category='shoes', attributes=[('color', 'red')])['ids'] == [runner.id]
+    # category name and attribute values are searchable too
+    assert search.search('shirts blue')['count'] == 0
+    assert search.search('shirts red')['ids'] == [tee.id]
+
+
+@pytest.mark.django_db
+def test_non_string_attribute_filters(catalog):
+    runner, road, tee = catalog
+    ProductVariant.objects.create(product=road, sku='RR-W', price='90.00', attributes={'waterproof': True})
+    result = search.search('running')
+    assert result['facets']['attributes']['size'] == {'42': 1, '43': 1}
+    assert search.search('running', attributes=[('size', '42')])['ids'] == [runner.id]
+    assert search.search('running', attributes=[('waterproof', 'True')])['ids'] == [road.id]
+    # facet values are str(v); the Postgres filter matches the stored JSON scalar too
+    assert search.facet_values('42') == ['42', 42]
+    assert search.facet_values('True') == ['True', True]
+    assert search.facet_values('red') == ['red']
+
+
+@pytest.mark.django_db
+def test_index_follows_model_signals(catalog):
+    runner, road, tee = catalog
+    search.search('running')
+    ProductVariant.objects.create(product=tee, sku='RT-G', price='20.00', attributes={'color': 'green'})
+    assert search.search('green')['ids'] == [tee.id]
+    road.is_active = False
+    road.save()
+    assert road.id not in search.search('runner')['ids']
+    Category.objects.filter(slug='shirts').update(name='Tops')
+    cat = Category.objects.get(slug='shirts')
+    cat.save()
+    assert search.search('tops')['ids'] == [tee.id]
+    runner.refresh_from_db()
+    assert 'Shoes' in runner.search_document
+
+
+@pytest.mark.django_db
+def test_search_endpoint(catalog):
+    runner = catalog[0]
+    resp = APIClient().get('/api/products/search/', {'q': 'trail', 'attr': ['color:red']})
+    assert resp.status_code == 200
+    assert resp.data['count'] == 1
+    assert resp.data['results'][0]['id'] == runner.id
+    assert resp.data['facets']['category'] == {'shoes': 1}
+    assert APIClient().get('/api/products/search/', {'q': 'x', 'attr': 'bad'}).status_code == 400
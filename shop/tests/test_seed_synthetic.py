@@ -0,0 +1,26 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from shop.models import Cart, Order, Product, ProductVariant
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def seed(**options):
+    call_command('seed_synthetic', products=20, variants=2, users=5, carts=3, orders=12, batch_size=5, **options)
+
+
+@pytest.mark.django_db
+def test_seed_is_reproducible_and_idempotent(settings):
+    settings.CACHES = LOCMEM
+    seed()
+    assert Product.objects.count() == 20 and ProductVariant.objects.count() == 40
+    assert get_user_model().objects.filter(username__startswith='synthetic-').count() == 5
+    assert Cart.objects.count() == 3 and Order.objects.count() == 12
+    assert not Cart.objects.filter(items__variant__stock__lt=10).exists()
+    order = Order.objects.order_by('id').first()
+    assert order.item_count == sum(i.quantity for i in order.items.all())
+    snapshot = list(ProductVariant.objects.order_by('sku').values_list('sku', 'price', 'stock'))
+    seed()
+    assert Product.objects.count() == 20 and Cart.objects.count() == 3 and Order.objects.count() == 12
+    assert list(ProductVariant.objects.order_by('sku').values_list('sku', 'price', 'stock')) == snapshot
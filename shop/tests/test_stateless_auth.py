@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from accounts.authentication import ClaimsUser, users
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from shop.models import Category, Order, Product, ProductVariant
+
+User = get_user_model()
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def seller(settings):
+    settings.CACHES = LOCMEM
+    cache.clear()
+    user = User.objects.create_user('seller', password='pw', role='seller', email='s@example.com')
+    tokens = APIClient().post('/api/auth/login/', {'username': 'seller', 'password': 'pw'}).data
+    return user, tokens
+
+
+def backdated(raw, token_class, seconds=10):
+    # revoke_user rejects tokens issued before the current second
+    token = token_class(raw)
+    token['iat'] -= seconds
+    return str(token)
+
+
+def bearer(access):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    return client
+
+
+def user_queries(queries):
+    return [q['sql'] for q in queries if User._meta.db_table in q['sql']]
+
+
+@pytest.mark.django_db
+def test_claims_user_without_user_query(seller):
+    user, tokens = seller
+    claims = AccessToken(tokens['access'])
+    assert (claims['username'], claims['role'], claims['is_staff']) == ('seller', 'seller', False)
+    product = Product.objects.create(name='P', category=Category.objects.create(name='C', slug='c'))
+    variant = ProductVariant.objects.create(product=product, sku='P-1', price='4.00', stock=5)
+    client = bearer(tokens['access'])
+    with CaptureQueriesContext(connection) as ctx:
+        client.post('/api/cart/add/', {'variant_id': variant.pk, 'quantity': 2}, format='json')
+        assert client.get('/api/cart/').data['item_count'] == 2
+        assert client.post('/api/checkout/', {'address': 'Addr'}, format='json').status_code == 200
+        assert client.get('/api/orders/').data['results'][0]['total'] == '8.00'
+    assert user_queries(ctx.captured_queries) == []
+    assert Order.objects.get().user_id == user.pk
+
+    request_user = ClaimsUser(claims)
+    assert request_user.role == 'seller' and request_user.is_authenticated
+    users.discard(user.pk)
+    assert request_user.email == 's@example.com'  # loaded once, then served from the process cache
+    with CaptureQueriesContext(connection) as ctx:
+        assert request_user.date_joined == user.date_joined
+    assert ctx.captured_queries == []
+
+
+@pytest.mark.django_db
+def test_logout_revokes_access_and_refresh_tokens(seller):
+    _, tokens = seller
+    client = bearer(tokens['access'])
+    assert client.post('/api/auth/logout/', {'refresh': tokens['refresh']}, format='json').status_code == 204
+    response = client.get('/api/orders/')
+    assert response.status_code == 401 and response.data['code'] == 'token_revoked'
+    assert APIClient().post('/api/auth/refresh/', {'refresh': tokens['refresh']}).status_code == 401
+
+
+@pytest.mark.django_db
+def test_credential_changes_revoke_earlier_tokens(seller, django_capture_on_commit_callbacks):
+    user, tokens = seller
+    access = backdated(tokens['access'], AccessToken)
+    refresh = backdated(tokens['refresh'], RefreshToken)
+
+    user.last_login = user.date_joined
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        user.save(update_fields=['last_login'])
+        user.email = 'new@example.com'
+        user.save()
+    assert callbacks == [] and bearer(access).get('/api/orders/').status_code == 200
+
+    user.role = 'customer'
+    with django_capture_on_commit_callbacks(execute=True):
+        user.save()
+    assert bearer(access).get('/api/orders/').status_code == 401
+    assert APIClient().post('/api/auth/refresh/', {'refresh': refresh}).status_code == 401
+
+    fresh = APIClient().post('/api/auth/login/', {'username': 'seller', 'password': 'pw'}).data['access']
+    assert AccessToken(fresh)['role'] == 'customer'
+    assert bearer(fresh).get('/api/orders/').status_code == 200
+    assert bearer(fresh).get('/graphql/', {'query': '{ orders { id } }'}).status_code == 200
+
+
+@pytest.mark.django_db
+def test_async_views_honour_revocation(seller):
+    _, tokens = seller
+    bearer(tokens['access']).post('/api/auth/logout/')
+
+    async def request():
+        return await AsyncClient().get('/api/async/cart/', headers={'Authorization': f'Bearer {tokens["access"]}'})
+    response = async_to_sync(request)()
+    assert response.status_code == 401 and json.loads(response.content)['code'] == 'token_revoked'
@@ -40,3 +40,40 @@ def test_deliver_webhook_max_retries_exceeded(monkeypatch):
         assert result is False
         ev.refresh_from_db()
         assert ev.delivered is False
+
+
+@pytest.mark.django_db
+def test_shed_delivery_is_rescheduled_without_an_attempt_or_retry(settings):
+    from shop import tasks
+    settings.WEBHOOK_DELIVERY_URL = 'http://example.local/hook'
+    ev = WebhookEvent.objects.create(event='e3', payload={'a': 3})
+
+    with patch('shop.circuit.DestinationGuard.admit', return_value=False), \
+            patch.object(tasks.deliver_webhook, 'apply_async') as apply_async, \
+            patch('shop.tasks_helpers.post_event') as deliver:
+        assert tasks.deliver_webhook(ev.id) is None
+    deliver.assert_not_called()
+    apply_async.assert_called_once_with((ev.id,), countdown=settings.WEBHOOK_SHED_DELAY, retries=0)
+    ev.refresh_from_db()
+    assert (ev.attempts, ev.last_attempt) == (0, None)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('outcome, observed', [(503, 503), (429, 429), (ConnectionError, None)])
+def test_failed_delivery_reports_the_real_status_to_the_guard(settings, outcome, observed):
+    import requests as _r
+    from shop import tasks
+    settings.WEBHOOK_DELIVERY_URL = 'http://example.local/hook'
+    ev = WebhookEvent.objects.create(event='e4', payload={'a': 4})
+    if outcome is ConnectionError:
+        outcome = _r.ConnectionError('refused')
+
+    with patch('shop.circuit.DestinationGuard.admit', return_value=True), \
+            patch('shop.circuit.DestinationGuard.observe') as observe, \
+            patch.object(tasks.deliver_webhook, 'retry', return_value=RuntimeError('retry')), \
+            patch('shop.tasks_helpers.post_event', side_effect=[outcome]):
+        with pytest.raises(RuntimeError):
+            tasks.deliver_webhook(ev.id)
+    observe.assert_called_once_with(observed)
+    ev.refresh_from_db()
+    assert (ev.attempts, ev.delivered) == (1, False)
@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+import json
+
+import pytest
+from django.core.cache import cache
+from django.db import DataError
+from django.db.models import QuerySet
+from rest_framework.test import APIClient
+from shop import webhook_ingest
+from shop.models import WebhookEvent
+from shop.webhook_ingest import IngestBuffer
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def signed(settings):
+    settings.CACHES = LOCMEM
+    settings.WEBHOOK_SECRET = 'supersecret'
+    cache.clear()
+    client = APIClient()
+
+    def post(payload, **headers):
+        raw = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        sig = hmac.new(b'supersecret', raw, hashlib.sha256).hexdigest()
+        return client.post('/api/webhook/', raw, content_type='application/json', HTTP_X_SIGNATURE=sig, **headers)
+    return post
+
+
+@pytest.fixture
+def buffer(redis_client, settings, monkeypatch):
+    settings.WEBHOOK_INGEST_MODE = 'buffered'
+    buf = IngestBuffer(client=redis_client, batch_size=3)
+    buf.key = 'test:webhook:ingest'
+    buf.dead_key = 'test:webhook:ingest:dead'
+    buf.lock_key = 'test:webhook:ingest:lock'
+    monkeypatch.setattr(webhook_ingest, '_buffer', buf)
+    return buf
+
+
+@pytest.mark.django_db
+def test_direct_ingest_single_insert_and_idempotency(signed, django_assert_num_queries):
+    with django_assert_num_queries(1):
+        resp = signed({'event': 'payment.succeeded', 'id': 1}, HTTP_IDEMPOTENCY_KEY='evt_1')
+    assert resp.status_code == 200
+    assert signed({'event': 'payment.succeeded', 'id': 1}, HTTP_IDEMPOTENCY_KEY='evt_1').data == {'status': 'duplicate'}
+    ev = WebhookEvent.objects.get()
+    assert (ev.event, ev.payload, ev.attempts) == ('payment.succeeded', {'event': 'payment.succeeded', 'id': 1}, 0)
+
+
+@pytest.mark.django_db
+def test_direct_ingest_rejects_invalid_json_and_frees_key(signed):
+    assert signed(b'{nope', HTTP_IDEMPOTENCY_KEY='evt_2').status_code == 400
+    assert signed({'event': 'x'}, HTTP_IDEMPOTENCY_KEY='evt_2').status_code == 200
+
+
+@pytest.mark.django_db
+def test_buffered_ingest_acknowledges_and_bulk_inserts(signed, buffer, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        resp = signed({'event': 'a'})
+    assert resp.status_code == 202
+    signed(b'not json')
+    assert WebhookEvent.objects.count() == 0
+    signed({'event': 'c'})  # third body reaches the batch size and flushes inline
+    assert sorted(WebhookEvent.objects.values_list('event', flat=True)) == ['a', 'c', 'unparseable']
+    signed({'event': 'd'})
+    assert buffer.flush() == 1
+    assert buffer.client.llen(buffer.key) == 0
+
+
+@pytest.mark.django_db
+def test_rejected_bodies_are_dead_lettered(buffer, monkeypatch):
+    def reject(event):
+        if event.event == 'bad':
+            raise DataError('unsupported Unicode escape sequence')
+
+    bulk_create, save = QuerySet.bulk_create, WebhookEvent.save
+
+    def checked_bulk_create(qs, objs, **kwargs):
+        for obj in objs:
+            reject(obj)
+        return bulk_create(qs, objs, **kwargs)
+
+    def checked_save(self, *args, **kwargs):
+        reject(self)
+        return save(self, *args, **kwargs)
+    monkeypatch.setattr(QuerySet, 'bulk_create', checked_bulk_create)
+    monkeypatch.setattr(WebhookEvent, 'save', checked_save)
+    for name in ('a', 'bad'):
+        buffer.push(json.dumps({'event': name}))
+    assert buffer.flush() == 1
+    buffer.push(json.dumps({'event': 'c'}))
+    assert buffer.flush() == 1
+    assert sorted(WebhookEvent.objects.values_list('event', flat=True)) == ['a', 'c']
+    assert buffer.client.llen(buffer.key) == 0
+    assert [json.loads(b)['event'] for b in buffer.client.lrange(buffer.dead_key, 0, -1)] == ['bad']
+
+
+@pytest.mark.django_db
+def test_flush_skipped_when_lock_unavailable(buffer, monkeypatch):
+    buffer.push(json.dumps({'event': 'a'}))
+    buffer.client.set(buffer.lock_key, 'other')
+    assert buffer.flush() == 0
+    assert buffer.client.get(buffer.lock_key) == b'other'  # never released by a non-holder
+
+    def down(*args, **kwargs):
+        raise ConnectionError('redis down')
+    monkeypatch.setattr(buffer.client, 'set', down)
+    assert buffer.flush() == 0 and WebhookEvent.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_flush_that_lost_its_lock_does_not_trim(buffer, monkeypatch):
+    for name in ('a', 'b', 'c', 'd'):
+        buffer.push(json.dumps({'event': name}))
+    write = buffer._write
+
+    def slow_write(bodies):
+        # the lock expires mid-batch and another flusher takes it
+        buffer.client.set(buffer.lock_key, 'other')
+        return write(bodies)
+    monkeypatch.setattr(buffer, '_write', slow_write)
+    assert buffer.flush() == 3
+    assert buffer.client.llen(buffer.key) == 4
+    assert buffer.client.get(buffer.lock_key) == b'other'
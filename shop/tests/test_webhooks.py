@@ -0,0 +1,161 @@
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.utils import timezone
+from shop import webhooks
+from shop.models import WebhookEvent
+from shop.webhooks import WebhookEngine
+
+
+class Stub:
+    """Local HTTP endpoint recording bodies and peak concurrency."""
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.bodies = []
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                with stub.lock:
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                    stub.bodies.append(json.loads(body))
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.active -= 1
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/hook'
+
+
+@pytest.fixture
+def stub(request):
+    server = Stub(**getattr(request, 'param', {}))
+    yield server
+    server.server.shutdown()
+
+
+@pytest.fixture
+def engine():
+    eng = WebhookEngine(workers=8, per_destination=2, timeout=2)
+    yield eng
+    eng.close()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('stub', [{'delay': 0.02}], indirect=True)
+def test_drain_delivers_batches_with_per_destination_cap(stub, engine, settings, django_assert_max_num_queries):
+    settings.WEBHOOK_DELIVERY_URL = stub.url
+    WebhookEvent.objects.bulk_create([WebhookEvent(event='e', payload={'n': i}) for i in range(10)])
+    # claim + one bulk_update per batch, plus the empty claim that ends the drain
+    with django_assert_max_num_queries(10):
+        assert engine.drain(batch_size=10) == (10, 0)
+    assert sorted(b['n'] for b in stub.bodies) == list(range(10))
+    assert stub.peak <= 2
+    assert set(WebhookEvent.objects.values_list('delivered', 'attempts')) == {(True, 1)}
+
+
+@pytest.mark.django_db
+def test_slow_destination_holds_at_most_its_cap_of_the_pool(engine, monkeypatch):
+    slow, fast = Stub(delay=0.05), Stub()
+    monkeypatch.setattr(webhooks, 'destinations', lambda e: [slow.url if e.payload['n'] % 2 else fast.url])
+    pending, peak, lock = Counter(), Counter(), threading.Lock()
+    submit = engine.pool.submit
+
+    def counting_submit(fn, url, body):
+        # queued or running posts per destination, dropped once the post returns
+        def run():
+            try:
+                return fn(url, body)
+            finally:
+                with lock:
+                    pending[url] -= 1
+        with lock:
+            pending[url] += 1
+            peak[url] = max(peak[url], pending[url])
+        return submit(run)
+
+    monkeypatch.setattr(engine.pool, 'submit', counting_submit)
+    events = WebhookEvent.objects.bulk_create([WebhookEvent(event='e', payload={'n': i}) for i in range(12)])
+    try:
+        assert set(engine.send(events).values()) == {True}
+    finally:
+        slow.server.shutdown()
+        fast.server.shutdown()
+    assert peak == {slow.url: 2, fast.url: 2}
+    assert len(slow.bodies) == len(fast.bodies) == 6
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('stub', [{'status': 500}], indirect=True)
+def test_failed_events_back_off_and_dead_letter(stub, engine, settings):
+    settings.WEBHOOK_DELIVERY_URL = stub.url
+    settings.WEBHOOK_MAX_ATTEMPTS = 2
+    ev = WebhookEvent.objects.create(event='e', payload={})
+    assert engine.drain() == (0, 1)
+    assert engine.drain() == (0, 0)  # rescheduled WEBHOOK_RETRY_BASE seconds out
+    ev.refresh_from_db()
+    assert ev.next_attempt_at > timezone.now()
+    WebhookEvent.objects.update(next_attempt_at=timezone.now())
+    assert engine.drain() == (0, 1)
+    ev.refresh_from_db()
+    assert (ev.delivered, ev.attempts, ev.dead_lettered) == (False, 2, True)
+    WebhookEvent.objects.update(next_attempt_at=timezone.now())
+    assert engine.drain() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_claim_leases_events_so_other_dispatchers_skip_them(engine, settings):
+    settings.WEBHOOK_LEASE_SECONDS = 30
+    WebhookEvent.objects.bulk_create([WebhookEvent(event='e', payload={'n': i}) for i in range(5)])
+    first = engine.claim(3)
+    second = engine.claim(10)
+    assert len(first) == 3 and len(second) == 2
+    assert not {e.pk for e in first} & {e.pk for e in second}
+    assert engine.claim(10) == []
+
+
+@pytest.mark.django_db
+def test_lease_outlasts_the_worst_case_send(engine, settings):
+    settings.WEBHOOK_DELIVERY_URL = 'http://127.0.0.1:9/hook'
+    settings.WEBHOOK_LEASE_SECONDS = 1
+    WebhookEvent.objects.bulk_create([WebhookEvent(event='e', payload={'n': i}) for i in range(5)])
+    before = timezone.now()
+    engine.claim(5)
+    # 5 posts, 2 at a time, 2 s timeout: 3 rounds plus one timeout of slack
+    leased = {(e.next_attempt_at - before).total_seconds() for e in WebhookEvent.objects.all()}
+    assert len(leased) == 1 and 8 <= leased.pop() < 9
+    settings.WEBHOOK_LEASE_SECONDS = 60
+    assert engine.lease_seconds(WebhookEvent.objects.all()) == 60
+
+
+@pytest.mark.django_db
+def test_claim_uses_skip_locked(engine):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    WebhookEvent.objects.create(event='e', payload={})
+    with CaptureQueriesContext(connection) as ctx:
+        engine.claim(10)
+    select = next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT'))
+    if connection.features.has_select_for_update_skip_locked:
+        assert 'SKIP LOCKED' in select
+    assert 'next_attempt_at' in select
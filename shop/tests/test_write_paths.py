@@ -0,0 +1,99 @@
+"""Exact SQL for the hot write paths: one targeted UPDATE each, never a full-row save."""
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from shop import carts
+from shop.models import Cart, CartItem, Category, Product, ProductVariant, WebhookEvent
+
+User = get_user_model()
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != 'sqlite', reason='SQL text is asserted for SQLite'),
+]
+
+
+def writes(fn, *args):
+    with CaptureQueriesContext(connection) as ctx:
+        fn(*args)
+    return [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+
+@pytest.fixture
+def cart(settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    category = Category.objects.create(name='C', slug='c')
+    product = Product.objects.create(name='P', category=category)
+    variant = ProductVariant.objects.create(product=product, sku='P-1', price=Decimal('5.00'), stock=10)
+    cart = Cart.objects.create(user=User.objects.create_user('w', password='pw'))
+    carts.add_item(cart, variant, 2)
+    return cart, variant
+
+
+def test_mark_attempt_increments_without_rewriting_payload():
+    ev = WebhookEvent.objects.create(event='e', payload={'big': 'x' * 1000})
+    [sql] = writes(ev.mark_attempt)
+    assert sql.startswith('UPDATE "shop_webhookevent" SET "attempts" = ("shop_webhookevent"."attempts" + 1), "last_attempt" = ')
+    assert sql.endswith(f'WHERE "shop_webhookevent"."id" = {ev.pk}')
+    assert 'payload' not in sql
+    ev.mark_attempt()
+    ev.refresh_from_db()
+    assert ev.attempts == 2
+
+
+def test_mark_delivered_sets_one_column():
+    ev = WebhookEvent.objects.create(event='e', payload={})
+    assert writes(ev.mark_delivered) == [
+        f'UPDATE "shop_webhookevent" SET "delivered" = 1 WHERE "shop_webhookevent"."id" = {ev.pk}',
+    ]
+
+
+def test_add_existing_line_increments_quantity(cart):
+    cart, variant = cart
+    update_line, update_cart = writes(carts.add_item, cart, variant, 3)
+    assert update_line.startswith('UPDATE "shop_cartitem" SET "quantity" = ("shop_cartitem"."quantity" + 3) WHERE')
+    assert update_cart.startswith('UPDATE "shop_cart" SET "item_count" = ("shop_cart"."item_count" + 3), "subtotal" = ')
+    assert list(cart.items.values_list('quantity', flat=True)) == [5]
+
+
+def test_set_quantity_and_remove_touch_only_the_line_and_totals(cart):
+    cart, _ = cart
+    item = cart.items.select_related('variant').get()
+    update_line, update_cart = writes(carts.set_quantity, cart, item, 4)
+    assert update_line == (
+        f'UPDATE "shop_cartitem" SET "quantity" = 4 WHERE ("shop_cartitem"."id" = {item.pk} AND "shop_cartitem"."quantity" = 2)'
+    )
+    assert update_cart.startswith('UPDATE "shop_cart" SET "item_count" = ("shop_cart"."item_count" + 2)')
+    delete_line, update_cart = writes(carts.remove_item, cart, item)
+    assert delete_line == (
+        f'DELETE FROM "shop_cartitem" WHERE ("shop_cartitem"."id" = {item.pk} AND "shop_cartitem"."quantity" = 4)'
+    )
+    assert update_cart.startswith('UPDATE "shop_cart" SET "item_count" = ("shop_cart"."item_count" + -4)')
+    cart.refresh_from_db()
+    assert (cart.item_count, cart.subtotal) == (0, Decimal('0'))
+
+
+def test_stale_lines_shift_totals_by_what_the_row_held(cart):
+    cart, _ = cart
+    stale = cart.items.select_related('variant').get()
+    other = cart.items.select_related('variant').get()
+    assert carts.set_quantity(cart, other, 5)
+    assert carts.set_quantity(cart, stale, 3) and stale.quantity == 3
+    cart.refresh_from_db()
+    assert (cart.item_count, cart.subtotal) == (3, Decimal('15.00'))
+
+    stale.quantity = 1
+    assert carts.remove_item(cart, stale)
+    assert not carts.remove_item(cart, stale) and not carts.set_quantity(cart, other, 2)
+    cart.refresh_from_db()
+    assert (cart.item_count, cart.subtotal) == (0, Decimal('0'))
+
+
+def test_cart_lines_are_unique_per_variant(cart):
+    from django.db import IntegrityError, transaction
+    cart, variant = cart
+    with pytest.raises(IntegrityError), transaction.atomic():
+        CartItem.objects.create(cart=cart, variant=variant, quantity=1)
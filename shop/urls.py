@@ -1,15 +1,23 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 urlpatterns = [
     path('products/', views.ProductList.as_view(), name='product-list'),
+    path('products/search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('products/export/', views.CatalogExportView.as_view(), name='product-export'),
     path('auth/register/', views.RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     path('cart/add/', views.CartAddView.as_view(), name='cart-add'),
     path('cart/', views.CartView.as_view(), name='cart'),
     path('cart/item/<int:pk>/', views.CartItemDetail.as_view(), name='cart-item-detail'),
     path('checkout/', views.CheckoutView.as_view(), name='checkout'),
+    path('orders/', views.OrderHistoryView.as_view(), name='order-history'),
     path('webhook/', views.WebhookReceiver.as_view(), name='webhook-receiver'),
+    # async twins of the read-heavy views for ASGI deployments (shop.async_views)
+    path('async/products/', async_views.AsyncProductList.as_view(), name='async-product-list'),
+    path('async/cart/', async_views.AsyncCartView.as_view(), name='async-cart'),
+    path('async/webhook/', async_views.AsyncWebhookReceiver.as_view(), name='async-webhook-receiver'),
 ]
@@ -2,26 +2,152 @@ from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.negotiation import BaseContentNegotiation
 from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem, ProductVariant, Order, OrderItem, Payment, WebhookEvent
-from .serializers import ProductSerializer, RegisterSerializer, CartAddSerializer, CheckoutSerializer
-import hmac
+from .models import ProductVariant
+from . import cart_store
+from .serializers import (
+    ProductSerializer, ProductFilterSerializer, ProductSearchSerializer,
+    RegisterSerializer, CartAddSerializer, CheckoutSerializer, CatalogExportSerializer, OrderSerializer,
+)
+from .pagination import OrderCursorPagination, ProductCursorPagination
+from . import catalog_cache, conditional, read_models, replicas
 import hashlib
-from django.conf import settings
-from .tasks import deliver_webhook
+from urllib.parse import urlencode
+from .checkout import CheckoutInProgress, EmptyCart, InsufficientStock, UnknownVariants
+from accounts.authentication import revoke_token
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def page_cache_key(request):
+    # pages hold absolute next/previous links, so host and path are part of the key
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    return 'products:page:' + hashlib.md5(f'{request.get_host()}{request.path}?{params}'.encode()).hexdigest()
 
 
 class ProductList(generics.ListAPIView):
+    """Keyset-paginated catalog with category/price/stock filters and ``fields=``.
+
+    Each page is cached per catalog generation and query string. Its ETag is
+    the cached page's version, so a matching ``If-None-Match`` is answered
+    with a 304 from one cache round trip. Anonymous responses may be kept
+    by shared caches (nginx) for ``CATALOG_SHARED_MAX_AGE`` seconds.
+    """
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    query_budget = 2  # page of products, their variants (see shop_sphere.middleware)
+
+    def get_filters(self):
+        if not hasattr(self, '_filters'):
+            ser = ProductFilterSerializer(data=self.request.query_params)
+            ser.is_valid(raise_exception=True)
+            self._filters = dict(ser.validated_data)
+        return self._filters
 
     def get_queryset(self):
         from .repositories import ProductRepository
-        repo = ProductRepository()
-        return repo.list_active()
+        filters = dict(self.get_filters())
+        filters.pop('fields', None)
+        return ProductRepository().filter_active(**filters)
+
+    def list(self, request, *args, **kwargs):
+        self.get_filters()
+        key = page_cache_key(request)
+        version = catalog_cache.fresh_version(key)
+        if version is not None:
+            response = conditional.not_modified(request, *self.validators(version))
+            if response is not None:
+                return self.stamp(response, version)
+        with replicas.reads(replicas.pin_key(request, request.user.pk), replicas.CATALOG):
+            version, data = catalog_cache.cached_with_version(key, self.build_page)
+        response = Response(data)
+        return response if version is None else self.stamp(response, version)
+
+    def validators(self, version):
+        generation, fresh_until = version
+        etag = conditional.strong_etag(generation, int(fresh_until * 1000), self.request.accepted_renderer.format)
+        return etag, fresh_until - catalog_cache.CACHE_TTL
+
+    def stamp(self, response, version):
+        if 'HTTP_AUTHORIZATION' in self.request.META:
+            cache_control = {'private': True, 'no_cache': True}
+        else:
+            cache_control = {'public': True, 'max_age': 0, 's_maxage': settings.CATALOG_SHARED_MAX_AGE}
+        return conditional.set_validators(
+            response, *self.validators(version), vary=('Accept', 'Authorization'), **cache_control,
+        )
+
+    def build_page(self):
+        # .values() rows straight into dicts; see shop.read_models
+        fields = self.get_filters().get('fields')
+        page = self.paginate_queryset(read_models.product_values(self.get_queryset(), fields))
+        return self.get_paginated_response(read_models.serialize_products(page, fields)).data
+
+
+class ProductSearchView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        from . import search
+        from .models import Product
+        ser = ProductSearchSerializer(data=request.query_params)
+        ser.is_valid(raise_exception=True)
+        params = ser.validated_data
+        result = search.search(
+            params['q'], category=params.get('category'), attributes=params['attr'],
+            limit=params['limit'], offset=params['offset'],
+        )
+        rows = {r['id']: r for r in read_models.product_values(Product.objects.filter(pk__in=result['ids']))}
+        return Response({
+            'count': result['count'],
+            'results': read_models.serialize_products([rows[pk] for pk in result['ids'] if pk in rows]),
+            'facets': result['facets'],
+        })
+
+
+class FirstRendererNegotiation(BaseContentNegotiation):
+    # the export picks its own format from ?format=, which DRF would otherwise treat as a renderer name
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class CatalogExportView(APIView):
+    """Streams the catalog as NDJSON (default) or CSV; ``since=`` limits it to recent changes.
+
+    Gzipped when the client accepts it. See ``shop.exports``.
+    """
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = FirstRendererNegotiation
+
+    def get(self, request):
+        from . import exports
+        ser = CatalogExportSerializer(data=request.query_params)
+        ser.is_valid(raise_exception=True)
+        fmt = ser.validated_data['format']
+        chunks = exports.export(fmt, since=ser.validated_data.get('since'))
+        gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(
+            compress_sequence(chunks) if gzipped else chunks, content_type=exports.CONTENT_TYPES[fmt],
+        )
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+        return response
 
 
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
 
     def post(self, request):
         ser = RegisterSerializer(data=request.data)
@@ -30,88 +156,179 @@ class RegisterView(APIView):
         return Response({'id': user.id, 'username': user.username}, status=status.HTTP_201_CREATED)
 
 
-class CartAddView(APIView):
+class LogoutView(APIView):
+    """Revokes the access token and, when posted as ``refresh``, its refresh token."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 0
+
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                refresh = RefreshToken(refresh)
+            except TokenError as exc:
+                return Response({'refresh': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get(jwt_settings.USER_ID_CLAIM) != request.user.pk:
+                return Response({'refresh': ['Token belongs to another user']}, status=status.HTTP_400_BAD_REQUEST)
+            revoke_token(refresh)
+        revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartStoreMixin:
+    """Resolves the cart owner (user or ``cart_token`` cookie) against the configured store."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.store = cart_store.get_store()
+        self.owner, cookie = cart_store.resolve_owner(request, self.store)
+        self.cart_cookie = cart_store.keep_cookie(request, cookie)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cookie = getattr(self, 'cart_cookie', None)
+        # cart writes, checkouts and anonymous-cart merges: read them back from the primary
+        if response.status_code < 400 and (request.method not in permissions.SAFE_METHODS or cookie == ''):
+            replicas.pin(self.owner)
+        return cart_store.set_cookie(response, cookie)
+
+
+class CartAddView(CartStoreMixin, APIView):
+    permission_classes = [permissions.AllowAny]
+
     def post(self, request):
         ser = CartAddSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
         variant = get_object_or_404(ProductVariant, pk=ser.validated_data['variant_id'])
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        item, created = CartItem.objects.get_or_create(cart=cart, variant=variant, defaults={'quantity': ser.validated_data['quantity']})
-        if not created:
-            item.quantity += ser.validated_data['quantity']
-            item.save()
-        return Response({'cart_id': cart.id, 'item_count': cart.total_items()})
+        return Response(self.store.add(self.owner, variant, ser.validated_data['quantity']))
 
 
-class CartView(APIView):
+class CartView(CartStoreMixin, APIView):
+    """The caller's cart; the ETag is the store's ``version()`` and the catalog generation.
+
+    ``version()`` covers everything the body shows that can change without
+    a generation bump (for the database store, the variants' stock), so an
+    unchanged pair is answered with a 304 before the cart is loaded or
+    serialized.
+    """
+    permission_classes = [permissions.AllowAny]
+
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        from .serializers import CartSerializer
-        return Response(CartSerializer(cart).data)
+        validators = self.validators()
+        if validators is not None:
+            response = conditional.not_modified(request, *validators)
+            if response is not None:
+                return self.stamp(response, validators)
+        response = Response(self.store.get(self.owner))
+        return response if validators is None else self.stamp(response, validators)
+
+    def validators(self):
+        # read before the body, so a concurrent write can only make the ETag older than the cart
+        updated_at = self.store.version(self.owner)
+        if updated_at is None:
+            return None
+        try:
+            generation = catalog_cache.get_generation()
+        except Exception:
+            return None
+        return conditional.strong_etag(int(updated_at * 1_000_000), generation), updated_at
+
+    def stamp(self, response, validators):
+        return conditional.set_validators(
+            response, *validators, vary=('Authorization', 'Cookie'), private=True, no_cache=True,
+        )
 
 
-class CheckoutView(APIView):
+class CheckoutView(CartStoreMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
     def post(self, request):
         ser = CheckoutSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        if cart.items.count() == 0:
+        try:
+            order = self.store.checkout(self.owner, request.user)
+        except EmptyCart:
             return Response({'detail': 'Cart empty'}, status=status.HTTP_400_BAD_REQUEST)
-        order = Order.objects.create(user=request.user, total=cart.total_price())
-        for item in cart.items.all():
-            OrderItem.objects.create(order=order, variant=item.variant, quantity=item.quantity, price=item.variant.price)
-        Payment.objects.create(order=order, provider='stub', amount=order.total, success=True)
-        cart.items.all().delete()
+        except CheckoutInProgress:
+            return Response({'detail': 'Checkout in progress'}, status=status.HTTP_409_CONFLICT)
+        except InsufficientStock as exc:
+            return Response({'detail': 'Insufficient stock', 'skus': exc.skus}, status=status.HTTP_409_CONFLICT)
+        except UnknownVariants:
+            return Response({'detail': 'Cart contains unknown variants'}, status=status.HTTP_409_CONFLICT)
         return Response({'order_id': order.id, 'status': order.status})
 
 
+class OrderHistoryView(generics.ListAPIView):
+    """The caller's orders, newest first; ``?summary=true`` leaves out the lines."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+    query_budget = 2  # orders, lines joined to variants (the user comes from the token)
+
+    def with_items(self):
+        return self.request.query_params.get('summary', '').lower() not in ('1', 'true', 'yes')
+
+    def list(self, request, *args, **kwargs):
+        with replicas.reads(replicas.pin_key(request, request.user.pk)):
+            return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        from .repositories import OrderRepository
+        return OrderRepository().get_user_orders(self.request.user, with_items=self.with_items())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('with_items', self.with_items())
+        return super().get_serializer(*args, **kwargs)
+
+
 class WebhookReceiver(APIView):
+    """Verify, dedupe and store inbound webhooks without a DRF body parse (see shop.webhook_ingest)."""
+    authentication_classes = []
     permission_classes = [permissions.AllowAny]
+    query_budget = 1
 
     def post(self, request):
-        signature = request.headers.get('X-Signature')
+        from . import webhook_ingest
         payload = request.body
-        secret = getattr(settings, 'WEBHOOK_SECRET', None)
-        if secret:
-            expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
-            if not hmac.compare_digest(expected, signature or ''):
-                return Response({'detail': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
-        ev = WebhookEvent.objects.create(event=request.data.get('event', 'unknown'), payload=request.data)
-        ev.mark_attempt()
-        # enqueue delivery task
+        if not webhook_ingest.signature_valid(payload, request.headers.get('X-Signature')):
+            return Response({'detail': 'Invalid signature'}, status=status.HTTP_400_BAD_REQUEST)
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not webhook_ingest.claim_idempotency_key(idempotency_key):
+            return Response({'status': 'duplicate'})
         try:
-            deliver_webhook.delay(ev.id)
+            buffered = webhook_ingest.ingest(payload)
+        except webhook_ingest.InvalidPayload as exc:
+            webhook_ingest.release_idempotency_key(idempotency_key)
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception:
-            # fallback: mark delivered locally
-            ev.mark_delivered()
+            # let the sender retry with the same key
+            webhook_ingest.release_idempotency_key(idempotency_key)
+            raise
+        # delivered in batches by shop.tasks.deliver_pending_webhooks
+        if buffered:
+            return Response({'status': 'accepted'}, status=status.HTTP_202_ACCEPTED)
         return Response({'status': 'received'})
 
 
-class CartItemDetail(APIView):
+class CartItemDetail(CartStoreMixin, APIView):
     """Handle update (PATCH) and delete (DELETE) for cart items."""
-
-    def get_object(self, pk, user):
-        cart, _ = Cart.objects.get_or_create(user=user)
-        return get_object_or_404(CartItem, pk=pk, cart=cart)
+    permission_classes = [permissions.AllowAny]
 
     def patch(self, request, pk):
-        item = self.get_object(pk, request.user)
         quantity = request.data.get('quantity')
         try:
             quantity = int(quantity)
-        except Exception:
+        except (TypeError, ValueError):
             return Response({'detail': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
         if quantity < 1:
             return Response({'detail': 'Quantity must be >= 1'}, status=status.HTTP_400_BAD_REQUEST)
-        item.quantity = quantity
-        item.save()
-        from .serializers import CartSerializer
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        return Response(CartSerializer(cart).data)
+        try:
+            return Response(self.store.set_quantity(self.owner, pk, quantity))
+        except cart_store.CartItemNotFound:
+            raise Http404
 
     def delete(self, request, pk):
-        item = self.get_object(pk, request.user)
-        item.delete()
-        from .serializers import CartSerializer
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        return Response(CartSerializer(cart).data)
+        try:
+            return Response(self.store.remove(self.owner, pk))
+        except cart_store.CartItemNotFound:
+            raise Http404
@@ -0,0 +1,251 @@
+"""Inbound webhook ingestion for ``WebhookReceiver``.
+
+The receiver verifies the HMAC over the raw body, drops repeats of an
+``Idempotency-Key`` it has already seen (one ``cache.add``), and then either
+
+* ``WEBHOOK_INGEST_MODE = 'direct'``: parses the body once and inserts the
+  ``WebhookEvent`` with a single write, or
+* ``WEBHOOK_INGEST_MODE = 'buffered'``: appends the raw body to a Redis
+  list and answers 202 without parsing it. The list is bulk-inserted by
+  whichever request pushes it past ``WEBHOOK_INGEST_BATCH`` entries and by
+  the ``flush_webhook_ingest`` beat task, so nothing waits longer than the
+  beat interval. One flusher runs at a time under a Redis lock holding a
+  random token, renewed after every batch; only its holder trims the list
+  or releases it. Entries are trimmed only after their rows are written;
+  a body the database rejects (``DataError``/``IntegrityError``) is moved
+  to the ``webhook:ingest:dead`` list so it cannot block the buffer.
+
+If Redis is unavailable the buffered mode falls back to a direct insert.
+``aingest`` and the ``a*_idempotency_key`` functions do the same for
+``shop.async_views`` on ``redis.asyncio`` and the async ORM.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import uuid
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, DataError, IntegrityError, transaction
+
+from . import async_cache
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'webhook:ingest'
+DEAD_KEY = 'webhook:ingest:dead'
+LOCK_KEY = 'webhook:ingest:lock'
+LOCK_TTL = 30
+
+# extend or release the flush lock only while it still holds our token
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return 0
+"""
+
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class InvalidPayload(ValueError):
+    pass
+
+
+def event_from_body(body, strict=False):
+    """Build an unsaved ``WebhookEvent`` from a raw JSON body.
+
+    Buffered bodies were acknowledged before parsing, so unless ``strict``
+    invalid JSON is kept as an ``unparseable`` event instead of being lost.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        if strict:
+            raise InvalidPayload('Body is not valid JSON')
+        return WebhookEvent(event='unparseable', payload={'body': body.decode('utf-8', 'replace')})
+    name = payload.get('event', 'unknown') if isinstance(payload, dict) else 'unknown'
+    return WebhookEvent(event=str(name)[:200], payload=payload)
+
+
+def signature_valid(body, signature):
+    """HMAC-SHA256 of ``body`` against ``WEBHOOK_SECRET``; always valid when no secret is set."""
+    secret = getattr(settings, 'WEBHOOK_SECRET', None)
+    if not secret:
+        return True
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def _idempotency_key(key):
+    return f'webhook:idem:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def claim_idempotency_key(key):
+    """False if ``key`` was already seen; True otherwise (also when the cache is down)."""
+    if not key:
+        return True
+    try:
+        return cache.add(_idempotency_key(key), 1, getattr(settings, 'WEBHOOK_IDEMPOTENCY_TTL', 60 * 60 * 24))
+    except Exception:
+        return True
+
+
+def release_idempotency_key(key):
+    if key:
+        try:
+            cache.delete(_idempotency_key(key))
+        except Exception:
+            pass
+
+
+async def aclaim_idempotency_key(key):
+    if not key:
+        return True
+    try:
+        return await async_cache.get_cache().aadd(
+            _idempotency_key(key), 1, getattr(settings, 'WEBHOOK_IDEMPOTENCY_TTL', 60 * 60 * 24),
+        )
+    except Exception:
+        return True
+
+
+async def arelease_idempotency_key(key):
+    if key:
+        try:
+            await async_cache.get_cache().adelete(_idempotency_key(key))
+        except Exception:
+            pass
+
+
+class IngestBuffer:
+    key = BUFFER_KEY
+    dead_key = DEAD_KEY
+    lock_key = LOCK_KEY
+
+    def __init__(self, client=None, batch_size=None):
+        if client is None:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        self.client = client
+        self.batch_size = batch_size or getattr(settings, 'WEBHOOK_INGEST_BATCH', 500)
+        self._renew = client.register_script(_RENEW)
+        self._release = client.register_script(_RELEASE)
+
+    def push(self, body):
+        """Append a raw body; returns the buffer length afterwards."""
+        return self.client.rpush(self.key, body)
+
+    def flush(self, max_batches=None):
+        """Bulk-insert buffered bodies; returns the number of events written.
+
+        Only one flusher runs at a time; a concurrent caller, or any caller
+        while the lock cannot be taken, returns 0 immediately. A flusher whose
+        lock expired during a batch stops without trimming, so the next flush
+        writes that batch again rather than a second trim dropping bodies.
+        """
+        token = uuid.uuid4().hex
+        try:
+            if not self.client.set(self.lock_key, token, nx=True, ex=LOCK_TTL):
+                return 0
+        except Exception:
+            logger.warning('Webhook ingest flush lock unavailable, skipping flush', exc_info=True)
+            return 0
+        written = batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                bodies = self.client.lrange(self.key, 0, self.batch_size - 1)
+                if not bodies:
+                    break
+                written += self._write(bodies)
+                if not self._renew(keys=[self.lock_key], args=[token, LOCK_TTL]):
+                    logger.error('Webhook flush lock expired, leaving %d bodies for the next flush', len(bodies))
+                    break
+                self.client.ltrim(self.key, len(bodies), -1)
+                batches += 1
+                if len(bodies) < self.batch_size:
+                    break
+        finally:
+            try:
+                self._release(keys=[self.lock_key], args=[token])
+            except Exception:
+                pass
+        return written
+
+    def _write(self, bodies):
+        """Insert ``bodies``; rows the database rejects go to the dead-letter list."""
+        events = [event_from_body(b) for b in bodies]
+        try:
+            with transaction.atomic():
+                WebhookEvent.objects.bulk_create(events, batch_size=500)
+            return len(events)
+        except DatabaseError:
+            logger.warning('Webhook ingest batch failed, inserting rows one by one', exc_info=True)
+        dead = []
+        for body, event in zip(bodies, events):
+            try:
+                with transaction.atomic():
+                    event.save()
+            except (DataError, IntegrityError):
+                dead.append(body)
+        if dead:
+            logger.error('Moved %d webhook bodies the database rejected to %s', len(dead), self.dead_key)
+            self.client.rpush(self.dead_key, *dead)
+        return len(events) - len(dead)
+
+
+def ingest(body):
+    """Store ``body``; returns True if it was buffered, False if written directly.
+
+    Raises ``InvalidPayload`` when a directly written body is not JSON.
+    """
+    if getattr(settings, 'WEBHOOK_INGEST_MODE', 'direct') == 'buffered':
+        try:
+            buffer = get_buffer()
+            length = buffer.push(body)
+        except Exception:
+            logger.warning('Webhook ingest buffer unavailable, writing directly', exc_info=True)
+        else:
+            if length >= buffer.batch_size:
+                try:
+                    buffer.flush(max_batches=1)
+                except Exception:
+                    # the body is safely buffered; the beat task retries the flush
+                    logger.warning('Inline webhook ingest flush failed', exc_info=True)
+            return True
+    event_from_body(body, strict=True).save()
+    return False
+
+
+async def aingest(body):
+    """``ingest`` without blocking the event loop; a full buffer is flushed in a worker thread."""
+    if getattr(settings, 'WEBHOOK_INGEST_MODE', 'direct') == 'buffered':
+        try:
+            buffer = get_buffer()
+            length = await async_cache.get_client().rpush(buffer.key, body)
+        except Exception:
+            logger.warning('Webhook ingest buffer unavailable, writing directly', exc_info=True)
+        else:
+            if length >= buffer.batch_size:
+                try:
+                    await sync_to_async(buffer.flush)(max_batches=1)
+                except Exception:
+                    logger.warning('Inline webhook ingest flush failed', exc_info=True)
+            return True
+    await event_from_body(body, strict=True).asave()
+    return False
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = IngestBuffer()
+    return _buffer
@@ -0,0 +1,198 @@
+"""Batched outbound webhook delivery from the ``WebhookEvent`` outbox.
+
+``WebhookEngine.drain()`` claims a batch of due ``WebhookEvent`` rows,
+posts them concurrently from a thread pool over one pooled keep-alive
+``requests.Session`` (so repeat deliveries to a destination reuse the same
+TCP/TLS connection) and writes outcomes back with a single ``bulk_update``.
+Concurrency is capped globally (``WEBHOOK_WORKERS``) and per destination
+URL (``WEBHOOK_PER_DESTINATION``): the dispatcher only hands the pool the
+next post for a URL once one of its in-flight posts finished, so one slow
+subscriber cannot occupy the whole pool.
+
+Claims use ``SELECT ... FOR UPDATE SKIP LOCKED`` over the partial
+``webhook_pending_idx`` index and push ``next_attempt_at`` forward by a
+lease before committing: ``WEBHOOK_LEASE_SECONDS``, or the worst-case time
+to send the claimed batch if that is longer, so any number of
+dispatchers can run side by side without sending an event twice and
+without holding row locks during HTTP calls. A failed event is rescheduled
+with exponential backoff and dead-lettered after ``WEBHOOK_MAX_ATTEMPTS``.
+
+Every destination sits behind a ``shop.circuit.DestinationGuard``. Events
+for a destination whose circuit is open or whose rate limit is exhausted
+are not sent at all: they are pushed back by ``WEBHOOK_SHED_DELAY``
+seconds without using up an attempt or a worker thread.
+"""
+import json
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .circuit import DestinationGuard
+from .models import WebhookEvent
+
+
+def destinations(event):
+    """URLs ``event`` should be posted to."""
+    url = getattr(settings, 'WEBHOOK_DELIVERY_URL', None)
+    return [url] if url else []
+
+
+class WebhookEngine:
+    def __init__(self, workers=None, per_destination=None, timeout=None):
+        self.workers = workers or getattr(settings, 'WEBHOOK_WORKERS', 32)
+        self.per_destination = per_destination or getattr(settings, 'WEBHOOK_PER_DESTINATION', 8)
+        self.timeout = timeout or getattr(settings, 'WEBHOOK_TIMEOUT', 5)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='webhook')
+        self.guards = {}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.session.close()
+
+    def guard(self, url):
+        if url not in self.guards:
+            self.guards[url] = DestinationGuard(url)
+        return self.guards[url]
+
+    def post(self, url, body):
+        """POST ``body`` (bytes) to ``url``; True on a 2xx response."""
+        try:
+            resp = self.session.post(
+                url, data=body, headers={'Content-Type': 'application/json'}, timeout=self.timeout,
+            )
+        except requests.RequestException:
+            status = None
+        else:
+            status = resp.status_code
+        self.guard(url).observe(status)
+        return status is not None and 200 <= status < 300
+
+    def send(self, events):
+        """Deliver ``events`` concurrently; returns ``{event_id: True | False | None}``.
+
+        An event counts as delivered once every destination accepted it,
+        failed if any destination rejected it, and None (deferred) if a
+        guard shed it before it was sent. At most ``per_destination`` posts
+        per URL are submitted to the pool at a time.
+        """
+        by_url = defaultdict(list)
+        for event in events:
+            for url in destinations(event):
+                by_url[url].append(event)
+        results = {event.pk: True for event in events}
+        queues = {}
+        for url, url_events in by_url.items():
+            admitted = self.guard(url).admit(len(url_events))
+            queues[url] = deque(url_events[:admitted])
+            for event in url_events[admitted:]:
+                if results[event.pk]:
+                    results[event.pk] = None
+
+        running = {}
+
+        def submit(url):
+            event = queues[url].popleft()
+            running[self.pool.submit(self.post, url, json.dumps(event.payload).encode())] = (event.pk, url)
+
+        for url, queue in queues.items():
+            for _ in range(min(self.per_destination, len(queue))):
+                submit(url)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                event_id, url = running.pop(future)
+                if not future.result():
+                    results[event_id] = False
+                if queues[url]:
+                    submit(url)
+        return results
+
+    def lease_seconds(self, events):
+        """How long a claim of ``events`` is held: long enough to send them all.
+
+        Every post may take up to ``timeout``; a URL gets ``per_destination``
+        posts at a time and the pool ``workers`` posts in total.
+        """
+        per_url = Counter(url for event in events for url in destinations(event))
+        rounds = max(
+            [-(-n // self.per_destination) for n in per_url.values()] + [-(-sum(per_url.values()) // self.workers)]
+        )
+        # one more timeout covers the claim and record around the posts
+        return max(getattr(settings, 'WEBHOOK_LEASE_SECONDS', 60), (rounds + 1) * self.timeout)
+
+    def claim(self, limit):
+        """Lease up to ``limit`` due events to this dispatcher."""
+        now = timezone.now()
+        with transaction.atomic():
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(delivered=False, dead_lettered=False, next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:limit]
+            )
+            if events:
+                lease = timedelta(seconds=self.lease_seconds(events))
+                WebhookEvent.objects.filter(pk__in=[e.pk for e in events]).update(next_attempt_at=now + lease)
+        return events
+
+    def record(self, events, results):
+        """Write outcomes back with one ``bulk_update`` for the whole batch.
+
+        The claim's lease keeps other dispatchers off these rows, so the
+        attempt counts loaded with them are still current.
+        """
+        now = timezone.now()
+        max_attempts = getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5)
+        base = getattr(settings, 'WEBHOOK_RETRY_BASE', 60)
+        shed_delay = timedelta(seconds=getattr(settings, 'WEBHOOK_SHED_DELAY', 10))
+        for event in events:
+            outcome = results[event.pk]
+            if outcome is None:
+                event.next_attempt_at = now + shed_delay
+                continue
+            event.attempts += 1
+            event.last_attempt = now
+            event.delivered = outcome
+            if not outcome:
+                event.dead_lettered = event.attempts >= max_attempts
+                event.next_attempt_at = now + timedelta(seconds=min(base * 2 ** (event.attempts - 1), 3600))
+        WebhookEvent.objects.bulk_update(
+            events, ['attempts', 'last_attempt', 'delivered', 'dead_lettered', 'next_attempt_at'],
+        )
+
+    def drain(self, batch_size=None, max_batches=None):
+        """Deliver pending events batch by batch; returns ``(delivered, failed)``."""
+        batch_size = batch_size or getattr(settings, 'WEBHOOK_BATCH_SIZE', 200)
+        delivered = failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            events = self.claim(batch_size)
+            if not events:
+                break
+            results = self.send(events)
+            self.record(events, results)
+            delivered += sum(1 for r in results.values() if r)
+            failed += sum(1 for r in results.values() if r is False)
+            batches += 1
+            if len(events) < batch_size:
+                break
+        return delivered, failed
+
+
+_engine = None
+
+
+def get_engine():
+    """Per-process engine so the connection pool survives between task runs."""
+    global _engine
+    if _engine is None:
+        _engine = WebhookEngine()
+    return _engine
@@ -2,4 +2,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop_sphere.settings')
+# e.g. uvicorn shop_sphere.asgi:application --workers 4; see shop.async_views
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 application = get_asgi_application()
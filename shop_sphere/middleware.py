@@ -1,18 +1,150 @@
-import time
 import logging
-from django.utils.deprecation import MiddlewareMixin
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 
 logger = logging.getLogger(__name__)
 
+# "IN (%s, %s, %s)" and "IN (%s)" are the same query shape
+PLACEHOLDER_RUN_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+# nested atomic() blocks; whether they run depends on the caller's transaction, not the view
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class AsyncCapableMiddleware:
+    """Runs natively on either stack, so async views are not pushed back into a thread."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
 
-class RequestLoggingMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        request._start_time = time.time()
+class RequestLoggingMiddleware(AsyncCapableMiddleware):
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        return self.log(request, self.get_response(request), start)
 
-    def process_response(self, request, response):
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        return self.log(request, await self.get_response(request), start)
+
+    def log(self, request, response, start):
         try:
-            duration = time.time() - getattr(request, '_start_time', time.time())
-            logger.info('%s %s %s %.3fs', request.method, request.path, response.status_code, duration)
+            duration = time.perf_counter() - start
+            stats = getattr(request, 'query_stats', None)
+            if stats is None:
+                logger.info('%s %s %s %.3fs', request.method, request.path, response.status_code, duration)
+            else:
+                logger.info(
+                    '%s %s %s %.3fs %d queries %.3fs db', request.method, request.path,
+                    response.status_code, duration, stats.count, stats.duration,
+                )
         except Exception:
             logger.exception('Failed to log request')
         return response
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """``execute_wrapper`` hook counting queries (savepoints aside), DB time and query shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            if not sql.startswith(SAVEPOINT_PREFIXES):
+                self.count += 1
+                self.shapes[PLACEHOLDER_RUN_RE.sub('%s, ...', sql)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryInstrumentationMiddleware(AsyncCapableMiddleware):
+    """Counts queries and DB time per request, flags N+1 patterns and enforces budgets.
+
+    Enabled by ``QUERY_INSTRUMENTATION``; otherwise Django drops it from the
+    stack at startup. A view opts into a budget with a ``query_budget``
+    attribute (total queries for the request, authentication included).
+    Going over it logs a warning, or raises ``QueryBudgetExceeded`` when
+    ``QUERY_BUDGET_STRICT`` is set, as it is in the test suite. Any query
+    shape run ``QUERY_REPEAT_THRESHOLD`` times or more is logged as a
+    suspected N+1. Totals go out in a ``Server-Timing`` header.
+
+    Async views reach the database through ``sync_to_async``, which runs a
+    request's queries on one thread; the hooks are installed on that thread.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        self.repeat_threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 5)
+
+    @staticmethod
+    def instrument(stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = request.query_stats = QueryStats()
+        with self.instrument(stats):
+            response = self.get_response(request)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = request.query_stats = QueryStats()
+        stack = await sync_to_async(self.instrument)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        self.check(request, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_view = getattr(view_func, 'view_class', view_func)
+
+    def check(self, request, stats):
+        view = getattr(request, '_query_view', None)
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match else request.path
+        for shape, n in stats.repeated(self.repeat_threshold):
+            logger.warning('Possible N+1 in %s: %d x %s', name, n, shape[:300])
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and stats.count > budget:
+            message = f'{name} ran {stats.count} queries, budget is {budget}'
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
+from django.views.decorators.csrf import csrf_exempt
+from shop.graphql_views import ShopGraphQLView
+from shop.schema_graphql import schema
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('shop.urls')),
+    path('graphql/', csrf_exempt(ShopGraphQLView.as_view(graphiql=settings.DEBUG, schema=schema))),
 ]